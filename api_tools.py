@@ -5,23 +5,47 @@ API调用工具类
 """
 
 import requests
+import itertools
 import json
 import time
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterator
 from dotenv import load_dotenv
 
+from middleware.transport import get_shared_transport, openai_url, weather_url
+from middleware.ratelimit import get_shared_limiter, estimate_tokens
+from middleware.jsonstream import iter_json, load_json, response_chunks, BodyTooLargeError
+from middleware.exceptions import MiddlewareError
+from middleware.sse import iter_chat_completion
+from middleware.weather import get_shared_weather_cache, fetch_many, city_id
+from middleware.download import RangedDownloader
+from middleware.upload import upload, upload_many
+
 # 加载环境变量
 load_dotenv()
 
 class APITools:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
+        # 与APIMiddleware共享连接池和超时配置
+        self.transport = get_shared_transport()
+        self.session = self.transport.session
+        self.timeout = self.transport.timeout
+        # 与APIMiddleware共享按主机的限流预算
+        self.limiter = get_shared_limiter()
+        # 与APIMiddleware共享按城市的天气缓存
+        self.weather_cache = get_shared_weather_cache()
+        # 响应体大小上限，与APIMiddleware相同（API_MAX_BODY_MB）
+        self.max_body_bytes = int(float(os.getenv('API_MAX_BODY_MB', '100')) * 1024 * 1024)
+        # 最近一次流式补全的首 token 耗时和生成速度
+        self.last_completion: Dict[str, Any] = {}
         self.api_status = self._check_api_keys()
     
+    def _request(self, method: str, url: str, tokens: int = 0, **kwargs) -> requests.Response:
+        """按主机获取限流令牌后通过共享传输发送请求（JARVIS_CASSETTE 录制/回放同样生效）"""
+        self.limiter.acquire(url, tokens)
+        kwargs.setdefault('timeout', self.timeout)
+        return self.transport.request(method, url, **kwargs)
+    
     def _check_api_keys(self):
         """检查API密钥状态"""
         return {
@@ -31,23 +55,62 @@ class APITools:
             'weather': bool(os.getenv('WEATHER_API_KEY') and os.getenv('WEATHER_API_KEY') != 'your_weather_api_key_here')
         }
     
-    def get(self, url: str, headers: Optional[Dict] = None, params: Optional[Dict] = None) -> Optional[Dict]:
-        """GET请求 - 无需API密钥"""
+    def get(self, url: str, headers: Optional[Dict] = None, params: Optional[Dict] = None,
+            json_path: Optional[str] = None, max_bytes: Optional[int] = None) -> Optional[Dict]:
+        """GET请求 - 无需API密钥
+        
+        指定 json_path 时响应体增量解析，不整体缓冲，只构建子路径处的值；
+        否则按块读取后解析，无法解析为JSON时返回 {"text": 文本}。
+        响应体超过 max_bytes（默认 API_MAX_BODY_MB）时请求失败，返回 None。
+        """
+        max_bytes = self.max_body_bytes if max_bytes is None else max_bytes
         try:
-            response = self.session.get(url, headers=headers, params=params, timeout=30)
+            response = self._request('GET', url, headers=headers, params=params, stream=True)
             response.raise_for_status()
+            result = self._read_json(response, json_path, max_bytes)
             print(f"✅ GET请求成功: {url}")
-            return response.json() if response.content else {}
-        except requests.exceptions.RequestException as e:
+            return result
+        except (requests.exceptions.RequestException, MiddlewareError, ValueError) as e:
             print(f"❌ GET请求失败: {e}")
             return None
+    
+    def _read_json(self, response, json_path: Optional[str], max_bytes: int) -> Any:
+        """解析流式响应体：json_path 时增量解析，空响应返回 {}，无法解析的响应（包括声明为JSON
+        但内容有误的）返回 {"text": 文本}；只有超过大小上限时抛出 BodyTooLargeError"""
+        chunks = response_chunks(response, max_bytes=max_bytes)
+        first = next(chunks, None)
+        if first is None:
+            return {} if json_path is None else None
+        if json_path:
+            return load_json(itertools.chain((first,), chunks), json_path, max_bytes)
+        
+        body = bytearray()
+        for chunk in itertools.chain((first,), chunks):
+            body += chunk
+            if len(body) > max_bytes:
+                response.close()
+                raise BodyTooLargeError(f"响应体超过 {max_bytes} 字节上限")
+        text = body.decode('utf-8', errors='replace')
+        try:
+            return json.loads(text)
         except json.JSONDecodeError:
-            return {"text": response.text}
+            return {"text": text}
+    
+    def iter_json(self, url: str, json_path: Optional[str] = None, headers: Optional[Dict] = None,
+                  params: Optional[Dict] = None, max_bytes: Optional[int] = None) -> Iterator[Any]:
+        """流式GET，逐条产出 json_path 处数组的元素，内存占用与响应体大小无关
+        
+        响应体超过 max_bytes（默认 API_MAX_BODY_MB）时抛出 BodyTooLargeError。
+        """
+        max_bytes = self.max_body_bytes if max_bytes is None else max_bytes
+        response = self._request('GET', url, headers=headers, params=params, stream=True)
+        response.raise_for_status()
+        yield from iter_json(response_chunks(response, max_bytes=max_bytes), json_path, max_bytes)
     
     def post(self, url: str, data: Optional[Dict] = None, headers: Optional[Dict] = None) -> Optional[Dict]:
         """POST请求 - 无需API密钥"""
         try:
-            response = self.session.post(url, json=data, headers=headers, timeout=30)
+            response = self._request('POST', url, json=data, headers=headers)
             response.raise_for_status()
             print(f"✅ POST请求成功: {url}")
             return response.json() if response.content else {}
@@ -60,7 +123,7 @@ class APITools:
     def put(self, url: str, data: Optional[Dict] = None, headers: Optional[Dict] = None) -> Optional[Dict]:
         """PUT请求"""
         try:
-            response = self.session.put(url, json=data, headers=headers, timeout=30)
+            response = self._request('PUT', url, json=data, headers=headers)
             response.raise_for_status()
             print(f"✅ PUT请求成功: {url}")
             return response.json() if response.content else {}
@@ -71,7 +134,7 @@ class APITools:
     def delete(self, url: str, headers: Optional[Dict] = None) -> bool:
         """DELETE请求"""
         try:
-            response = self.session.delete(url, headers=headers, timeout=30)
+            response = self._request('DELETE', url, headers=headers)
             response.raise_for_status()
             print(f"✅ DELETE请求成功: {url}")
             return True
@@ -79,36 +142,75 @@ class APITools:
             print(f"❌ DELETE请求失败: {e}")
             return False
     
-    def download_file(self, url: str, filename: str, headers: Optional[Dict] = None) -> bool:
-        """下载文件 - 无需API密钥"""
+    def download_file(self, url: str, filename: str, headers: Optional[Dict] = None,
+                      connections: Optional[int] = None, checksum: Optional[str] = None,
+                      progress=None) -> bool:
+        """下载文件 - 无需API密钥
+        
+        服务端支持 Range 时按 connections（默认 DOWNLOAD_CONNECTIONS）个连接分段并行下载，
+        中断后再次调用从 <filename>.part 续传；checksum 形如 'sha256:<hex>'。
+        """
+        downloader = RangedDownloader(
+            self._request,
+            connections=connections or int(os.getenv('DOWNLOAD_CONNECTIONS', '4')),
+            min_part_size=int(float(os.getenv('DOWNLOAD_MIN_PART_MB', '4')) * 1024 * 1024),
+        )
         try:
-            response = self.session.get(url, headers=headers, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            print(f"✅ 文件下载成功: {filename}")
+            stats = downloader.download(url, filename, headers=headers, checksum=checksum, progress=progress)
+            mode = f"{stats['parts']} 段/{stats['connections']} 连接" if stats['ranged'] else "单连接"
+            resumed = f", 续传 {stats['resumed_bytes']} 字节" if stats['resumed_bytes'] else ""
+            print(f"✅ 文件下载成功: {filename} ({stats['bytes']} 字节, {mode}, "
+                  f"{stats['speed'] / 1024 / 1024:.1f} MB/s{resumed})")
             return True
-        except Exception as e:
+        except (MiddlewareError, requests.exceptions.RequestException, OSError, ValueError) as e:
+            # DownloadError（含无效的校验和）和 cassette 回放未命中均为 MiddlewareError
             print(f"❌ 文件下载失败: {e}")
             return False
     
     def upload_file(self, url: str, file_path: str, field_name: str = "file", 
-                   headers: Optional[Dict] = None) -> Optional[Dict]:
-        """上传文件"""
+                   headers: Optional[Dict] = None, chunked: bool = False,
+                   progress=None) -> Optional[Dict]:
+        """上传文件
+        
+        按块读取文件流式发送 multipart 请求体，内存占用与文件大小无关；chunked 为 True 时
+        使用分块传输编码。progress(已发送字节数, 总字节数, 字节/秒) 报告进度。
+        """
         try:
-            with open(file_path, 'rb') as f:
-                files = {field_name: f}
-                response = self.session.post(url, files=files, headers=headers, timeout=60)
-                response.raise_for_status()
-                print(f"✅ 文件上传成功: {file_path}")
-                return response.json() if response.content else {}
+            started_at = time.monotonic()
+            response = upload(self._request, url, file_path, field_name, headers=headers, chunked=chunked,
+                              progress=progress, timeout=(self.transport.config.connect_timeout, 60))
+            response.raise_for_status()
+            elapsed = time.monotonic() - started_at
+            speed = os.path.getsize(file_path) / elapsed / 1024 / 1024 if elapsed else 0.0
+            print(f"✅ 文件上传成功: {file_path} ({speed:.1f} MB/s)")
+            return response.json() if response.content else {}
         except Exception as e:
             print(f"❌ 文件上传失败: {e}")
             return None
     
+    def upload_files(self, url: str, file_paths: list, field_name: str = "file",
+                     headers: Optional[Dict] = None, max_workers: int = 4, chunked: bool = False,
+                     progress=None) -> list:
+        """并发上传多个文件（每个文件一个请求），按输入顺序返回结果，失败的文件为 None
+        
+        progress(文件路径, 已发送字节数, 总字节数, 字节/秒) 在上传线程中调用。
+        """
+        results = []
+        outcomes = upload_many(self._request, url, file_paths, max_workers=max_workers, progress=progress,
+                               field_name=field_name, headers=headers, chunked=chunked,
+                               timeout=(self.transport.config.connect_timeout, 60))
+        for file_path, (response, error) in zip(file_paths, outcomes):
+            try:
+                if error:
+                    raise error
+                response.raise_for_status()
+                results.append(response.json() if response.content else {})
+            except Exception as e:
+                print(f"❌ 文件上传失败: {file_path}: {e}")
+                results.append(None)
+        print(f"✅ 文件上传完成: {sum(result is not None for result in results)}/{len(file_paths)} 个文件")
+        return results
+    
     def call_openai_api(self, prompt: str, model: str = "gpt-3.5-turbo") -> Optional[str]:
         """调用OpenAI API - 需要API密钥"""
         if not self.api_status['openai']:
@@ -130,15 +232,13 @@ class APITools:
                 "max_tokens": 1000
             }
             
-            response = self.session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            url = openai_url()
+            reserved = estimate_tokens(data["messages"], data["max_tokens"])
+            response = self._request('POST', url, tokens=reserved, headers=headers, json=data)
             response.raise_for_status()
             
             result = response.json()
+            self.limiter.settle(url, reserved, (result.get("usage") or {}).get("total_tokens"))
             if "choices" in result:
                 print("✅ OpenAI API调用成功")
                 return result["choices"][0]["message"]["content"]
@@ -147,6 +247,41 @@ class APITools:
             print(f"❌ OpenAI API调用失败: {e}")
             return None
     
+    def stream_openai_api(self, prompt: str, model: str = "gpt-3.5-turbo",
+                          max_tokens: int = 1000) -> Iterator[str]:
+        """流式调用OpenAI API，文本增量产生后立即返回"""
+        if not self.api_status['openai']:
+            print("❌ OpenAI API密钥未配置")
+            print("💡 请在.env文件中设置OPENAI_API_KEY")
+            return
+        
+        headers = {
+            "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        
+        url = openai_url()
+        reserved = estimate_tokens(data["messages"], max_tokens)
+        self.last_completion = stats = {}
+        started_at = time.monotonic()
+        response = self._request('POST', url, tokens=reserved, headers=headers, json=data, stream=True)
+        try:
+            response.raise_for_status()
+            yield from iter_chat_completion(response.iter_content(chunk_size=1024), stats, started_at)
+        finally:
+            response.close()
+            self.limiter.settle(url, reserved, (stats.get("usage") or {}).get("total_tokens"))
+        if 'ttft' in stats:
+            print(f"\n✅ OpenAI 流式调用完成: 首token {stats['ttft']:.2f}秒, "
+                  f"{stats.get('tokens_per_sec', 0):.1f} token/秒")
+    
     def call_github_api(self, endpoint: str) -> Optional[Dict]:
         """调用GitHub API - 公开API无需密钥，私有API需要token"""
         headers = {}
@@ -160,31 +295,66 @@ class APITools:
         url = f"https://api.github.com/{endpoint}"
         return self.get(url, headers)
     
-    def call_weather_api(self, city: str) -> Optional[Dict]:
-        """调用天气API - 需要API密钥"""
+    def _weather_ready(self) -> bool:
         if not self.api_status['weather']:
             print("❌ 天气API密钥未配置")
             print("💡 请在.env文件中设置WEATHER_API_KEY")
             print("💡 获取地址: https://openweathermap.org/api")
+            return False
+        return True
+    
+    def _weather_params(self, **params) -> Dict:
+        return dict(params, appid=os.getenv('WEATHER_API_KEY'), units="metric", lang="zh_cn")
+    
+    def _fetch_weather(self, city) -> Dict:
+        """查询单个城市，数字按城市 ID 查询"""
+        known = city_id(city)
+        params = self._weather_params(id=known) if known is not None else self._weather_params(q=city)
+        response = self._request('GET', weather_url(), params=params)
+        response.raise_for_status()
+        return response.json()
+    
+    def _fetch_weather_group(self, ids) -> list:
+        """通过 group 接口一次查询多个城市 ID"""
+        params = self._weather_params(id=','.join(str(known) for known in ids))
+        response = self._request('GET', weather_url('group'), params=params)
+        response.raise_for_status()
+        return response.json().get('list', [])
+    
+    def call_weather_api(self, city: str) -> Optional[Dict]:
+        """调用天气API - 需要API密钥，结果按城市缓存 WEATHER_CACHE_TTL 秒"""
+        if not self._weather_ready():
             return None
         
+        cached = self.weather_cache.get(city)
+        if cached is not None:
+            print(f"✅ 天气缓存命中: {city}")
+            return cached[0]
         try:
-            api_key = os.getenv('WEATHER_API_KEY')
-            url = f"http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "q": city,
-                "appid": api_key,
-                "units": "metric",
-                "lang": "zh_cn"
-            }
-            result = self.get(url, params=params)
-            if result:
-                print(f"✅ 天气API调用成功: {city}")
+            result = self._fetch_weather(city)
+            self.weather_cache.put(city, result)
+            print(f"✅ 天气API调用成功: {city}")
             return result
         except Exception as e:
             print(f"❌ 天气API调用失败: {e}")
             return None
     
+    def call_weather_api_many(self, cities: list, max_workers: int = 8) -> list:
+        """批量查询多个城市的天气，按输入顺序返回，失败的城市为 None
+        
+        已知城市 ID 的城市通过 group 接口每次最多合并 20 个查询，其余城市并发查询。
+        """
+        if not self._weather_ready():
+            return [None] * len(cities)
+        
+        results, errors, info = fetch_many(cities, self._fetch_weather, self._fetch_weather_group,
+                                           self.weather_cache, max_workers=max_workers)
+        for city, error in errors.items():
+            print(f"❌ 天气API调用失败: {city}: {error}")
+        print(f"✅ 天气批量查询完成: {len(cities) - len(errors)}/{len(cities)} 个城市 "
+              f"(缓存 {info['cached']}, 合并请求 {info['group_requests']}, 单独请求 {info['single_requests']})")
+        return results
+    
     def call_public_api_examples(self):
         """调用一些无需API密钥的公开API示例"""
         print("🌐 测试公开API...")
@@ -217,6 +387,14 @@ class APITools:
         
         print("\n✅ 公开API测试完成")
     
+    def rate_limit_stats(self) -> Dict:
+        """各主机令牌桶的余量和等待时间"""
+        return self.limiter.stats()
+    
+    def connection_stats(self) -> Dict:
+        """连接复用统计（新建连接数 vs 复用连接数）"""
+        return self.transport.stats()['connections']
+    
     def print_api_status(self):
         """打印API状态信息"""
         print("📊 API服务状态:")
@@ -0,0 +1,3 @@
+"""
+Jarvis 中间件框架基准测试
+"""
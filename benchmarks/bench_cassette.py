@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+录制/回放基准测试
+对本地替身服务录制一组 APIMiddleware 请求，关闭服务后从 cassette 回放：
+按录制耗时回放近似真实上游，全速回放只剩框架自身的开销
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.http_stub import StubServer
+
+def make_requests(base_url: str, count: int):
+    from middleware import Request
+    requests = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            requests.append(Request(action='api_get', data={'url': f"{base_url}/items", 'params': {'page': i}}))
+        elif kind == 1:
+            requests.append(Request(action='api_post', data={'url': f"{base_url}/events", 'data': {'id': i}}))
+        else:
+            requests.append(Request(action='api_openai', data={'prompt': f"prompt {i}", 'model': 'stub'}))
+    return requests
+
+def main():
+    parser = argparse.ArgumentParser(description="录制/回放基准测试")
+    parser.add_argument("--count", type=int, default=300, help="请求数")
+    parser.add_argument("--delay", type=float, default=0.02, help="模拟上游延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="全速并发回放的并发数")
+    args = parser.parse_args()
+
+    server = StubServer(delay=args.delay).start()
+    os.environ.update(
+        OPENAI_BASE_URL=f"{server.url}/v1",
+        OPENAI_API_KEY=os.getenv('OPENAI_API_KEY') or 'stub',
+        RATE_LIMITS='127.0.0.1=100000:100000',
+        HTTP_CACHE='false',
+        PROMPT_CACHE='false',
+    )
+    logging.getLogger("middleware.core").disabled = True
+
+    from middleware import MiddlewareManager
+    from middleware.api import APIMiddleware
+    from middleware.cassette import Cassette, CassetteTransport
+    from middleware.transport import SessionTransport
+
+    def build(cassette, latency=None):
+        api = APIMiddleware()
+        api.transport = CassetteTransport(SessionTransport(), cassette, latency)
+        api.max_concurrency = args.concurrency
+        manager = MiddlewareManager()
+        manager.add(api)
+        return manager
+
+    def run(manager, concurrency: int = 1):
+        requests = make_requests(server.url, args.count)
+        latencies = []
+        start = time.perf_counter()
+        if concurrency > 1:
+            responses = manager.process_many(requests, max_concurrency=concurrency)
+        else:
+            responses = []
+            for request in requests:
+                began = time.perf_counter()
+                responses.append(manager.process(request))
+                latencies.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for response in responses if not response.success)
+        return elapsed, latencies, failed
+
+    def report(label, elapsed, latencies, failed):
+        p50 = f"{statistics.median(latencies) * 1e6:>9.0f}us" if latencies else f"{'-':>11}"
+        print(f"{label:<22}{elapsed:>8.3f}s{args.count / elapsed:>10.0f} 个/秒  p50 {p50}  失败 {failed}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.cassette')
+        print(f"{args.count} 个请求（GET/POST/OpenAI）, 模拟上游延迟 {args.delay * 1000:.0f}ms")
+
+        cassette = Cassette(path, 'record')
+        report('录制（真实请求）', *run(build(cassette)))
+        cassette.close()
+        server.stop()
+        print(f"cassette {os.path.getsize(path) / 1024:.1f}KB, 替身服务已关闭")
+
+        cassette = Cassette(path, 'replay')
+        report('回放（录制延迟）', *run(build(cassette, 'recorded')))
+        cassette = Cassette(path, 'replay')
+        report('回放（全速）', *run(build(cassette)))
+        cassette = Cassette(path, 'replay')
+        report(f'回放（全速, 并发 {args.concurrency}）', *run(build(cassette), args.concurrency))
+        cassette.close()
+
+if __name__ == "__main__":
+    main()
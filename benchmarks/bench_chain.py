@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+编译中间件链基准测试
+测量 MiddlewareManager 相对直接调用钩子的每请求框架开销
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import MiddlewareManager, BaseMiddleware, Request, Response
+
+class ProcessOnly(BaseMiddleware):
+    """只实现主处理的桩中间件"""
+    
+    def process(self, request: Request, response: Response) -> None:
+        pass
+
+class FullHooks(BaseMiddleware):
+    """实现全部钩子的桩中间件"""
+    
+    def before_process(self, request: Request) -> None:
+        pass
+    
+    def process(self, request: Request, response: Response) -> None:
+        pass
+    
+    def after_process(self, request: Request, response: Response) -> None:
+        pass
+
+def build_middlewares():
+    """2个完整钩子 + 3个仅主处理，对应日志/验证 + 业务中间件的常见组合"""
+    return [FullHooks("Full0"), FullHooks("Full1"),
+            ProcessOnly("Process0"), ProcessOnly("Process1"), ProcessOnly("Process2")]
+
+def legacy_process(middlewares, request: Request) -> Response:
+    """编译前的处理流程：每个请求检查启用状态并调用全部钩子"""
+    response = Response()
+    for middleware in middlewares:
+        if middleware.enabled:
+            middleware.before_process(request)
+    for middleware in middlewares:
+        if middleware.enabled:
+            middleware.process(request, response)
+            if not response.success or response.done:
+                break
+    for middleware in reversed(middlewares):
+        if middleware.enabled:
+            middleware.after_process(request, response)
+    return response
+
+def direct_process(middlewares, request: Request) -> Response:
+    """理想下限：手写调用被覆盖的钩子"""
+    full0, full1, p0, p1, p2 = middlewares
+    response = Response()
+    full0.before_process(request)
+    full1.before_process(request)
+    full0.process(request, response)
+    full1.process(request, response)
+    p0.process(request, response)
+    p1.process(request, response)
+    p2.process(request, response)
+    full1.after_process(request, response)
+    full0.after_process(request, response)
+    return response
+
+def measure(func, iterations: int) -> float:
+    """返回每次调用的平均耗时（微秒），取3轮最小值"""
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - start) / iterations * 1e6)
+    return best
+
+def run(iterations: int = 100000):
+    """运行基准测试"""
+    middlewares = build_middlewares()
+    manager = MiddlewareManager()
+    manager.logger.disabled = True
+    for middleware in middlewares:
+        manager.add(middleware)
+    request = Request(action='bench')
+    
+    direct = measure(lambda: direct_process(middlewares, request), iterations)
+    legacy = measure(lambda: legacy_process(middlewares, request), iterations)
+    compiled = measure(lambda: manager.process(request), iterations)
+    
+    print(f"{'方式':<10}{'每请求(us)':>12}{'框架开销(us)':>14}")
+    for label, value in (('direct', direct), ('legacy', legacy), ('compiled', compiled)):
+        print(f"{label:<10}{value:>12.3f}{value - direct:>14.3f}")
+    return {'direct': direct, 'legacy': legacy, 'compiled': compiled}
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+HTTP后端基准测试
+对本地替身服务器并发发起 api_get 请求，比较 requests.Session 后端与 aiohttp 异步后端，
+以及在事件循环中通过 MiddlewareManager.aprocess 扇出（async 后端不占用线程）
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import MiddlewareManager, Request
+from middleware.api import APIMiddleware
+from benchmarks.http_stub import StubServer
+
+def run_manager(backend: str, url: str, count: int, concurrency: int) -> float:
+    """通过 MiddlewareManager.process_many 扇出请求，返回耗时（秒）"""
+    api = APIMiddleware(backend=backend)
+    api.max_concurrency = concurrency
+    if backend == 'async':
+        api.transport.limit_per_host = concurrency
+    manager = MiddlewareManager()
+    manager.add(api)
+    requests = [Request(action='api_get', data={'url': f"{url}/item/{i}"}) for i in range(count)]
+    
+    start = time.perf_counter()
+    responses = manager.process_many(requests, max_concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    failed = [r.error for r in responses if not r.success]
+    if failed:
+        print(f"   ⚠️ {backend}: {len(failed)} 个请求失败，例如: {failed[0]}")
+    if backend == 'session':
+        connections = api.transport.stats()['connections']
+        print(f"   session: {connections['new_connections']} 个新连接, 复用率 {connections['reuse_rate']:.0%}")
+    else:
+        api.transport.close()
+    return elapsed
+
+def run_manager_async(backend: str, url: str, count: int, concurrency: int) -> float:
+    """在事件循环中通过 MiddlewareManager.aprocess 扇出请求，返回耗时（秒）"""
+    api = APIMiddleware(backend=backend)
+    api.max_concurrency = concurrency
+    if backend == 'async':
+        api.transport.limit_per_host = concurrency
+    manager = MiddlewareManager(max_workers=concurrency)
+    manager.add(api)
+    requests = [Request(action='api_get', data={'url': f"{url}/item/{i}"}) for i in range(count)]
+    
+    async def fan_out():
+        return await asyncio.gather(*[manager.aprocess(request) for request in requests])
+    
+    start = time.perf_counter()
+    responses = asyncio.run(fan_out())
+    elapsed = time.perf_counter() - start
+    failed = [r.error for r in responses if not r.success]
+    if failed:
+        print(f"   ⚠️ {backend}: {len(failed)} 个请求失败，例如: {failed[0]}")
+    manager.shutdown()
+    if backend == 'async':
+        api.transport.close()
+    return elapsed
+
+def run_async_direct(url: str, count: int, concurrency: int) -> float:
+    """直接在事件循环中通过异步传输并发请求，返回耗时（秒）"""
+    api = APIMiddleware(backend='async')
+    api.transport.limit_per_host = concurrency
+    
+    async def fan_out():
+        return await asyncio.gather(*[
+            api.transport.arequest('GET', f"{url}/item/{i}") for i in range(count)
+        ])
+    
+    start = time.perf_counter()
+    asyncio.run(fan_out())
+    elapsed = time.perf_counter() - start
+    api.transport.close()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP后端基准测试")
+    parser.add_argument("--count", type=int, default=200, help="请求数量")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发数")
+    parser.add_argument("--delay", type=float, default=0.02, help="模拟上游延迟（秒）")
+    args = parser.parse_args()
+    
+    logging.getLogger("middleware.core").disabled = True
+    server = StubServer(delay=args.delay).start()
+    try:
+        sequential = args.count * args.delay
+        print(f"{args.count} 个请求, 并发 {args.concurrency}, 上游延迟 {args.delay * 1000:.0f}ms "
+              f"(串行下限约 {sequential:.2f}s)")
+        results = {
+            'session (process_many)': run_manager('session', server.url, args.count, args.concurrency),
+            'async (process_many)': run_manager('async', server.url, args.count, args.concurrency),
+            'session (aprocess)': run_manager_async('session', server.url, args.count, args.concurrency),
+            'async (aprocess)': run_manager_async('async', server.url, args.count, args.concurrency),
+            'async (asyncio.gather)': run_async_direct(server.url, args.count, args.concurrency),
+        }
+        for label, elapsed in results.items():
+            print(f"{label:<26}{elapsed:>8.2f}s{args.count / elapsed:>10.0f} req/s")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
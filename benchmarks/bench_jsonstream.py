@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+流式JSON解析基准测试
+比较 json.loads 整体解析与 iter_json 增量解析的耗时和峰值内存
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.jsonstream import iter_json
+
+def make_payload(records: int = 200000) -> bytes:
+    """带元信息和大数组的典型列表接口响应"""
+    return json.dumps({
+        'meta': {'total': records, 'note': 'x' * 1024},
+        'data': {'items': [{'id': i, 'name': f'item-{i}', 'tags': ['a', 'b'], 'score': i * 0.5}
+                           for i in range(records)]},
+    }).encode('utf-8')
+
+def chunked(payload: bytes, chunk_size: int):
+    for start in range(0, len(payload), chunk_size):
+        yield payload[start:start + chunk_size]
+
+def measure(func):
+    """返回 (耗时秒, 峰值内存字节)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def run(records: int = 200000, chunk_size: int = 64 * 1024):
+    """运行基准测试"""
+    payload = make_payload(records)
+
+    def full():
+        # 模拟 resp.json()：先拼接完整响应体再整体解析
+        body = b''.join(chunked(payload, chunk_size))
+        return len(json.loads(body)['data']['items'])
+
+    def streaming():
+        return sum(1 for _ in iter_json(chunked(payload, chunk_size), 'data.items'))
+
+    results = {}
+    for label, func in (('json.loads', full), ('iter_json', streaming)):
+        elapsed, peak = measure(func)
+        results[label] = {'seconds': elapsed, 'peak_bytes': peak}
+
+    print(f"响应体 {len(payload) / 1e6:.1f} MB，{records} 条记录，块大小 {chunk_size} 字节")
+    print(f"{'实现':<12}{'耗时(秒)':>12}{'峰值内存(MB)':>16}")
+    for label, result in results.items():
+        print(f"{label:<12}{result['seconds']:>12.2f}{result['peak_bytes'] / 1e6:>16.1f}")
+    return results
+
+if __name__ == "__main__":
+    run()
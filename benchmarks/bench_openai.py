@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+批量OpenAI调用基准测试
+对模拟对话补全接口（带RPM/TPM限流）比较逐个调用与 call_openai_api_many 的并发调用，
+统计耗时、上游返回的429次数，并检查结果顺序
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.http_stub import StubServer
+
+def make_requests(count: int, max_tokens: int):
+    from middleware import Request
+    return [
+        Request(action='api_openai', data={'prompt': f"prompt {i} " + 'x' * (i % 7) * 40,
+                                           'model': 'stub', 'max_tokens': max_tokens})
+        for i in range(count)
+    ]
+
+def run_phase(args, concurrency: int):
+    """在独立的替身服务器和限流器上运行一轮，返回 (耗时, 响应列表, 上游429次数, 限流统计)"""
+    from middleware import MiddlewareManager
+    from middleware.api import APIMiddleware
+    from middleware.ratelimit import RateLimiter
+    from middleware.scheduler import RequestScheduler, Priority
+
+    server = StubServer(delay=args.delay, rpm=args.rpm, tpm=args.tpm).start()
+    os.environ['OPENAI_BASE_URL'] = f"{server.url}/v1"
+    try:
+        api = APIMiddleware()
+        api.api_keys['openai'] = api.api_keys['openai'] or 'stub'
+        api.max_concurrency = concurrency
+        api.limiter = RateLimiter.from_env()
+        manager = MiddlewareManager()
+        manager.add(api)
+
+        requests = make_requests(args.count, args.max_tokens)
+        start = time.perf_counter()
+        if concurrency > 1:
+            # 与 call_openai_api_many 相同：以 BULK 优先级提交到调度器，同时在调度器中的请求不超过 concurrency 个
+            scheduler = RequestScheduler(manager, workers=concurrency)
+            scheduler.start()
+            futures = scheduler.submit_many(requests, Priority.BULK, submitter='openai_batch',
+                                            max_in_flight=concurrency)
+            responses = [future.result() for future in futures]
+            scheduler.shutdown()
+        else:
+            responses = [manager.process(request) for request in requests]
+        elapsed = time.perf_counter() - start
+        return elapsed, responses, server.rate_limited, api.limiter.stats().get('127.0.0.1', {})
+    finally:
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="批量OpenAI调用基准测试")
+    parser.add_argument("--count", type=int, default=60, help="提示词数量")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数")
+    parser.add_argument("--delay", type=float, default=0.2, help="模拟补全耗时（秒）")
+    parser.add_argument("--rpm", type=int, default=600, help="每分钟请求数上限")
+    parser.add_argument("--tpm", type=int, default=60000, help="每分钟token数上限")
+    parser.add_argument("--max-tokens", type=int, default=200, help="每个请求的max_tokens")
+    args = parser.parse_args()
+
+    # 限流器按环境变量中的额度创建
+    os.environ['OPENAI_RPM'] = str(args.rpm)
+    os.environ['OPENAI_TPM'] = str(args.tpm)
+    logging.getLogger("middleware.core").disabled = True
+
+    print(f"{args.count} 个提示词, 模拟耗时 {args.delay * 1000:.0f}ms, "
+          f"RPM {args.rpm}, TPM {args.tpm}, max_tokens {args.max_tokens}")
+    for label, concurrency in (('逐个调用', 1), (f'并发 {args.concurrency}', args.concurrency)):
+        elapsed, responses, limited, stats = run_phase(args, concurrency)
+        failed = sum(1 for response in responses if not response.success)
+        ordered = all(
+            response.data.get('answer', '').startswith(f"echo: prompt {i}")
+            for i, response in enumerate(responses) if response.success
+        )
+        waits = stats.get('requests', {}).get('waits', 0) + stats.get('tokens', {}).get('waits', 0)
+        print(f"{label:<12}{elapsed:>8.2f}s{len(responses) / elapsed:>8.1f} 个/秒  失败 {failed}  "
+              f"上游429 {limited}  客户端排队 {waits} 次  顺序{'正确' if ordered else '错误'}")
+
+if __name__ == "__main__":
+    main()
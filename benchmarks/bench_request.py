@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+请求/响应对象微基准测试
+比较旧版 dataclass 实现与 __slots__ 实现的吞吐量和内存分配
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.request import Request, Response
+
+@dataclass
+class LegacyRequest:
+    """旧版请求对象"""
+    action: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+@dataclass
+class LegacyResponse:
+    """旧版响应对象"""
+    success: bool = True
+    data: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+    
+    def set_data(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+def workload(request_cls, response_cls):
+    """典型请求生命周期：创建请求、读取参数、写入结果"""
+    request = request_cls(action='api_get', data={'url': 'https://example.com'})
+    response = response_cls()
+    response.set_data('result', request.get('url'))
+    return request, response
+
+def measure_allocations(request_cls, response_cls, count: int = 10000):
+    """返回每个请求的存活内存字节数、存活内存块数和单次生命周期的峰值内存字节数
+    
+    前两项为保留全部对象时两次快照之差，不含已释放的临时对象；峰值为单次调用期间的内存增量最大值。
+    """
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    keep = [workload(request_cls, response_cls) for _ in range(count)]
+    snapshot_after = tracemalloc.take_snapshot()
+    stats = snapshot_after.compare_to(snapshot_before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del keep
+    peak_total = 0
+    for _ in range(count):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        workload(request_cls, response_cls)
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return size / count, blocks / count, peak_total / count
+
+def measure_throughput(request_cls, response_cls, iterations: int = 200000):
+    """返回每秒可完成的请求生命周期数"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        workload(request_cls, response_cls)
+    return iterations / (time.perf_counter() - start)
+
+def run():
+    """运行基准测试"""
+    results = {}
+    for label, request_cls, response_cls in (
+        ('dataclass', LegacyRequest, LegacyResponse),
+        ('slots', Request, Response),
+    ):
+        size, blocks, peak = measure_allocations(request_cls, response_cls)
+        results[label] = {
+            'retained_bytes_per_request': size,
+            'retained_blocks_per_request': blocks,
+            'peak_bytes_per_request': peak,
+            'requests_per_sec': measure_throughput(request_cls, response_cls),
+        }
+    
+    print(f"{'实现':<12}{'留存字节/请求':>12}{'留存块/请求':>12}{'峰值字节/请求':>12}{'请求/秒':>14}")
+    for label, result in results.items():
+        print(f"{label:<12}{result['retained_bytes_per_request']:>12.0f}"
+              f"{result['retained_blocks_per_request']:>12.1f}{result['peak_bytes_per_request']:>12.0f}"
+              f"{result['requests_per_sec']:>14.0f}")
+    return results
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+路由分发基准测试
+比较逐个遍历全部中间件与按动作预计算中间件链的每请求分发开销
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import MiddlewareManager, BaseMiddleware, Request, Response
+
+class StubMiddleware(BaseMiddleware):
+    """只处理单个动作的桩中间件，模拟旧式 if/elif 判断"""
+    
+    def __init__(self, index: int):
+        super().__init__(f"Stub{index}")
+        self.action = f"stub_{index}"
+        self.actions = (self.action,)
+    
+    def process(self, request: Request, response: Response) -> None:
+        if request.action == self.action:
+            response.set_data('handled_by', self.name)
+
+def legacy_process(middlewares, request: Request) -> Response:
+    """旧版处理流程：每个请求遍历所有中间件"""
+    response = Response()
+    for middleware in middlewares:
+        if middleware.enabled:
+            middleware.before_process(request)
+    for middleware in middlewares:
+        if middleware.enabled:
+            middleware.process(request, response)
+            if not response.success:
+                break
+    for middleware in reversed(middlewares):
+        if middleware.enabled:
+            middleware.after_process(request, response)
+    return response
+
+def measure(func, iterations: int) -> float:
+    """返回每次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def run(counts=(5, 20, 100), iterations: int = 20000):
+    """运行基准测试"""
+    results = []
+    for count in counts:
+        manager = MiddlewareManager()
+        manager.logger.disabled = True
+        for i in range(count):
+            manager.add(StubMiddleware(i))
+        request = Request(action=f"stub_{count - 1}")
+        
+        legacy = measure(lambda: legacy_process(manager.middlewares, request), iterations)
+        routed = measure(lambda: manager.process(request), iterations)
+        results.append((count, legacy, routed))
+    
+    print(f"{'中间件数':>8} {'遍历(us)':>12} {'路由(us)':>12}")
+    for count, legacy, routed in results:
+        print(f"{count:>8} {legacy:>12.2f} {routed:>12.2f}")
+    return results
+
+if __name__ == "__main__":
+    run()
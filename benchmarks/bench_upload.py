@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+文件上传基准测试
+比较 requests 的 files= 上传（请求体整体组装在内存中）与流式 multipart 上传的耗时和峰值内存，
+以及并发上传多个文件的耗时
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.http_stub import StubServer, file_bytes
+
+def make_file(path: str, size: int) -> None:
+    block = 1024 * 1024
+    with open(path, 'wb') as f:
+        for offset in range(0, size, block):
+            f.write(file_bytes(offset, min(offset + block, size)))
+
+def measure(func):
+    """返回 (耗时秒, 峰值内存字节)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="文件上传基准测试")
+    parser.add_argument("--size-mb", type=int, nargs='+', default=[32, 128], help="文件大小（MB）")
+    parser.add_argument("--files", type=int, default=4, help="并发上传的文件数")
+    parser.add_argument("--bandwidth-mb", type=float, default=32, help="并发测试中每个连接的上传带宽（MB/s）")
+    args = parser.parse_args()
+
+    from middleware.transport import get_shared_transport
+    from middleware.upload import upload, upload_many
+
+    request = get_shared_transport().request
+    server = StubServer().start()
+    url = f"{server.url}/upload"
+
+    def check(resp, size):
+        resp.raise_for_status()
+        assert resp.json()['received'] > size
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'方式':<16}{'大小':>8}{'耗时':>10}{'峰值内存':>12}")
+        for size_mb in args.size_mb:
+            size = size_mb * 1024 * 1024
+            path = os.path.join(directory, f"upload-{size_mb}.bin")
+            make_file(path, size)
+
+            def in_memory():
+                with open(path, 'rb') as f:
+                    check(request('POST', url, files={'file': f}), size)
+
+            for label, func in (
+                ('files=（内存）', in_memory),
+                ('流式', lambda: check(upload(request, url, path), size)),
+                ('流式 chunked', lambda: check(upload(request, url, path, chunked=True), size)),
+            ):
+                elapsed, peak = measure(func)
+                print(f"{label:<16}{size_mb:>6}MB{elapsed:>9.2f}s{peak / 1024 / 1024:>10.1f}MB")
+            os.remove(path)
+
+        # 限制单连接带宽时并发上传多个文件
+        server.bandwidth = args.bandwidth_mb * 1024 * 1024
+        size = 32 * 1024 * 1024
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(directory, f"batch-{i}.bin"))
+            make_file(paths[-1], size)
+        start = time.perf_counter()
+        for path in paths:
+            check(upload(request, url, path), size)
+        sequential = time.perf_counter() - start
+        start = time.perf_counter()
+        for resp, error in upload_many(request, url, paths, max_workers=args.files):
+            if error:
+                raise error
+            check(resp, size)
+        concurrent = time.perf_counter() - start
+        print(f"{args.files} 个 32MB 文件（单连接 {args.bandwidth_mb:.0f}MB/s）: "
+              f"逐个 {sequential:.2f}s, 并发 {concurrent:.2f}s")
+    server.stop()
+
+if __name__ == "__main__":
+    main()
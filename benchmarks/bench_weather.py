@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+多城市天气查询基准测试
+对模拟 OpenWeatherMap 接口比较逐个查询、首次批量查询（城市 ID 未知）、
+已知 ID 时的批量查询（group 接口）以及缓存命中的耗时和上游请求数
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.http_stub import StubServer
+
+def main():
+    parser = argparse.ArgumentParser(description="多城市天气查询基准测试")
+    parser.add_argument("--cities", type=int, default=50, help="城市数量")
+    parser.add_argument("--delay", type=float, default=0.1, help="模拟上游延迟（秒）")
+    args = parser.parse_args()
+
+    server = StubServer(delay=args.delay).start()
+    os.environ['WEATHER_BASE_URL'] = f"{server.url}/data/2.5"
+    os.environ['WEATHER_API_KEY'] = os.getenv('WEATHER_API_KEY') or 'stub'
+    # 基准测试只衡量网络往返，不受免费版限流配额影响
+    os.environ['RATE_LIMITS'] = '127.0.0.1=1000:1000'
+    logging.getLogger("middleware.core").disabled = True
+
+    from middleware import MiddlewareManager, Request
+    from middleware.api import APIMiddleware
+
+    api = APIMiddleware()
+    manager = MiddlewareManager()
+    manager.add(api)
+    cities = [f"City {i}" for i in range(args.cities)]
+
+    def run(label, fn):
+        before = server.weather_requests
+        start = time.perf_counter()
+        info = fn()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<14}{elapsed * 1000:>9.1f}ms  上游请求 {server.weather_requests - before:>3}  {info or ''}")
+
+    def sequential():
+        for city in cities:
+            manager.process(Request(action='api_weather', data={'city': city},
+                                    headers={'Cache-Control': 'no-cache'}))
+
+    def bulk(refresh: bool = True):
+        def call():
+            headers = {'Cache-Control': 'no-cache'} if refresh else None
+            response = manager.process(Request(action='api_weather_many', data={'cities': cities}, headers=headers))
+            assert response.success and all(response.data['results']), response.error
+            return response.metadata['weather']
+        return call
+
+    try:
+        print(f"{args.cities} 个城市, 模拟延迟 {args.delay * 1000:.0f}ms")
+        run('逐个查询', sequential)
+        api.weather_cache.clear()
+        run('批量(ID未知)', bulk())
+        run('批量(group)', bulk())
+        run('批量(缓存)', bulk(refresh=False))
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
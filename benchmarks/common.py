@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+基准测试通用工具
+"""
+
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, Any, List
+
+def percentile(samples: List[float], q: float) -> float:
+    """已排序样本的分位数"""
+    if not samples:
+        return 0.0
+    index = min(int(q * len(samples)), len(samples) - 1)
+    return samples[index]
+
+def measure_latency(func: Callable[[], Any], iterations: int, warmup: int = 1000) -> Dict[str, float]:
+    """逐次计时，返回吞吐量和延迟分位数（微秒）"""
+    for _ in range(warmup):
+        func()
+    
+    samples = [0.0] * iterations
+    clock = time.perf_counter_ns
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = clock()
+        for i in range(iterations):
+            t0 = clock()
+            func()
+            samples[i] = clock() - t0
+        total = clock() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+    
+    samples.sort()
+    return {
+        'iterations': iterations,
+        'requests_per_sec': iterations / (total / 1e9),
+        'mean_us': sum(samples) / iterations / 1e3,
+        'p50_us': percentile(samples, 0.50) / 1e3,
+        'p95_us': percentile(samples, 0.95) / 1e3,
+        'p99_us': percentile(samples, 0.99) / 1e3,
+        'max_us': samples[-1] / 1e3,
+    }
+
+def measure_allocations(func: Callable[[], Any], iterations: int = 2000) -> Dict[str, float]:
+    """用 tracemalloc 统计每次调用的内存占用
+    
+    - retained_blocks/bytes_per_request: 保留全部返回值时每次调用净增的存活内存块数和字节数
+      （两次快照之差，调用中已释放的临时对象不计入）
+    - peak_bytes_per_request: 单次调用期间内存占用的峰值增量（含随后释放的临时对象），各次平均
+    
+    tracemalloc 只能观察存活内存，无法统计已释放对象的分配次数。
+    """
+    func()
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    keep = [func() for _ in range(iterations)]
+    snapshot_after = tracemalloc.take_snapshot()
+    stats = snapshot_after.compare_to(snapshot_before, 'filename')
+    del keep
+    
+    peak_total = 0
+    for _ in range(iterations):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - current
+    tracemalloc.stop()
+    return {
+        'retained_blocks_per_request': sum(stat.count_diff for stat in stats) / iterations,
+        'retained_bytes_per_request': sum(stat.size_diff for stat in stats) / iterations,
+        'peak_bytes_per_request': peak_total / iterations,
+    }
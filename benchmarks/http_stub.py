@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+本地HTTP替身服务器
+用于在无网络环境下对API路径做基准测试，可模拟固定的上游延迟。
+POST .../chat/completions 模拟 OpenAI 对话补全接口（含流式输出和按分钟的请求数/token数限流）。
+GET .../weather 和 .../group 模拟 OpenWeatherMap 的单城市和多城市（按 ID）查询接口。
+GET/HEAD /files/<字节数> 返回确定内容的文件，支持 Range/If-Range，可限制每个连接的带宽。
+"""
+
+import hashlib
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+def _city_id(name: str) -> int:
+    return zlib.crc32(name.strip().lower().encode('utf-8')) % 10_000_000
+
+_PATTERN = bytes(range(256)) * 256
+
+def file_bytes(start: int, end: int) -> bytes:
+    """/files/ 接口返回的文件内容中 [start, end) 的部分"""
+    offset = start % len(_PATTERN)
+    length = end - start
+    repeats = (offset + length) // len(_PATTERN) + 1
+    return (_PATTERN * repeats)[offset:offset + length]
+
+def _weather(city_id: int, name: str = None) -> dict:
+    return {'id': city_id, 'name': name or f"city-{city_id}",
+            'main': {'temp': city_id % 40 - 5.0}, 'weather': [{'description': '晴'}]}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """返回JSON的请求处理器"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def _send_json(self, payload, status: int = 200, headers: dict = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _iter_body(self, block: int = 256 * 1024):
+        """逐块读取请求体，支持 Content-Length 和分块传输编码"""
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    # 跳过 trailer 直到空行
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                while size:
+                    data = self.rfile.read(min(size, block))
+                    size -= len(data)
+                    yield data
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length', 0))
+        while length:
+            data = self.rfile.read(min(length, block))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+    
+    def _read_body(self) -> bytes:
+        return b''.join(self._iter_body())
+    
+    def do_HEAD(self):
+        parsed = urlparse(self.path)
+        if not parsed.path.startswith('/files/'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        size = int(parsed.path.rsplit('/', 1)[1])
+        self.send_response(200)
+        self._file_headers(size, size)
+        self.end_headers()
+    
+    def _file_headers(self, size: int, length: int) -> None:
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        self.send_header('ETag', f'"file-{size}"')
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+    
+    def _send_file(self, size: int) -> None:
+        """按 Range 返回文件内容，每个连接的速度不超过 server.bandwidth 字节/秒"""
+        start, end, status = 0, size, 200
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if byte_range and self.server.ranges and (if_range is None or if_range == f'"file-{size}"'):
+            first, _, last = byte_range.split('=', 1)[1].partition('-')
+            start, end, status = int(first), min(int(last) + 1 if last else size, size), 206
+        with self.server._lock:
+            self.server.file_requests += 1
+            truncate = status == 206 and self.server.fail_ranges > 0
+            if truncate:
+                self.server.fail_ranges -= 1
+        self.send_response(status)
+        self._file_headers(size, end - start)
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+        # 模拟连接中断：只发送一半内容后关闭连接
+        stop = start + (end - start) // 2 if truncate else end
+        block = 64 * 1024
+        try:
+            for offset in range(start, stop, block):
+                data = file_bytes(offset, min(offset + block, stop))
+                self.wfile.write(data)
+                if self.server.bandwidth:
+                    time.sleep(len(data) / self.server.bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中断下载
+            self.close_connection = True
+            return
+        if truncate:
+            self.close_connection = True
+    
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        parsed = urlparse(self.path)
+        if parsed.path.startswith('/files/'):
+            self._send_file(int(parsed.path.rsplit('/', 1)[1]))
+            return
+        query = parse_qs(parsed.query)
+        if parsed.path.endswith('/weather'):
+            with self.server._lock:
+                self.server.weather_requests += 1
+            if 'id' in query:
+                self._send_json(_weather(int(query['id'][0])))
+            else:
+                self._send_json(_weather(_city_id(query['q'][0]), query['q'][0]))
+            return
+        if parsed.path.endswith('/group'):
+            with self.server._lock:
+                self.server.weather_requests += 1
+            ids = [int(value) for value in query['id'][0].split(',')]
+            self._send_json({'cnt': len(ids), 'list': [_weather(city_id) for city_id in ids]})
+            return
+        self._send_json({'path': parsed.path, 'query': query})
+    
+    def do_POST(self):
+        if urlparse(self.path).path.endswith('/chat/completions'):
+            self._chat_completion(json.loads(self._read_body() or b'{}'))
+            return
+        # 不缓存请求体，只统计长度和摘要，便于测试大文件上传
+        received = 0
+        digest = hashlib.sha256()
+        for data in self._iter_body():
+            received += len(data)
+            digest.update(data)
+            if self.server.bandwidth:
+                time.sleep(len(data) / self.server.bandwidth)
+        time.sleep(self.server.delay)
+        self._send_json({'path': self.path, 'received': received, 'sha256': digest.hexdigest(),
+                         'chunked': self.headers.get('Transfer-Encoding', '').lower() == 'chunked'})
+    
+    def _chat_completion(self, payload: dict) -> None:
+        """模拟对话补全：回显提示词，按 OpenAI 的方式计入 prompt token 和 max_tokens"""
+        messages = payload.get('messages') or []
+        prompt = ' '.join(str(message.get('content', '')) for message in messages)
+        prompt_tokens = len(prompt) // 4 + 1
+        max_tokens = payload.get('max_tokens') or 16
+        
+        retry_after = self.server.consume(prompt_tokens + max_tokens)
+        if retry_after is not None:
+            self._send_json(
+                {'error': {'message': 'Rate limit reached', 'type': 'requests'}}, status=429,
+                headers={'Retry-After': str(max(int(retry_after), 1)),
+                         'x-ratelimit-reset-requests': f"{retry_after:.3f}s"}
+            )
+            return
+        
+        words = f"echo: {prompt}".split()[:max_tokens]
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(words),
+                 'total_tokens': prompt_tokens + len(words)}
+        time.sleep(self.server.delay)
+        if not payload.get('stream'):
+            self._send_json({
+                'object': 'chat.completion',
+                'model': payload.get('model'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ' '.join(words)}}],
+                'usage': usage,
+            })
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        events = [{'choices': [{'index': 0, 'delta': {'content': (' ' if i else '') + word}}]}
+                  for i, word in enumerate(words)]
+        events.append({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        events.append({'choices': [], 'usage': usage})
+        for event in events:
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            time.sleep(self.server.token_delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+    
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    """带固定延迟的本地服务器
+    
+    rpm/tpm 为对话补全接口每分钟的请求数和 token 数上限，与 OpenAI 一样按时间连续恢复，
+    超出时返回 429。bandwidth 为 /files/ 下载和 POST 上传每个连接的带宽（字节/秒），ranges=False 时不支持 Range，
+    fail_ranges 为需要中途断开的范围请求数。
+    """
+    
+    daemon_threads = True
+    request_queue_size = 256
+    
+    def __init__(self, delay: float = 0.0, handler=StubHandler, port: int = 0,
+                 rpm: int = None, tpm: int = None, token_delay: float = 0.0,
+                 bandwidth: float = None, ranges: bool = True, fail_ranges: int = 0):
+        super().__init__(('127.0.0.1', port), handler)
+        self.delay = delay
+        self.rpm = rpm
+        self.tpm = tpm
+        self.token_delay = token_delay
+        self.completions = 0
+        self.weather_requests = 0
+        self.bandwidth = bandwidth
+        self.ranges = ranges
+        self.fail_ranges = fail_ranges
+        self.file_requests = 0
+        self.rate_limited = 0
+        # 剩余额度
+        self._requests_left = rpm
+        self._tokens_left = tpm
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def consume(self, tokens: int):
+        """计入一次补全请求，超出额度时返回额度恢复所需的秒数，否则返回 None"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            waits = []
+            if self.rpm is not None:
+                self._requests_left = min(self.rpm, self._requests_left + elapsed * self.rpm / 60)
+                if self._requests_left < 1:
+                    waits.append((1 - self._requests_left) * 60 / self.rpm)
+            if self.tpm is not None:
+                self._tokens_left = min(self.tpm, self._tokens_left + elapsed * self.tpm / 60)
+                if self._tokens_left < tokens:
+                    waits.append((tokens - self._tokens_left) * 60 / self.tpm)
+            if waits:
+                self.rate_limited += 1
+                return max(waits)
+            if self.rpm is not None:
+                self._requests_left -= 1
+            if self.tpm is not None:
+                self._tokens_left -= tokens
+            self.completions += 1
+            return None
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+    
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+中间件框架基准测试运行器
+
+用法:
+    python benchmarks/run.py                       # 运行全部场景并保存结果
+    python benchmarks/run.py --compare baseline.json  # 与历史结果比较，发现回退时返回非0
+    python benchmarks/run.py --only cache_hit --quick
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import measure_latency, measure_allocations
+from benchmarks.suite import SCENARIOS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def _git_revision() -> str:
+    """当前提交，用于标注结果"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return 'unknown'
+
+def run_suite(names: List[str], quick: bool = False) -> Dict[str, Any]:
+    """运行指定场景"""
+    results = {}
+    for name in names:
+        factory, iterations, batch = SCENARIOS[name]
+        if quick:
+            iterations = max(iterations // 10, 5)
+        func = factory()
+        latency = measure_latency(func, iterations, warmup=min(iterations, 1000))
+        allocations = measure_allocations(func, iterations=min(iterations, 2000))
+        # 批量场景换算为单个请求；分位数只能按整批计时，换算后是均摊值（整批耗时/批大小），
+        # 不是单个请求的延迟分布，标记为 amortized 并保留整批的分位数
+        result = {
+            'requests_per_sec': latency['requests_per_sec'] * batch,
+            'p50_us': latency['p50_us'] / batch,
+            'p95_us': latency['p95_us'] / batch,
+            'p99_us': latency['p99_us'] / batch,
+            'retained_blocks_per_request': allocations['retained_blocks_per_request'] / batch,
+            'retained_bytes_per_request': allocations['retained_bytes_per_request'] / batch,
+            'peak_bytes_per_request': allocations['peak_bytes_per_request'] / batch,
+            'iterations': iterations,
+            'batch': batch,
+            'amortized': batch > 1,
+        }
+        if batch > 1:
+            result.update(batch_p50_us=latency['p50_us'], batch_p95_us=latency['p95_us'],
+                          batch_p99_us=latency['p99_us'])
+        results[name] = result
+        label = f"{name}*" if batch > 1 else name
+        print(f"{label:<20}{result['requests_per_sec']:>12.0f}{result['p50_us']:>10.2f}"
+              f"{result['p95_us']:>10.2f}{result['p99_us']:>10.2f}{result['retained_blocks_per_request']:>10.1f}"
+              f"{result['peak_bytes_per_request']:>12.0f}")
+    return results
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """比较两次结果，返回回退描述列表"""
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if result['requests_per_sec'] < previous['requests_per_sec'] * (1 - threshold):
+            regressions.append(f"{name}: 吞吐量 {previous['requests_per_sec']:.0f} -> {result['requests_per_sec']:.0f} req/s")
+        if result['p50_us'] > previous['p50_us'] * (1 + threshold):
+            label = 'p50(均摊)' if result.get('amortized') else 'p50'
+            regressions.append(f"{name}: {label} {previous['p50_us']:.2f} -> {result['p50_us']:.2f} us")
+        # 旧结果文件中留存块数记为 allocs_per_request
+        retained = previous.get('retained_blocks_per_request', previous.get('allocs_per_request'))
+        if retained is not None and result['retained_blocks_per_request'] > retained * (1 + threshold) + 0.5:
+            regressions.append(f"{name}: 留存内存块 {retained:.1f} -> {result['retained_blocks_per_request']:.1f} 个/请求")
+        peak = previous.get('peak_bytes_per_request')
+        if peak is not None and result['peak_bytes_per_request'] > peak * (1 + threshold) + 64:
+            regressions.append(f"{name}: 峰值内存 {peak:.0f} -> {result['peak_bytes_per_request']:.0f} 字节/请求")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Jarvis 中间件框架基准测试")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="只运行指定场景")
+    parser.add_argument("--quick", action="store_true", help="减少迭代次数，快速检查")
+    parser.add_argument("--output", help="结果文件路径，默认 benchmarks/results/<时间>.json")
+    parser.add_argument("--compare", help="用于比较的历史结果文件")
+    parser.add_argument("--threshold", type=float, default=0.15, help="判定回退的相对阈值")
+    args = parser.parse_args()
+    
+    names = args.only or list(SCENARIOS)
+    print(f"{'场景':<18}{'req/s':>12}{'p50(us)':>10}{'p95(us)':>10}{'p99(us)':>10}{'留存块/请求':>8}{'峰值B/请求':>9}")
+    results = run_suite(names, quick=args.quick)
+    if any(result['amortized'] for result in results.values()):
+        print("* 批量场景：分位数为整批耗时除以批大小的均摊值，不是单个请求的延迟")
+    
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已保存: {output}")
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get('results', {}), args.threshold)
+        if regressions:
+            print(f"❌ 发现 {len(regressions)} 项性能回退 (阈值 {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ 与 {baseline.get('revision', args.compare)} 相比无性能回退")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+中间件框架基准场景
+全部使用桩中间件或纯本地中间件，无需Chrome和网络
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, Any, List, Tuple
+
+from middleware import MiddlewareManager, BaseMiddleware, Request, Response
+from middleware.cache import CachingMiddleware
+from middleware.logging import LoggingMiddleware
+from middleware.validation import ValidationMiddleware
+
+class StubHandler(BaseMiddleware):
+    """模拟业务中间件，立即返回固定结果"""
+    
+    def __init__(self, name: str = "StubHandler", actions: Tuple[str, ...] = ('api_get',)):
+        super().__init__(name)
+        self.actions = actions
+    
+    def process(self, request: Request, response: Response) -> None:
+        response.set_data('result', {'url': request.get('url'), 'ok': True})
+
+class StubPassthrough(BaseMiddleware):
+    """只实现主处理的空中间件"""
+    
+    def process(self, request: Request, response: Response) -> None:
+        pass
+
+def _quiet_jarvis_logger() -> None:
+    """真实 LoggingMiddleware 仍会格式化日志记录，但不输出到终端"""
+    jarvis_logger = logging.getLogger("jarvis")
+    if not jarvis_logger.handlers:
+        jarvis_logger.addHandler(logging.NullHandler())
+    jarvis_logger.propagate = False
+    logging.getLogger("middleware.core").disabled = True
+
+def _manager(*middlewares: BaseMiddleware) -> MiddlewareManager:
+    manager = MiddlewareManager()
+    for middleware in middlewares:
+        manager.add(middleware)
+    return manager
+
+def _api_request() -> Request:
+    return Request(action='api_get', data={'url': 'https://example.com/api', 'headers': {}, 'params': {}})
+
+def scenario_stub_chain(count: int) -> Callable[[], Response]:
+    """count 个空中间件 + 桩处理器"""
+    manager = _manager(*[StubPassthrough(f"Pass{i}") for i in range(count)], StubHandler())
+    return lambda: manager.process(_api_request())
+
+def scenario_real_stack() -> Callable[[], Response]:
+    """真实日志和验证中间件 + 桩处理器"""
+    _quiet_jarvis_logger()
+    manager = _manager(LoggingMiddleware(), ValidationMiddleware(), StubHandler())
+    return lambda: manager.process(_api_request())
+
+def scenario_validation_reject() -> Callable[[], Response]:
+    """验证失败提前返回"""
+    _quiet_jarvis_logger()
+    manager = _manager(LoggingMiddleware(), ValidationMiddleware(), StubHandler())
+    return lambda: manager.process(Request(action='api_get', data={}))
+
+def scenario_cache_hit() -> Callable[[], Response]:
+    """真实日志、验证、缓存中间件，缓存命中"""
+    _quiet_jarvis_logger()
+    manager = _manager(LoggingMiddleware(), ValidationMiddleware(), CachingMiddleware(ttls={'api_get': 60}),
+                       StubHandler())
+    manager.process(_api_request())
+    return lambda: manager.process(_api_request())
+
+def scenario_profiled_stack() -> Callable[[], Response]:
+    """开启 profile 的真实中间件栈，衡量计时开销"""
+    _quiet_jarvis_logger()
+    manager = _manager(LoggingMiddleware(), ValidationMiddleware(), StubHandler())
+    manager.profile = True
+    return lambda: manager.process(_api_request())
+
+def scenario_aprocess() -> Callable[[], Response]:
+    """异步入口处理同步中间件（线程池调度开销）"""
+    _quiet_jarvis_logger()
+    manager = _manager(LoggingMiddleware(), ValidationMiddleware(), StubHandler())
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(manager.aprocess(_api_request()))
+
+def scenario_process_many(batch: int = 100) -> Callable[[], List[Response]]:
+    """process_many 批量处理，单次调用包含 batch 个请求"""
+    _quiet_jarvis_logger()
+    manager = _manager(LoggingMiddleware(), ValidationMiddleware(), StubHandler())
+    return lambda: manager.process_many([_api_request() for _ in range(batch)], max_concurrency=8)
+
+# 名称 -> (场景工厂, 迭代次数, 每次调用包含的请求数)
+SCENARIOS: Dict[str, Tuple[Callable[[], Callable[[], Any]], int, int]] = {
+    'stub_chain_5': (lambda: scenario_stub_chain(5), 50000, 1),
+    'stub_chain_20': (lambda: scenario_stub_chain(20), 50000, 1),
+    'real_stack': (scenario_real_stack, 20000, 1),
+    'validation_reject': (scenario_validation_reject, 20000, 1),
+    'cache_hit': (scenario_cache_hit, 20000, 1),
+    'profiled_stack': (scenario_profiled_stack, 20000, 1),
+    'aprocess': (scenario_aprocess, 2000, 1),
+    'process_many_100': (scenario_process_many, 50, 100),
+}
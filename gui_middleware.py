@@ -122,11 +122,24 @@ def main():
                 ai_prompt = st.text_area("💭 AI对话:", placeholder="请输入您的问题...", height=100)
                 if st.button("🤖 发送"):
                     if ai_prompt:
-                        response = st.session_state.jarvis.call_openai_api(ai_prompt)
+                        response = st.session_state.jarvis.stream_openai_api(ai_prompt)
                         if response.success:
                             st.success("✅ AI回答:")
-                            st.write(response.data.get('answer', ''))
-                            add_log("AI对话成功")
+                            # 回答边生成边显示
+                            placeholder = st.empty()
+                            answer = ''
+                            try:
+                                for chunk in response.iter_stream():
+                                    answer += chunk
+                                    placeholder.markdown(answer + "▌")
+                                placeholder.markdown(answer)
+                                completion = response.metadata.get('completion', {})
+                                if 'ttft' in completion:
+                                    st.caption(f"首token {completion['ttft']:.2f}秒 · "
+                                               f"{completion.get('tokens_per_sec', 0):.1f} token/秒")
+                                add_log("AI对话成功")
+                            except Exception as e:
+                                st.error(f"❌ {e}")
                         else:
                             st.error(f"❌ {response.error}")
                     else:
@@ -165,13 +178,19 @@ print(f"数字总和: {sum(numbers)}")""",
             
             if st.button("▶️ 执行代码"):
                 if python_code:
-                    response = st.session_state.jarvis.execute_python_code(python_code)
+                    response = st.session_state.jarvis.stream_python_code(python_code)
                     if response.success:
-                        st.success("✅ 代码执行成功")
-                        output = response.data.get('output', '')
-                        if output:
-                            st.code(output, language="text")
-                        add_log("Python代码执行成功")
+                        # 输出边产生边显示
+                        placeholder = st.empty()
+                        output = ''
+                        try:
+                            for chunk in response.iter_stream():
+                                output += chunk
+                                placeholder.code(output, language="text")
+                            st.success("✅ 代码执行成功")
+                            add_log("Python代码执行成功")
+                        except Exception as e:
+                            st.error(f"❌ {e}")
                     else:
                         st.error(f"❌ {response.error}")
                 else:
@@ -210,9 +229,10 @@ print(f"数字总和: {sum(numbers)}")""",
             **中间件执行顺序:**
             1. LoggingMiddleware - 日志记录
             2. ValidationMiddleware - 参数验证
-            3. BrowserMiddleware - 浏览器操作
-            4. APIMiddleware - API调用
-            5. PythonExecutorMiddleware - 代码执行
+            3. CachingMiddleware - 响应缓存（可选，RESPONSE_CACHE=true 时启用）
+            4. BrowserMiddleware - 浏览器操作
+            5. APIMiddleware - API调用
+            6. PythonExecutorMiddleware - 代码执行
             """)
 
 if __name__ == "__main__":
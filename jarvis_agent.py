@@ -8,6 +8,9 @@ import sys
 import os
 import subprocess
 import argparse
+import asyncio
+import atexit
+import json
 import logging
 import time
 from middleware import MiddlewareManager, Request, Response
@@ -16,18 +19,40 @@ from middleware.api import APIMiddleware
 from middleware.python_executor import PythonExecutorMiddleware
 from middleware.logging import LoggingMiddleware
 from middleware.validation import ValidationMiddleware
+from middleware.cache import CachingMiddleware
+from middleware.scheduler import RequestScheduler, Priority
+
+def _cache_headers(cache_control: str = None) -> dict:
+    """构造缓存控制头：no-cache 刷新缓存，no-store 绕过缓存"""
+    return {'Cache-Control': cache_control} if cache_control else None
+
+def _openai_data(prompt: str, model: str, **options) -> dict:
+    """构造 api_openai 请求数据，省略值为 None 的选项"""
+    data = {'prompt': prompt, 'model': model}
+    data.update((key, value) for key, value in options.items() if value is not None)
+    return data
 
 class JarvisAgent:
     """Jarvis智能助手 - 中间件架构版本"""
     
-    def __init__(self):
+    def __init__(self, profile: bool = None):
         self._setup_logging()
         self.logger = logging.getLogger("jarvis")
         self.logger.info("初始化Jarvis Agent...")
         
-        self.middleware_manager = MiddlewareManager()
+        # 未显式指定时读取环境变量，便于 --profile 传递给GUI子进程
+        if profile is None:
+            profile = os.getenv('JARVIS_PROFILE') == '1'
+        self.middleware_manager = MiddlewareManager(profile=profile)
         self._setup_middlewares()
+        # 界面操作与后台批量任务共用调度器，交互请求优先
+        self.scheduler = RequestScheduler(
+            self.middleware_manager, workers=int(os.getenv('SCHEDULER_WORKERS', '4'))
+        )
+        self.scheduler.start()
         self._print_startup_info()
+        if profile:
+            atexit.register(self.dump_profile)
         
         self.logger.info("Jarvis Agent初始化完成")
     
@@ -35,6 +60,9 @@ class JarvisAgent:
         """设置中间件"""
         self.middleware_manager.add(LoggingMiddleware())
         self.middleware_manager.add(ValidationMiddleware())
+        # 响应缓存为可选组件：GET/GitHub 已由 HTTP 条件请求缓存处理，OpenAI 由提示词缓存处理
+        if os.getenv('RESPONSE_CACHE', 'false').lower() == 'true':
+            self.middleware_manager.add(CachingMiddleware())
         self.middleware_manager.add(BrowserMiddleware())
         self.middleware_manager.add(APIMiddleware())
         self.middleware_manager.add(PythonExecutorMiddleware())
@@ -65,88 +93,329 @@ class JarvisAgent:
         self.logger.info(f"Jarvis Agent启动 - {startup_time}")
         self.logger.info("中间件架构已加载")
     
+    def dump_profile(self) -> str:
+        """打印并保存中间件耗时统计"""
+        stats = self.middleware_manager.stats()
+        stats['scheduler'] = self.scheduler.metrics()
+        os.makedirs('logs', exist_ok=True)
+        profile_file = f'logs/profile_{time.strftime("%Y%m%d_%H%M%S")}.json'
+        with open(profile_file, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        
+        print("\n📊 中间件耗时统计 (ms)")
+        print(f"{'中间件':<28}{'动作':<24}{'阶段':<16}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, actions in stats['latency'].items():
+            for action, phases in actions.items():
+                for phase, summary in phases.items():
+                    print(f"{name:<28}{action:<24}{phase:<16}{summary['count']:>6}"
+                          f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}")
+        print(f"💾 统计已保存: {profile_file}")
+        return profile_file
+    
+    def _dispatch(self, request: Request, priority: Priority = Priority.INTERACTIVE) -> Response:
+        """经调度器处理请求并等待结果"""
+        return self.scheduler.submit(request, priority=priority, submitter='interactive').result()
+    
+    async def _adispatch(self, request: Request, priority: Priority = Priority.INTERACTIVE) -> Response:
+        """_dispatch 的协程版本：同样经调度器排队，等待结果时不阻塞事件循环"""
+        future = self.scheduler.submit(request, priority=priority, submitter='interactive')
+        return await asyncio.wrap_future(future)
+    
+    def submit(self, request: Request, priority: Priority = Priority.BULK, submitter: str = 'batch'):
+        """提交后台请求，返回结果为 Response 的 Future"""
+        return self.scheduler.submit(request, priority=priority, submitter=submitter)
+    
+    def submit_many(self, requests: list, priority: Priority = Priority.BULK, submitter: str = 'batch',
+                    max_in_flight: int = None) -> list:
+        """批量提交后台请求，返回 Future 列表；max_in_flight 限制这一批同时在调度器中的请求数"""
+        return self.scheduler.submit_many(requests, priority=priority, submitter=submitter,
+                                          max_in_flight=max_in_flight)
+    
     def open_url(self, url: str) -> Response:
         """打开URL"""
         request = Request(action='browser_open_url', data={'url': url})
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def search_google(self, query: str) -> Response:
         """Google搜索"""
         request = Request(action='browser_search_google', data={'query': query})
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def take_screenshot(self, filename: str = None) -> Response:
         """截图"""
         data = {'filename': filename} if filename else {}
         request = Request(action='browser_screenshot', data=data)
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def close_browser(self) -> Response:
         """关闭浏览器"""
         request = Request(action='browser_close')
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def open_student_housing_london(self) -> Response:
         """打开学生住房网站并选择London城市"""
         request = Request(action='browser_housing_london')
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def wait_for_manual_action(self, message: str = "请手动处理验证码或其他操作，完成后按回车继续...") -> Response:
         """等待用户手动操作"""
         request = Request(action='browser_wait_manual', data={'message': message})
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def get_current_url(self) -> Response:
         """获取当前页面URL"""
         request = Request(action='browser_get_url')
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def get_page_title(self) -> Response:
         """获取当前页面标题"""
         request = Request(action='browser_get_title')
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
     def call_api(self, url: str, method: str = "GET", headers: dict = None, data: dict = None) -> Response:
         """调用第三方API"""
         request_data = {'url': url, 'method': method, 'headers': headers or {}, 'data': data or {}}
         request = Request(action='api_call', data=request_data)
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
-    def call_api_get(self, url: str, headers: dict = None, params: dict = None) -> Response:
+    def call_api_get(self, url: str, headers: dict = None, params: dict = None,
+                     cache_control: str = None) -> Response:
         """GET请求"""
         data = {'url': url, 'headers': headers or {}, 'params': params or {}}
-        request = Request(action='api_get', data=data)
-        return self.middleware_manager.process(request)
+        request = Request(action='api_get', data=data, headers=_cache_headers(cache_control))
+        return self._dispatch(request)
     
     def call_api_post(self, url: str, data: dict = None, headers: dict = None) -> Response:
         """POST请求"""
         request_data = {'url': url, 'data': data or {}, 'headers': headers or {}}
         request = Request(action='api_post', data=request_data)
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
-    def call_openai_api(self, prompt: str, model: str = 'gpt-3.5-turbo') -> Response:
-        """调用OpenAI API"""
-        data = {'prompt': prompt, 'model': model}
+    def call_openai_api(self, prompt: str, model: str = 'gpt-3.5-turbo',
+                        temperature: float = None, cache: bool = None) -> Response:
+        """调用OpenAI API
+        
+        temperature 为 0 时默认使用提示词缓存，cache=False 不使用、cache=True 强制使用；
+        命中时 response.metadata['prompt_cache'] 为 'hit'。
+        """
+        data = _openai_data(prompt, model, temperature=temperature, prompt_cache=cache)
         request = Request(action='api_openai', data=data)
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
     
-    def call_github_api(self, endpoint: str) -> Response:
+    def call_openai_api_many(self, prompts: list, model: str = 'gpt-3.5-turbo',
+                             max_concurrency: int = 8, max_tokens: int = 1000,
+                             temperature: float = None, cache: bool = None,
+                             priority: Priority = Priority.BULK) -> list:
+        """并发调用OpenAI API，按输入顺序返回 Response 列表，单个失败只体现在对应的 Response 上
+        
+        请求以 priority（默认 BULK）提交到调度器，与界面请求共用工作线程，交互请求优先处理；
+        这一批同时在调度器中的请求不超过 max_concurrency 个，其余请求等前面的完成后再提交；
+        每个请求按提示词长度和 max_tokens 预估 token 数，在令牌桶中同时排队等待
+        请求数和 token 数预算（OPENAI_RPM/OPENAI_TPM），不会因超出额度而失败；
+        实际并发数同时受 SCHEDULER_WORKERS 和 API_MAX_CONCURRENCY 限制。
+        """
+        requests = [
+            Request(action='api_openai', data=_openai_data(prompt, model, max_tokens=max_tokens,
+                                                           temperature=temperature, prompt_cache=cache))
+            for prompt in prompts
+        ]
+        futures = self.submit_many(requests, priority=priority, submitter='openai_batch',
+                                   max_in_flight=max_concurrency)
+        return [future.result() for future in futures]
+    
+    def call_github_api(self, endpoint: str, cache_control: str = None) -> Response:
         """调用GitHub API"""
         data = {'endpoint': endpoint}
-        request = Request(action='api_github', data=data)
-        return self.middleware_manager.process(request)
+        request = Request(action='api_github', data=data, headers=_cache_headers(cache_control))
+        return self._dispatch(request)
     
-    def call_weather_api(self, city: str) -> Response:
+    def call_weather_api(self, city: str, cache_control: str = None) -> Response:
         """调用天气API"""
         data = {'city': city}
-        request = Request(action='api_weather', data=data)
-        return self.middleware_manager.process(request)
+        request = Request(action='api_weather', data=data, headers=_cache_headers(cache_control))
+        return self._dispatch(request)
+    
+    def call_weather_api_many(self, cities: list, cache_control: str = None) -> Response:
+        """批量查询多个城市的天气
+        
+        response.data['results'] 按输入顺序排列，失败的城市为 None，错误信息在 response.data['errors']；
+        城市可以是城市名或 OpenWeatherMap 城市 ID。已知 ID 的城市通过 group 接口合并查询，
+        其余城市并发查询，查到的城市名与 ID 的对应关系会被记住供下次合并。
+        """
+        data = {'cities': list(cities)}
+        request = Request(action='api_weather_many', data=data, headers=_cache_headers(cache_control))
+        return self._dispatch(request)
     
     def execute_python_code(self, code: str) -> Response:
         """执行Python代码"""
         data = {'code': code}
         request = Request(action='python_execute', data=data)
-        return self.middleware_manager.process(request)
+        return self._dispatch(request)
+    
+    def stream_api_get(self, url: str, headers: dict = None, params: dict = None,
+                       chunk_size: int = 64 * 1024) -> Response:
+        """流式GET请求，通过 response.iter_stream() 逐块读取响应体"""
+        data = {'url': url, 'headers': headers or {}, 'params': params or {},
+                'stream': True, 'chunk_size': chunk_size}
+        request = Request(action='api_get', data=data)
+        return self._dispatch(request)
+    
+    def stream_github_api(self, endpoint: str, per_page: int = 100, prefetch: int = 2) -> Response:
+        """分页GitHub API，自动跟随 Link: rel=next，通过 response.iter_stream() 逐条读取"""
+        data = {'endpoint': endpoint, 'paginate': True, 'per_page': per_page, 'prefetch': prefetch}
+        request = Request(action='api_github', data=data)
+        return self._dispatch(request)
+    
+    def stream_openai_api(self, prompt: str, model: str = 'gpt-3.5-turbo', max_tokens: int = 1000,
+                          temperature: float = None, cache: bool = None) -> Response:
+        """流式调用OpenAI API，通过 response.iter_stream() 逐段读取回答
+        
+        读取结束后 response.metadata['completion'] 包含 ttft、tokens、tokens_per_sec。
+        """
+        data = _openai_data(prompt, model, max_tokens=max_tokens, stream=True,
+                            temperature=temperature, prompt_cache=cache)
+        request = Request(action='api_openai', data=data)
+        return self._dispatch(request)
+    
+    def stream_python_code(self, code: str) -> Response:
+        """流式执行Python代码，输出产生后即可通过 response.iter_stream() 读取"""
+        data = {'code': code, 'stream': True}
+        request = Request(action='python_execute', data=data)
+        return self._dispatch(request)
+    
+    def process_many(self, requests: list, max_concurrency: int = 8, ordered: bool = True):
+        """并发处理一批相互独立的请求"""
+        return self.middleware_manager.process_many(requests, max_concurrency=max_concurrency, ordered=ordered)
+    
+    # 异步接口：与同步接口一一对应，可在同一事件循环中并发执行；
+    # 与同步接口一样经调度器按优先级排队，不绕过交互优先和后台批量的调度
+    async def aopen_url(self, url: str) -> Response:
+        """异步打开URL"""
+        request = Request(action='browser_open_url', data={'url': url})
+        return await self._adispatch(request)
+    
+    async def asearch_google(self, query: str) -> Response:
+        """异步Google搜索"""
+        request = Request(action='browser_search_google', data={'query': query})
+        return await self._adispatch(request)
+    
+    async def atake_screenshot(self, filename: str = None) -> Response:
+        """异步截图"""
+        data = {'filename': filename} if filename else {}
+        request = Request(action='browser_screenshot', data=data)
+        return await self._adispatch(request)
+    
+    async def aclose_browser(self) -> Response:
+        """异步关闭浏览器"""
+        request = Request(action='browser_close')
+        return await self._adispatch(request)
+    
+    async def aopen_student_housing_london(self) -> Response:
+        """异步打开学生住房网站并选择London城市"""
+        request = Request(action='browser_housing_london')
+        return await self._adispatch(request)
+    
+    async def aget_current_url(self) -> Response:
+        """异步获取当前页面URL"""
+        request = Request(action='browser_get_url')
+        return await self._adispatch(request)
+    
+    async def aget_page_title(self) -> Response:
+        """异步获取当前页面标题"""
+        request = Request(action='browser_get_title')
+        return await self._adispatch(request)
+    
+    async def acall_api(self, url: str, method: str = "GET", headers: dict = None, data: dict = None) -> Response:
+        """异步调用第三方API"""
+        request_data = {'url': url, 'method': method, 'headers': headers or {}, 'data': data or {}}
+        request = Request(action='api_call', data=request_data)
+        return await self._adispatch(request)
+    
+    async def acall_api_get(self, url: str, headers: dict = None, params: dict = None,
+                            cache_control: str = None) -> Response:
+        """异步GET请求"""
+        data = {'url': url, 'headers': headers or {}, 'params': params or {}}
+        request = Request(action='api_get', data=data, headers=_cache_headers(cache_control))
+        return await self._adispatch(request)
+    
+    async def acall_api_post(self, url: str, data: dict = None, headers: dict = None) -> Response:
+        """异步POST请求"""
+        request_data = {'url': url, 'data': data or {}, 'headers': headers or {}}
+        request = Request(action='api_post', data=request_data)
+        return await self._adispatch(request)
+    
+    async def acall_openai_api(self, prompt: str, model: str = 'gpt-3.5-turbo',
+                               temperature: float = None, cache: bool = None) -> Response:
+        """异步调用OpenAI API"""
+        data = _openai_data(prompt, model, temperature=temperature, prompt_cache=cache)
+        request = Request(action='api_openai', data=data)
+        return await self._adispatch(request)
+    
+    async def acall_openai_api_many(self, prompts: list, model: str = 'gpt-3.5-turbo',
+                                    max_concurrency: int = 8, max_tokens: int = 1000,
+                                    temperature: float = None, cache: bool = None,
+                                    priority: Priority = Priority.BULK) -> list:
+        """异步并发调用OpenAI API，与同步版本一样以 priority 提交到调度器"""
+        requests = [
+            Request(action='api_openai', data=_openai_data(prompt, model, max_tokens=max_tokens,
+                                                           temperature=temperature, prompt_cache=cache))
+            for prompt in prompts
+        ]
+        futures = self.submit_many(requests, priority=priority, submitter='openai_batch',
+                                   max_in_flight=max_concurrency)
+        return list(await asyncio.gather(*(asyncio.wrap_future(future) for future in futures)))
+    
+    async def acall_github_api(self, endpoint: str, cache_control: str = None) -> Response:
+        """异步调用GitHub API"""
+        data = {'endpoint': endpoint}
+        request = Request(action='api_github', data=data, headers=_cache_headers(cache_control))
+        return await self._adispatch(request)
+    
+    async def acall_weather_api(self, city: str, cache_control: str = None) -> Response:
+        """异步调用天气API"""
+        data = {'city': city}
+        request = Request(action='api_weather', data=data, headers=_cache_headers(cache_control))
+        return await self._adispatch(request)
+    
+    async def acall_weather_api_many(self, cities: list, cache_control: str = None) -> Response:
+        """异步批量查询多个城市的天气"""
+        data = {'cities': list(cities)}
+        request = Request(action='api_weather_many', data=data, headers=_cache_headers(cache_control))
+        return await self._adispatch(request)
+    
+    async def aexecute_python_code(self, code: str) -> Response:
+        """异步执行Python代码"""
+        data = {'code': code}
+        request = Request(action='python_execute', data=data)
+        return await self._adispatch(request)
+    
+    async def astream_api_get(self, url: str, headers: dict = None, params: dict = None,
+                              chunk_size: int = 64 * 1024) -> Response:
+        """异步流式GET请求"""
+        data = {'url': url, 'headers': headers or {}, 'params': params or {},
+                'stream': True, 'chunk_size': chunk_size}
+        request = Request(action='api_get', data=data)
+        return await self._adispatch(request)
+    
+    async def astream_github_api(self, endpoint: str, per_page: int = 100, prefetch: int = 2) -> Response:
+        """异步分页GitHub API"""
+        data = {'endpoint': endpoint, 'paginate': True, 'per_page': per_page, 'prefetch': prefetch}
+        request = Request(action='api_github', data=data)
+        return await self._adispatch(request)
+    
+    async def astream_openai_api(self, prompt: str, model: str = 'gpt-3.5-turbo', max_tokens: int = 1000,
+                                 temperature: float = None, cache: bool = None) -> Response:
+        """异步流式调用OpenAI API"""
+        data = _openai_data(prompt, model, max_tokens=max_tokens, stream=True,
+                            temperature=temperature, prompt_cache=cache)
+        request = Request(action='api_openai', data=data)
+        return await self._adispatch(request)
+    
+    async def astream_python_code(self, code: str) -> Response:
+        """异步流式执行Python代码"""
+        data = {'code': code, 'stream': True}
+        request = Request(action='python_execute', data=data)
+        return await self._adispatch(request)
 
 # 统一的运行功能
 def check_dependencies():
@@ -278,6 +547,7 @@ def main():
     parser.add_argument("--mode", choices=["cli", "gui"], default="gui", help="运行模式")
     parser.add_argument("--install", action="store_true", help="安装依赖")
     parser.add_argument("--check", action="store_true", help="检查环境")
+    parser.add_argument("--profile", action="store_true", help="统计中间件耗时并在退出时输出")
     
     args = parser.parse_args()
     logger.info(f"启动参数: {args}")
@@ -302,6 +572,9 @@ def main():
         print(f"❌ 请先运行 python jarvis_agent.py --install 安装依赖")
         return
     
+    if args.profile:
+        os.environ['JARVIS_PROFILE'] = '1'
+    
     logger.info(f"启动模式: {args.mode}")
     if args.mode == "cli":
         run_cli()
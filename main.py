@@ -15,6 +15,9 @@ from selenium.webdriver.support import expected_conditions as EC
 import undetected_chromedriver as uc
 from dotenv import load_dotenv
 
+from middleware.transport import get_shared_transport, openai_url
+from middleware.sse import iter_chat_completion
+
 # 加载环境变量
 load_dotenv()
 
@@ -332,9 +335,9 @@ class JarvisAgent:
         """调用第三方API - 不依赖特定API密钥"""
         try:
             if method.upper() == "GET":
-                response = requests.get(url, headers=headers, timeout=30)
+                response = get_shared_transport().request('GET', url, headers=headers)
             elif method.upper() == "POST":
-                response = requests.post(url, headers=headers, json=data, timeout=30)
+                response = get_shared_transport().request('POST', url, headers=headers, json=data)
             
             response.raise_for_status()
             print(f"✅ API调用成功: {url}")
@@ -344,8 +347,11 @@ class JarvisAgent:
             print(f"❌ API调用失败: {e}")
             return None
     
-    def call_openai_api(self, prompt, model="gpt-3.5-turbo"):
-        """调用OpenAI API - 需要API密钥"""
+    def call_openai_api(self, prompt, model="gpt-3.5-turbo", stream=False):
+        """调用OpenAI API - 需要API密钥
+        
+        stream=True 时边生成边输出到终端，返回完整回答。
+        """
         if not self.api_status['openai']:
             print("❌ OpenAI API密钥未配置")
             print("💡 请在.env文件中设置OPENAI_API_KEY")
@@ -364,11 +370,14 @@ class JarvisAgent:
                 "max_tokens": 1000
             }
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
+            if stream:
+                return self._stream_openai_api(headers, data)
+            
+            response = get_shared_transport().request(
+                'POST',
+                openai_url(),
                 headers=headers,
-                json=data,
-                timeout=30
+                json=data
             )
             response.raise_for_status()
             
@@ -382,6 +391,32 @@ class JarvisAgent:
             print(f"❌ OpenAI API调用失败: {e}")
             return None
     
+    def _stream_openai_api(self, headers, data):
+        """流式补全，逐段打印并统计首token耗时"""
+        data = dict(data, stream=True)
+        started_at = time.monotonic()
+        response = get_shared_transport().request(
+            'POST',
+            openai_url(),
+            headers=headers,
+            json=data,
+            stream=True
+        )
+        stats = {}
+        parts = []
+        try:
+            response.raise_for_status()
+            for text in iter_chat_completion(response.iter_content(chunk_size=1024), stats, started_at):
+                print(text, end="", flush=True)
+                parts.append(text)
+        finally:
+            response.close()
+        print()
+        if 'ttft' in stats:
+            print(f"✅ OpenAI API调用成功 (首token {stats['ttft']:.2f}秒, "
+                  f"{stats.get('tokens_per_sec', 0):.1f} token/秒)")
+        return ''.join(parts)
+    
     def execute_python_code(self, code):
         """执行Python代码 - 无需API密钥"""
         try:
@@ -503,9 +538,11 @@ def main():
         
         # 7. 测试OpenAI API（如果已配置）
         print("\n7️⃣ 测试AI对话功能")
-        ai_response = jarvis.call_openai_api("用一句话介绍Python编程语言")
-        if ai_response:
-            print(f"   AI回答: {ai_response}")
+        if jarvis.api_status['openai']:
+            print("   AI回答: ", end="")
+            jarvis.call_openai_api("用一句话介绍Python编程语言", stream=True)
+        else:
+            jarvis.call_openai_api("用一句话介绍Python编程语言")
         
         # 8. 执行Python代码示例
         print("\n8️⃣ 执行Python代码")
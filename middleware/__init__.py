@@ -4,13 +4,14 @@ Jarvis Middleware System
 中间件架构核心模块
 """
 
-from .core import MiddlewareManager, BaseMiddleware
+from .core import MiddlewareManager, BaseMiddleware, AsyncMiddleware
 from .request import Request, Response
 from .exceptions import MiddlewareError, ValidationError
 
 __all__ = [
     'MiddlewareManager',
     'BaseMiddleware', 
+    'AsyncMiddleware',
     'Request',
     'Response',
     'MiddlewareError',
@@ -3,27 +3,95 @@
 API中间件
 """
 
+import asyncio
+import json
+import logging
 import os
+import threading
+import time
 import requests
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from dotenv import load_dotenv
 
 from .core import BaseMiddleware
 from .request import Request, Response
-from .exceptions import MiddlewareError, AuthenticationError
+from .exceptions import MiddlewareError, AuthenticationError, RateLimitError
+from .transport import create_transport, openai_url, weather_url
+from .http_cache import HTTPCache
+from .prompt_cache import PromptCache
+from .retry import RetryEngine
+from .ratelimit import get_shared_limiter, estimate_tokens
+from .pagination import iter_pages
+from .singleflight import SingleFlight
+from .jsonstream import BodyTooLargeError, iter_json, load_json, response_chunks
+from .sse import iter_chat_completion
+from .stats import LatencyHistogram
+from .weather import get_shared_weather_cache, fetch_many, city_id
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 带这些选项的请求只走同步处理（流式响应和分页依赖同步迭代器）
+_SYNC_OPTIONS = ('stream', 'stream_json', 'json_path', 'paginate')
+
 class APIMiddleware(BaseMiddleware):
     """API调用中间件"""
     
-    def __init__(self):
+    def __init__(self, backend: str = None):
         super().__init__("APIMiddleware")
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        })
+        self.max_concurrency = int(os.getenv('API_MAX_CONCURRENCY', '8'))
+        self.timeout = float(os.getenv('TIMEOUT', '30'))
+        # 流式解析JSON时的响应体大小上限
+        self.max_body_bytes = int(float(os.getenv('API_MAX_BODY_MB', '100')) * 1024 * 1024)
+        # session: requests.Session 同步后端；async: aiohttp 共享连接池后端
+        self.transport = create_transport(backend, timeout=self.timeout)
+        # 基于 ETag/Last-Modified 的持久化条件请求缓存，HTTP_CACHE=false 关闭
+        self.http_cache = None
+        if os.getenv('HTTP_CACHE', 'true').lower() == 'true':
+            self.http_cache = HTTPCache(max_bytes=int(os.getenv('HTTP_CACHE_MAX_MB', '256')) * 1024 * 1024)
+        # OpenAI提示词/回答缓存，temperature 为 0 的请求默认使用，PROMPT_CACHE=false 关闭
+        self.prompt_cache = None
+        if os.getenv('PROMPT_CACHE', 'true').lower() == 'true':
+            ttl = float(os.getenv('PROMPT_CACHE_TTL', '0'))
+            self.prompt_cache = PromptCache(
+                max_bytes=int(os.getenv('PROMPT_CACHE_MAX_MB', '64')) * 1024 * 1024, ttl=ttl or None
+            )
+        # 按城市的天气缓存（WEATHER_CACHE_TTL），与 APITools 共享
+        self.weather_cache = get_shared_weather_cache()
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+        # 429/403限流和5xx按 MAX_RETRIES 重试
+        self.retry = RetryEngine()
+        # 按主机的令牌桶限流，与 APITools 共享预算
+        self.limiter = get_shared_limiter()
+        # 合并同时进行的相同GET请求
+        self.singleflight = SingleFlight()
+        # 流式补全的首 token 耗时和生成速度
+        self._ttft = LatencyHistogram()
+        self._completion_tokens = 0
+        self._completion_time = 0.0
+        self._completion_lock = threading.Lock()
         self.api_keys = self._load_api_keys()
+        self._handlers = {
+            'api_call': self._handle_generic_api,
+            'api_get': self._handle_get,
+            'api_post': self._handle_post,
+            'api_openai': self._handle_openai,
+            'api_github': self._handle_github,
+            'api_weather': self._handle_weather,
+            'api_weather_many': self._handle_weather_many,
+        }
+        self.actions = tuple(self._handlers)
+        # aprocess 中可在事件循环内完成的动作
+        self._async_handlers = {
+            'api_call': self._ahandle_generic_api,
+            'api_get': self._ahandle_get,
+            'api_post': self._ahandle_post,
+            'api_openai': self._ahandle_openai,
+            'api_github': self._ahandle_github,
+            'api_weather': self._ahandle_weather,
+        }
     
     def _load_api_keys(self) -> Dict[str, str]:
         """加载API密钥"""
@@ -34,22 +102,231 @@ class APIMiddleware(BaseMiddleware):
             'weather': os.getenv('WEATHER_API_KEY', '')
         }
     
+    def _send(self, method: str, url: str, tokens: int = 0, **kwargs):
+        """通过传输层发送HTTP请求，先按主机排队获取令牌，限流和临时错误自动重试
+        
+        tokens 为本次请求预计消耗的模型 token 数（仅 OpenAI 使用）。
+        """
+        def send(method: str, url: str, **kwargs):
+            self.limiter.acquire(url, tokens)
+            return self.transport.request(method, url, **kwargs)
+        
+        return self.retry.call(send, method, url, **kwargs)
+    
+    async def _asend(self, method: str, url: str, tokens: int = 0, **kwargs):
+        """_send 的协程版本，限流等待、重试退避和请求本身都不占用线程"""
+        async def send(method: str, url: str, **kwargs):
+            await self.limiter.acquire_async(url, tokens)
+            return await self.transport.arequest(method, url, **kwargs)
+        
+        return await self.retry.acall(send, method, url, **kwargs)
+    
+    def _set_error(self, response: Response, message: str, error: Exception) -> None:
+        """设置错误，限流错误附带解除时间"""
+        response.set_error(message)
+        if isinstance(error, RateLimitError):
+            response.metadata['rate_limited'] = True
+            response.metadata['rate_limit_reset'] = error.reset_at
+    
+    def stats(self) -> Dict:
+        """传输层、重试、限流、请求合并和缓存统计"""
+        stats = {
+            'transport': self.transport.stats(),
+            'retry': self.retry.stats(),
+            'rate_limit': self.limiter.stats(),
+            'singleflight': self.singleflight.stats(),
+        }
+        if self.http_cache:
+            stats['http_cache'] = self.http_cache.stats()
+        if self.prompt_cache:
+            stats['prompt_cache'] = self.prompt_cache.stats()
+        stats['weather_cache'] = self.weather_cache.stats()
+        if self._ttft.count:
+            stats['openai_stream'] = {
+                'ttft': self._ttft.summary(),
+                'tokens': self._completion_tokens,
+                'tokens_per_sec': self._completion_tokens / self._completion_time if self._completion_time else 0.0,
+            }
+        return stats
+    
+    def _get_key(self, request: Request, url: str, headers: Dict[str, str],
+                 params: Optional[Dict]) -> Tuple[str, bool, bool, int]:
+        """GET 的合并键、缓存选项和响应体大小上限，同步和异步路径共用，因此两者的相同请求也会合并"""
+        use_cache = self.http_cache is not None and request.get('http_cache') is not False
+        allow_stale = bool(request.get('allow_stale'))
+        max_bytes = request.get('max_bytes', self.max_body_bytes)
+        key = SingleFlight.make_key('GET', url, params or {}, headers or {}, use_cache, allow_stale, max_bytes)
+        return key, use_cache, allow_stale, max_bytes
+    
+    @staticmethod
+    def _get_result(response: Response, body: bytes, cache_info: Optional[Dict], shared: bool):
+        if shared:
+            response.metadata['coalesced'] = True
+        if cache_info:
+            response.metadata.update(cache_info)
+        return json.loads(body) if body else {}
+    
+    def _cached_get(self, request: Request, response: Response, url: str,
+                    headers: Dict[str, str], params: Dict = None):
+        """带条件请求缓存的GET，返回解析后的JSON
+        
+        同时进行的相同请求（方法、URL、参数、请求头和缓存选项均相同）只发送一次，
+        其余调用方等待并共享响应体，各自解析出独立的结果。
+        """
+        key, use_cache, allow_stale, max_bytes = self._get_key(request, url, headers, params)
+        (body, cache_info), shared = self.singleflight.do(
+            key, lambda: self._run_get(self._get_steps(url, headers, params, use_cache, allow_stale, max_bytes),
+                                       url, params)
+        )
+        return self._get_result(response, body, cache_info, shared)
+    
+    async def _acached_get(self, request: Request, response: Response, url: str,
+                           headers: Dict[str, str], params: Dict = None):
+        """_cached_get 的协程版本，与同步路径共用合并键和缓存流程"""
+        key, use_cache, allow_stale, max_bytes = self._get_key(request, url, headers, params)
+        (body, cache_info), shared = await self.singleflight.ado(
+            key, lambda: self._arun_get(self._get_steps(url, headers, params, use_cache, allow_stale, max_bytes),
+                                        url, params)
+        )
+        return self._get_result(response, body, cache_info, shared)
+    
+    def _run_get(self, steps, url: str, params: Optional[Dict]) -> Tuple[bytes, Optional[Dict]]:
+        """同步执行 _get_steps：请求和缓存读写都在当前线程"""
+        value = None
+        try:
+            while True:
+                kind, arg = steps.send(value)
+                if kind == 'send':
+                    value = self._send('GET', url, headers=arg, params=params, stream=True)
+                else:
+                    value = arg()
+        except StopIteration as stop:
+            return stop.value
+    
+    async def _arun_get(self, steps, url: str, params: Optional[Dict]) -> Tuple[bytes, Optional[Dict]]:
+        """异步执行 _get_steps：请求走 _asend，读取响应体和 SQLite 缓存读写放到线程池，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        value = None
+        try:
+            while True:
+                kind, arg = steps.send(value)
+                if kind == 'send':
+                    value = await self._asend('GET', url, headers=arg, params=params, stream=True)
+                else:
+                    value = await loop.run_in_executor(None, arg)
+        except StopIteration as stop:
+            return stop.value
+    
+    def _get_steps(self, url: str, headers: Dict[str, str], params: Dict,
+                   use_cache: bool, allow_stale: bool, max_bytes: int):
+        """GET 的缓存和重新验证流程，返回 (响应体, 缓存元信息)
+        
+        新鲜条目直接返回；过期条目携带验证器重新请求，304 时复用本地响应体；
+        allow_stale 时先返回过期条目，再在后台重新验证。
+        响应体以流式读取，超过 max_bytes 时在解析和写入缓存之前报错。
+        
+        流程本身不做 I/O：产出 ('send', 请求头) 表示发送请求并接收（未读取响应体的）响应，
+        产出 ('io', 函数) 表示执行读取或缓存读写并接收返回值，由 _run_get/_arun_get 驱动。
+        """
+        if not use_cache:
+            resp = yield 'send', headers
+            self._raise_for_status(resp)
+            return (yield 'io', lambda: self._read_body(resp, max_bytes)), None
+        
+        cache = self.http_cache
+        key = cache.make_key('GET', url, params, headers)
+        entry = yield 'io', lambda: cache.get(key)
+        if entry is not None:
+            if entry.is_fresh:
+                return entry.body, self._cache_info(cache, 'hit', entry)
+            if allow_stale:
+                self._revalidate_async(key, url, headers, params, entry)
+                return entry.body, self._cache_info(cache, 'stale', entry)
+        
+        request_headers = dict(headers)
+        if entry is not None:
+            request_headers.update(entry.conditional_headers())
+        resp = yield 'send', request_headers
+        if resp.status_code == 304 and entry is not None:
+            resp.close()
+            yield 'io', lambda: cache.refresh(key, resp)
+            return entry.body, self._cache_info(cache, 'revalidated', entry)
+        
+        self._raise_for_status(resp)
+        body = yield 'io', lambda: self._read_body(resp, max_bytes)
+        yield 'io', lambda: cache.put(key, url, resp, body)
+        return body, {'http_cache': 'miss', 'http_cache_counts': cache.record('miss')}
+    
+    @staticmethod
+    def _raise_for_status(resp) -> None:
+        """错误状态时释放未读取的流式响应再抛出"""
+        if not resp.ok:
+            resp.close()
+        resp.raise_for_status()
+    
+    @staticmethod
+    def _read_body(resp, max_bytes: int) -> bytes:
+        """读取完整响应体，Content-Length 或已读取的字节数超过 max_bytes 时报错"""
+        body = bytearray()
+        for chunk in response_chunks(resp, max_bytes=max_bytes):
+            body += chunk
+            if len(body) > max_bytes:
+                resp.close()
+                raise BodyTooLargeError(f"响应体超过 {max_bytes} 字节上限")
+        return bytes(body)
+    
+    def _cache_info(self, cache: HTTPCache, outcome: str, entry) -> Dict:
+        """记录缓存结果，返回写入 Response.metadata 的信息"""
+        return {
+            'http_cache': outcome,
+            'http_cache_age': entry.age,
+            'http_cache_counts': cache.record(outcome),
+        }
+    
+    def _revalidate_async(self, key: str, url: str, headers: Dict[str, str], params: Dict, entry) -> None:
+        """后台重新验证过期条目，同一条目同时只有一个验证请求"""
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        
+        def revalidate():
+            try:
+                request_headers = dict(headers)
+                request_headers.update(entry.conditional_headers())
+                resp = self._send('GET', url, headers=request_headers, params=params, stream=True)
+                if resp.status_code == 304:
+                    resp.close()
+                    self.http_cache.refresh(key, resp)
+                elif resp.ok:
+                    self.http_cache.put(key, url, resp, self._read_body(resp, self.max_body_bytes))
+                else:
+                    resp.close()
+            except Exception as e:
+                logger.warning(f"后台重新验证失败: {url} - {e}")
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+        
+        threading.Thread(target=revalidate, name="jarvis-http-revalidate", daemon=True).start()
+    
     def process(self, request: Request, response: Response) -> None:
         """处理API请求"""
-        action = request.action
-        
-        if action == 'api_call':
-            self._handle_generic_api(request, response)
-        elif action == 'api_get':
-            self._handle_get(request, response)
-        elif action == 'api_post':
-            self._handle_post(request, response)
-        elif action == 'api_openai':
-            self._handle_openai(request, response)
-        elif action == 'api_github':
-            self._handle_github(request, response)
-        elif action == 'api_weather':
-            self._handle_weather(request, response)
+        handler = self._handlers.get(request.action)
+        if handler:
+            handler(request, response)
+    
+    async def ahandle(self, request: Request, response: Response):
+        """aprocess 中的原生异步处理
+        
+        传输层提供 arequest（async 后端或 cassette）时，非流式的请求直接在事件循环中完成；
+        其余请求返回 False，由 MiddlewareManager 在线程池中执行 process。
+        """
+        handler = self._async_handlers.get(request.action)
+        if (handler is None or getattr(self.transport, 'arequest', None) is None
+                or any(request.get(option) for option in _SYNC_OPTIONS)):
+            return False
+        await handler(request, response)
     
     def _handle_generic_api(self, request: Request, response: Response):
         """处理通用API调用"""
@@ -60,9 +337,9 @@ class APIMiddleware(BaseMiddleware):
         
         try:
             if method.upper() == 'GET':
-                resp = self.session.get(url, headers=headers, timeout=30)
+                resp = self._send('GET', url, headers=headers)
             elif method.upper() == 'POST':
-                resp = self.session.post(url, json=data, headers=headers, timeout=30)
+                resp = self._send('POST', url, json=data, headers=headers)
             else:
                 response.set_error(f"不支持的HTTP方法: {method}")
                 return
@@ -70,7 +347,28 @@ class APIMiddleware(BaseMiddleware):
             resp.raise_for_status()
             response.set_data('result', resp.json() if resp.content else {})
         except Exception as e:
-            response.set_error(f"API调用失败: {e}")
+            self._set_error(response, f"API调用失败: {e}", e)
+    
+    async def _ahandle_generic_api(self, request: Request, response: Response):
+        """处理通用API调用（异步）"""
+        url = request.get('url')
+        method = request.get('method', 'GET')
+        headers = request.get('headers', {})
+        data = request.get('data', {})
+        
+        try:
+            if method.upper() == 'GET':
+                resp = await self._asend('GET', url, headers=headers)
+            elif method.upper() == 'POST':
+                resp = await self._asend('POST', url, json=data, headers=headers)
+            else:
+                response.set_error(f"不支持的HTTP方法: {method}")
+                return
+            
+            resp.raise_for_status()
+            response.set_data('result', resp.json() if resp.content else {})
+        except Exception as e:
+            self._set_error(response, f"API调用失败: {e}", e)
     
     def _handle_get(self, request: Request, response: Response):
         """处理GET请求"""
@@ -78,12 +376,73 @@ class APIMiddleware(BaseMiddleware):
         headers = request.get('headers', {})
         params = request.get('params', {})
         
+        if request.get('stream'):
+            self._handle_get_stream(request, response)
+            return
+        
+        try:
+            if request.get('stream_json') or request.get('json_path'):
+                self._handle_json_body(request, response, 'GET', url, headers=headers, params=params)
+            else:
+                response.set_data('result', self._cached_get(request, response, url, headers, params))
+        except Exception as e:
+            self._set_error(response, f"GET请求失败: {e}", e)
+    
+    async def _ahandle_get(self, request: Request, response: Response):
+        """处理GET请求（异步）"""
+        try:
+            response.set_data('result', await self._acached_get(
+                request, response, request.get('url'), request.get('headers', {}), request.get('params', {})
+            ))
+        except Exception as e:
+            self._set_error(response, f"GET请求失败: {e}", e)
+    
+    def _handle_json_body(self, request: Request, response: Response, method: str, url: str, **kwargs):
+        """增量解析JSON响应体，不整体缓冲
+        
+        json_path 选择子路径（如 'data.items'），路径之外的内容只扫描不构建；
+        stream_json 时以JSON流逐条返回该处数组的元素，否则只返回该处的值。
+        响应体超过 max_bytes（默认 API_MAX_BODY_MB）时报错。
+        """
+        path = request.get('json_path')
+        max_bytes = request.get('max_bytes', self.max_body_bytes)
+        resp = self._send(method, url, stream=True, **kwargs)
+        resp.raise_for_status()
+        chunks = response_chunks(resp, request.get('chunk_size', 64 * 1024), max_bytes)
+        if request.get('stream_json'):
+            response.set_data('status_code', resp.status_code)
+            response.set_data('json_path', path)
+            response.set_stream(iter_json(chunks, path, max_bytes), kind='json')
+        else:
+            response.set_data('result', load_json(chunks, path, max_bytes))
+    
+    def _handle_get_stream(self, request: Request, response: Response):
+        """处理流式GET请求，响应体按块返回而不整体缓冲"""
+        url = request.get('url')
+        headers = request.get('headers', {})
+        params = request.get('params', {})
+        chunk_size = request.get('chunk_size', 64 * 1024)
+        
         try:
-            resp = self.session.get(url, headers=headers, params=params, timeout=30)
+            resp = self._send('GET', url, headers=headers, params=params, stream=True)
             resp.raise_for_status()
-            response.set_data('result', resp.json() if resp.content else {})
         except Exception as e:
-            response.set_error(f"GET请求失败: {e}")
+            self._set_error(response, f"GET请求失败: {e}", e)
+            return
+        
+        response.set_data('status_code', resp.status_code)
+        response.set_data('content_type', resp.headers.get('Content-Type', ''))
+        response.set_data('content_length', int(resp.headers.get('Content-Length', 0)) or None)
+        response.set_stream(self._iter_body(resp, chunk_size), kind='bytes')
+    
+    def _iter_body(self, resp, chunk_size: int):
+        """逐块读取响应体，结束或提前停止时释放连接"""
+        try:
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            resp.close()
     
     def _handle_post(self, request: Request, response: Response):
         """处理POST请求"""
@@ -92,17 +451,77 @@ class APIMiddleware(BaseMiddleware):
         headers = request.get('headers', {})
         
         try:
-            resp = self.session.post(url, json=data, headers=headers, timeout=30)
+            if request.get('stream_json') or request.get('json_path'):
+                self._handle_json_body(request, response, 'POST', url, json=data, headers=headers)
+                return
+            resp = self._send('POST', url, json=data, headers=headers)
+            resp.raise_for_status()
+            response.set_data('result', resp.json() if resp.content else {})
+        except Exception as e:
+            self._set_error(response, f"POST请求失败: {e}", e)
+    
+    async def _ahandle_post(self, request: Request, response: Response):
+        """处理POST请求（异步）"""
+        try:
+            resp = await self._asend('POST', request.get('url'), json=request.get('data', {}),
+                                     headers=request.get('headers', {}))
             resp.raise_for_status()
             response.set_data('result', resp.json() if resp.content else {})
         except Exception as e:
-            response.set_error(f"POST请求失败: {e}")
+            self._set_error(response, f"POST请求失败: {e}", e)
     
     def _handle_openai(self, request: Request, response: Response):
         """处理OpenAI API"""
+        prepared = self._prepare_openai(request, response)
+        if prepared is None:
+            return
+        url, headers, data, reserved, cache_key = prepared
+        
+        if request.get('stream'):
+            self._handle_openai_stream(response, url, headers, data, reserved, cache_key, request.get('cache_ttl'))
+            return
+        
+        try:
+            resp = self._send('POST', url, tokens=reserved, headers=headers, json=data)
+            resp.raise_for_status()
+            self._openai_result(request, response, resp.json(), url, data, reserved, cache_key)
+        except Exception as e:
+            self._set_error(response, f"OpenAI API调用失败: {e}", e)
+    
+    async def _ahandle_openai(self, request: Request, response: Response):
+        """处理OpenAI API（异步，非流式）
+        
+        启用提示词缓存时，缓存查找和写入（SQLite）放到线程池执行。
+        """
+        loop = asyncio.get_running_loop()
+        if self.prompt_cache:
+            prepared = await loop.run_in_executor(None, self._prepare_openai, request, response)
+        else:
+            prepared = self._prepare_openai(request, response)
+        if prepared is None:
+            return
+        url, headers, data, reserved, cache_key = prepared
+        
+        try:
+            resp = await self._asend('POST', url, tokens=reserved, headers=headers, json=data)
+            resp.raise_for_status()
+            result = resp.json()
+            if cache_key:
+                await loop.run_in_executor(None, self._openai_result, request, response, result,
+                                           url, data, reserved, cache_key)
+            else:
+                self._openai_result(request, response, result, url, data, reserved, cache_key)
+        except Exception as e:
+            self._set_error(response, f"OpenAI API调用失败: {e}", e)
+    
+    def _prepare_openai(self, request: Request, response: Response) -> Optional[Tuple]:
+        """构造补全请求，返回 (url, 请求头, 请求体, 预留token数, 缓存键)
+        
+        密钥未配置或命中提示词缓存时已填充响应，返回 None。
+        """
         if not self.api_keys['openai']:
             response.set_error("OpenAI API密钥未配置")
-            return
+            return None
         
         prompt = request.get('prompt')
         model = request.get('model', 'gpt-3.5-turbo')
@@ -115,22 +534,113 @@ class APIMiddleware(BaseMiddleware):
         data = {
             "model": model,
             "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 1000
+            "max_tokens": request.get('max_tokens', 1000)
         }
+        temperature = request.get('temperature')
+        if temperature is not None:
+            data["temperature"] = temperature
         
+        cache_key = self._prompt_cache_key(request, data)
+        if cache_key and self._serve_cached_prompt(request, response, cache_key):
+            return None
+        
+        reserved = estimate_tokens(data["messages"], data["max_tokens"])
+        return openai_url(), headers, data, reserved, cache_key
+    
+    def _openai_result(self, request: Request, response: Response, result: Dict, url: str,
+                       data: Dict, reserved: int, cache_key: Optional[str]) -> None:
+        """按实际用量修正 token 预算，填充回答并写入提示词缓存"""
+        usage = result.get("usage") or {}
+        self.limiter.settle(url, reserved, usage.get("total_tokens"))
+        if "choices" in result:
+            answer = result["choices"][0]["message"]["content"]
+            response.set_data('answer', answer)
+            if cache_key:
+                self._store_prompt(cache_key, data["model"], {'answer': answer, 'usage': usage},
+                                   request.get('cache_ttl'))
+    
+    def _store_prompt(self, cache_key: str, model: str, result: Dict, ttl: float = None) -> None:
+        """写入提示词缓存；写入失败（如数据库被锁、磁盘已满）只记录日志，不影响已得到的回答"""
         try:
-            resp = self.session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            self.prompt_cache.put(cache_key, model, result, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"提示词缓存写入失败: {e}")
+    
+    def _prompt_cache_key(self, request: Request, data: Dict) -> Optional[str]:
+        """返回提示词缓存键，不使用缓存时返回 None
+        
+        prompt_cache=False 不使用缓存，True 对任意 temperature 使用缓存；
+        未指定时只缓存 temperature 为 0 的确定性请求。
+        """
+        if self.prompt_cache is None:
+            return None
+        if not request.get('prompt_cache', data.get('temperature') == 0):
+            return None
+        params = {k: v for k, v in data.items() if k not in ('model', 'messages')}
+        return PromptCache.make_key(data['model'], data['messages'], params)
+    
+    def _serve_cached_prompt(self, request: Request, response: Response, cache_key: str) -> bool:
+        """命中缓存时直接填充响应（流式请求以单段文本流返回），返回是否命中"""
+        cached = self.prompt_cache.get(cache_key)
+        response.metadata['prompt_cache'] = 'hit' if cached else 'miss'
+        if cached is None:
+            return False
+        result, age, tier = cached
+        response.metadata['prompt_cache_tier'] = tier
+        response.metadata['prompt_cache_age'] = age
+        if request.get('stream'):
+            response.set_data('model', request.get('model', 'gpt-3.5-turbo'))
+            response.metadata['completion'] = {'ttft': 0.0, 'tokens': (result.get('usage') or {}).get(
+                'completion_tokens', 0), 'duration': 0.0, 'usage': result.get('usage')}
+            response.set_stream(iter((result['answer'],)), kind='text')
+        else:
+            response.set_data('answer', result['answer'])
+        return True
+    
+    def _handle_openai_stream(self, response: Response, url: str, headers: Dict[str, str],
+                              data: Dict, reserved: int, cache_key: str = None, cache_ttl: float = None):
+        """流式补全，文本增量以文本流返回，首 token 耗时和 token/秒 写入 metadata
+        
+        cache_key 不为空时，完整读取且正常结束的回答写入提示词缓存。
+        """
+        data = dict(data, stream=True, stream_options={"include_usage": True})
+        started_at = time.monotonic()
+        try:
+            resp = self._send('POST', url, tokens=reserved, headers=headers, json=data, stream=True)
             resp.raise_for_status()
-            result = resp.json()
-            if "choices" in result:
-                response.set_data('answer', result["choices"][0]["message"]["content"])
         except Exception as e:
-            response.set_error(f"OpenAI API调用失败: {e}")
+            self._set_error(response, f"OpenAI API调用失败: {e}", e)
+            return
+        
+        response.set_data('model', data['model'])
+        completion = response.metadata.setdefault('completion', {})
+        stream = self._iter_completion(resp, completion, started_at, url, reserved)
+        if cache_key:
+            stream = self._cache_completion(stream, completion, cache_key, data['model'], cache_ttl)
+        response.set_stream(stream, kind='text')
+    
+    def _cache_completion(self, stream, completion: Dict, cache_key: str, model: str, cache_ttl: float):
+        """透传流式文本，结束后缓存完整回答"""
+        parts = []
+        for text in stream:
+            parts.append(text)
+            yield text
+        if completion.get('finish_reason'):
+            self._store_prompt(cache_key, model, {'answer': ''.join(parts), 'usage': completion.get('usage')},
+                               cache_ttl)
+    
+    def _iter_completion(self, resp, completion: Dict, started_at: float, url: str, reserved: int):
+        """产出补全文本，结束时记录统计并按实际用量修正 token 预算"""
+        try:
+            yield from iter_chat_completion(self._iter_body(resp, 1024), completion, started_at)
+        finally:
+            if 'ttft' in completion:
+                self._ttft.record(completion['ttft'])
+                with self._completion_lock:
+                    self._completion_tokens += completion['tokens']
+                    self._completion_time += completion['duration'] - completion['ttft']
+            usage = completion.get('usage') or {}
+            self.limiter.settle(url, reserved, usage.get('total_tokens'))
     
     def _handle_github(self, request: Request, response: Response):
         """处理GitHub API"""
@@ -142,12 +652,42 @@ class APIMiddleware(BaseMiddleware):
         
         url = f"https://api.github.com/{endpoint}"
         
+        if request.get('paginate'):
+            self._handle_github_pages(request, response, url, headers)
+            return
+        
         try:
-            resp = self.session.get(url, headers=headers, timeout=30)
-            resp.raise_for_status()
-            response.set_data('result', resp.json())
+            response.set_data('result', self._cached_get(request, response, url, headers))
         except Exception as e:
-            response.set_error(f"GitHub API调用失败: {e}")
+            self._set_error(response, f"GitHub API调用失败: {e}", e)
+    
+    async def _ahandle_github(self, request: Request, response: Response):
+        """处理GitHub API（异步，不分页）"""
+        headers = {}
+        if self.api_keys['github']:
+            headers["Authorization"] = f"token {self.api_keys['github']}"
+        url = f"https://api.github.com/{request.get('endpoint')}"
+        
+        try:
+            response.set_data('result', await self._acached_get(request, response, url, headers))
+        except Exception as e:
+            self._set_error(response, f"GitHub API调用失败: {e}", e)
+    
+    def _handle_github_pages(self, request: Request, response: Response, url: str, headers: Dict[str, str]):
+        """分页GitHub API，条目以JSON流的形式逐个返回"""
+        per_page = request.get('per_page', 100)
+        separator = '&' if '?' in url else '?'
+        first_url = f"{url}{separator}per_page={per_page}" if per_page else url
+        
+        def fetch(page_url: str):
+            return self._send('GET', page_url, headers=headers)
+        
+        response.set_data('endpoint', request.get('endpoint'))
+        response.set_data('paginated', True)
+        # 已获取的页数随迭代更新
+        page_stats = response.metadata.setdefault('github_pages', {})
+        response.set_stream(iter_pages(fetch, first_url, prefetch=request.get('prefetch', 2),
+                                       stats=page_stats), kind='json')
     
     def _handle_weather(self, request: Request, response: Response):
         """处理天气API"""
@@ -156,17 +696,83 @@ class APIMiddleware(BaseMiddleware):
             return
         
         city = request.get('city')
-        url = "http://api.openweathermap.org/data/2.5/weather"
-        params = {
-            "q": city,
-            "appid": self.api_keys['weather'],
-            "units": "metric",
-            "lang": "zh_cn"
-        }
+        if self._serve_cached_weather(request, response, city):
+            return
+        
+        try:
+            result = self._fetch_weather(city)
+            self.weather_cache.put(city, result)
+            response.set_data('result', result)
+        except Exception as e:
+            self._set_error(response, f"天气API调用失败: {e}", e)
+    
+    async def _ahandle_weather(self, request: Request, response: Response):
+        """处理天气API（异步）"""
+        if not self.api_keys['weather']:
+            response.set_error("天气API密钥未配置")
+            return
+        
+        city = request.get('city')
+        if self._serve_cached_weather(request, response, city):
+            return
         
         try:
-            resp = self.session.get(url, params=params, timeout=30)
+            resp = await self._asend('GET', weather_url(), params=self._weather_query(city))
             resp.raise_for_status()
-            response.set_data('result', resp.json())
+            result = resp.json()
+            self.weather_cache.put(city, result)
+            response.set_data('result', result)
         except Exception as e:
-            response.set_error(f"天气API调用失败: {e}")
\ No newline at end of file
+            self._set_error(response, f"天气API调用失败: {e}", e)
+    
+    def _serve_cached_weather(self, request: Request, response: Response, city) -> bool:
+        """命中天气缓存时直接填充响应，返回是否命中；Cache-Control: no-cache/no-store 时跳过缓存"""
+        if request.get_header('Cache-Control') not in ('no-cache', 'no-store'):
+            cached = self.weather_cache.get(city)
+            if cached is not None:
+                response.set_data('result', cached[0])
+                response.metadata['weather_cache'] = 'hit'
+                response.metadata['weather_cache_age'] = cached[1]
+                return True
+        response.metadata['weather_cache'] = 'miss'
+        return False
+    
+    def _weather_params(self, **params) -> Dict:
+        return dict(params, appid=self.api_keys['weather'], units="metric", lang="zh_cn")
+    
+    def _weather_query(self, city) -> Dict:
+        """单个城市的查询参数，数字按城市 ID 查询"""
+        known = city_id(city)
+        return self._weather_params(id=known) if known is not None else self._weather_params(q=city)
+    
+    def _fetch_weather(self, city) -> Dict:
+        """查询单个城市"""
+        resp = self._send('GET', weather_url(), params=self._weather_query(city))
+        resp.raise_for_status()
+        return resp.json()
+    
+    def _fetch_weather_group(self, ids) -> list:
+        """通过 group 接口一次查询多个城市 ID"""
+        params = self._weather_params(id=','.join(str(known) for known in ids))
+        resp = self._send('GET', weather_url('group'), params=params)
+        resp.raise_for_status()
+        return resp.json().get('list', [])
+    
+    def _handle_weather_many(self, request: Request, response: Response):
+        """批量查询多个城市的天气，结果按输入顺序返回，单个城市失败记录在 errors 中"""
+        if not self.api_keys['weather']:
+            response.set_error("天气API密钥未配置")
+            return
+        
+        cities = list(request.get('cities'))
+        refresh = request.get_header('Cache-Control') in ('no-cache', 'no-store')
+        results, errors, info = fetch_many(
+            cities, self._fetch_weather, self._fetch_weather_group, self.weather_cache,
+            max_workers=self.max_concurrency, refresh=refresh
+        )
+        response.metadata['weather'] = info
+        if errors and all(result is None for result in results):
+            response.set_error(f"天气API调用失败: {next(iter(errors.values()))}")
+            return
+        response.set_data('results', results)
+        response.set_data('errors', errors)
\ No newline at end of file
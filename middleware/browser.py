@@ -19,10 +19,24 @@ from .exceptions import MiddlewareError
 class BrowserMiddleware(BaseMiddleware):
     """浏览器操作中间件"""
     
+    action_prefixes = ('browser_',)
+    # 只有一个Chrome驱动实例，操作必须串行
+    max_concurrency = 1
+    
     def __init__(self):
         super().__init__("BrowserMiddleware")
         self.driver = None
         self.wait = None
+        self._handlers = {
+            'browser_open_url': self._open_url,
+            'browser_search_google': self._search_google,
+            'browser_screenshot': self._take_screenshot,
+            'browser_close': self._close_browser,
+            'browser_housing_london': self._open_student_housing_london,
+            'browser_wait_manual': self._wait_for_manual_action,
+            'browser_get_url': self._get_current_url,
+            'browser_get_title': self._get_page_title,
+        }
     
     def before_process(self, request: Request) -> None:
         """初始化浏览器"""
@@ -31,24 +45,9 @@ class BrowserMiddleware(BaseMiddleware):
     
     def process(self, request: Request, response: Response) -> None:
         """处理浏览器操作"""
-        action = request.action
-        
-        if action == 'browser_open_url':
-            self._open_url(request, response)
-        elif action == 'browser_search_google':
-            self._search_google(request, response)
-        elif action == 'browser_screenshot':
-            self._take_screenshot(request, response)
-        elif action == 'browser_close':
-            self._close_browser(request, response)
-        elif action == 'browser_housing_london':
-            self._open_student_housing_london(request, response)
-        elif action == 'browser_wait_manual':
-            self._wait_for_manual_action(request, response)
-        elif action == 'browser_get_url':
-            self._get_current_url(request, response)
-        elif action == 'browser_get_title':
-            self._get_page_title(request, response)
+        handler = self._handlers.get(request.action)
+        if handler:
+            handler(request, response)
     
     def _setup_browser(self):
         """设置浏览器"""
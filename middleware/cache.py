@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+响应缓存中间件
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from .core import BaseMiddleware
+from .request import Request, Response
+
+class CachingMiddleware(BaseMiddleware):
+    """幂等动作的TTL/LRU响应缓存中间件
+    
+    可选组件，JarvisAgent 仅在 RESPONSE_CACHE=true 时注册，需放在业务中间件之前。
+    通过 request.headers['Cache-Control'] 控制单次请求：
+    no-store 完全绕过缓存，no-cache 跳过查找但用新结果刷新缓存。
+    使用默认配置且启用了 HTTP 条件请求缓存（HTTP_CACHE）时，HTTP_CACHED_ACTIONS 中的动作
+    不在此缓存，由 APIMiddleware 按服务端的 Cache-Control/ETag 缓存和重新验证；
+    此时默认配置不缓存任何动作，需通过 ttls 显式指定。
+    max_bytes 按 UTF-8 编码后的字节数计算。
+    """
+    
+    # api_weather 不在此缓存：APIMiddleware 按规范化城市名缓存天气（WEATHER_CACHE_TTL）
+    DEFAULT_TTLS = {
+        'api_get': 60,
+        'api_github': 300,
+    }
+    # 由 APIMiddleware 的 HTTP 条件请求缓存处理的动作
+    HTTP_CACHED_ACTIONS = ('api_get', 'api_github')
+    
+    def __init__(self, ttls: Dict[str, float] = None, max_entries: int = 1024,
+                 max_bytes: int = 64 * 1024 * 1024):
+        super().__init__("CachingMiddleware")
+        if ttls is None:
+            ttls = dict(self.DEFAULT_TTLS)
+            if os.getenv('HTTP_CACHE', 'true').lower() == 'true':
+                for action in self.HTTP_CACHED_ACTIONS:
+                    ttls.pop(action, None)
+        self.ttls = dict(ttls)
+        self.actions = tuple(self.ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (过期时间, 写入时间, 序列化后的响应数据, 字节数)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def handles(self, action: str) -> bool:
+        """只处理配置了TTL的动作（没有配置时不处理任何动作）"""
+        return action in self.ttls
+    
+    def _make_key(self, request: Request) -> Optional[str]:
+        """动作 + 规范化的请求数据"""
+        try:
+            return request.action + ':' + json.dumps(request.data, sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return None
+    
+    def process(self, request: Request, response: Response) -> None:
+        """命中缓存时直接返回结果"""
+        control = request.get_header('Cache-Control')
+        if control == 'no-store':
+            response.metadata['cache'] = 'bypass'
+            return
+        key = self._make_key(request)
+        request.metadata['cache_key'] = key
+        if key is None:
+            return
+        if control == 'no-cache':
+            response.metadata['cache'] = 'refresh'
+            return
+        
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                response.metadata['cache'] = 'miss'
+                return
+            self._entries.move_to_end(key)
+            self.hits += 1
+        
+        expires_at, stored_at, payload, _ = entry
+        response.data = json.loads(payload)
+        response.metadata['cache'] = 'hit'
+        response.metadata['cache_age'] = now - stored_at
+        response.finish()
+    
+    def after_process(self, request: Request, response: Response) -> None:
+        """保存成功的新结果"""
+        if response.metadata.get('cache') not in ('miss', 'refresh') or not response.success:
+            return
+        if response.is_streaming:
+            return
+        key = request.metadata.get('cache_key')
+        if key is None:
+            return
+        try:
+            payload = json.dumps(response.data, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return
+        size = len(key.encode('utf-8')) + len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        
+        now = time.monotonic()
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (now + self.ttls[request.action], now, payload, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _discard(self, key: str) -> None:
+        """移除条目（调用方持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中/淘汰计数"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
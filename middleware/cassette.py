@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+HTTP录制/回放（cassette）
+record 模式把真实的请求/响应写入带索引的 cassette 文件，replay 模式通过 mmap 从文件回放，
+可模拟录制时的上游延迟。用于离线基准测试和回归测试，把框架开销与上游延迟分开衡量。
+
+文件格式：文件头 MAGIC 之后依次为记录，每条记录为
+    struct('<III') 键长度/元数据长度/响应体长度 + 键 + 元数据(JSON) + 响应体
+关闭时在末尾追加索引(JSON) + struct('<Q') 索引偏移 + INDEX_MAGIC；
+没有索引（录制进程异常退出）时顺序扫描记录头重建索引。
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json as jsonlib
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .exceptions import MiddlewareError
+
+MAGIC = b'JCASSET1'
+INDEX_MAGIC = b'JCASIDX1'
+_RECORD = struct.Struct('<III')
+_TRAILER = struct.Struct('<Q')
+
+# 不写入 cassette、也不参与匹配的查询参数（API 密钥）
+SECRET_PARAMS = ('appid', 'api_key', 'apikey', 'key', 'access_token', 'token')
+# 参与匹配的请求头；条件请求头不参与，回放结果不受本地 HTTP 缓存状态影响
+# （录制时建议设置 HTTP_CACHE=false，避免录下只对已缓存条目有意义的 304）
+VARY_HEADERS = ('Accept', 'Range', 'If-Range')
+# 不写入 cassette 的响应头
+_SKIP_HEADERS = ('set-cookie', 'connection', 'keep-alive', 'transfer-encoding', 'content-encoding')
+
+class CassetteMissError(MiddlewareError):
+    """回放时没有匹配的录制"""
+    pass
+
+def _clean_url(url: str, params: Any = None) -> str:
+    """合并查询参数、去除密钥参数并排序"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        items = params.items() if hasattr(params, 'items') else params
+        for name, value in items:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            query.extend((name, str(item)) for item in values if item is not None)
+    query = sorted((name, value) for name, value in query if name.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+def request_key(method: str, url: str, params: Any = None, headers: Dict[str, str] = None,
+                json: Any = None, data: Any = None) -> str:
+    """请求的匹配键：方法 + 规范化 URL + 相关请求头 + 请求体摘要"""
+    headers = {name.lower(): value for name, value in (headers or {}).items()}
+    if json is not None:
+        body = jsonlib.dumps(json, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    elif isinstance(data, (bytes, str)):
+        body = data.encode('utf-8') if isinstance(data, str) else data
+    elif isinstance(data, dict):
+        body = urlencode(sorted(data.items())).encode('utf-8')
+    elif data is not None:
+        # 流式请求体（如上传）只能按存在与否匹配
+        body = b'<stream>'
+    else:
+        body = b''
+    material = jsonlib.dumps([
+        method.upper(), _clean_url(url, params),
+        [headers.get(name.lower(), '') for name in VARY_HEADERS],
+        hashlib.sha256(body).hexdigest(),
+    ], ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class CassetteResponse:
+    """回放或录制得到的响应，接口与 requests.Response 的常用部分一致"""
+
+    def __init__(self, method: str, url: str, status_code: int, headers: Dict[str, str],
+                 body, elapsed: float = 0.0):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.reason = ''
+        self.elapsed_seconds = elapsed
+        # bytes 或 mmap 上的 memoryview，读取前不复制
+        self._body = body
+        self._content = body if isinstance(body, bytes) else None
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = bytes(self._body)
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return jsonlib.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            kind = '客户端错误' if self.status_code < 500 else '服务器错误'
+            raise requests.HTTPError(f"{self.status_code} {kind}: {self.url}", response=self)
+
+    def iter_content(self, chunk_size: int = 8192, decode_unicode: bool = False) -> Iterator[bytes]:
+        body = self._body
+        chunk_size = chunk_size or len(body) or 1
+        for start in range(0, len(body), chunk_size):
+            yield bytes(body[start:start + chunk_size])
+
+    def close(self) -> None:
+        pass
+
+class Cassette:
+    """cassette 文件，线程安全
+
+    record 模式重新录制（覆盖已有文件）；replay 模式只回放；auto 模式回放已录制的请求，
+    其余请求录制后追加到文件。相同请求的多次录制按顺序回放，超出录制次数后重复最后一次。
+    """
+
+    def __init__(self, path: str, mode: str = 'replay'):
+        if mode not in ('record', 'replay', 'auto'):
+            raise MiddlewareError(f"未知的cassette模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        # 键 -> [(元数据, 响应体偏移, 响应体长度)]
+        self._index: Dict[str, List[tuple]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._data_end = len(MAGIC)
+        self.counts = {'recorded': 0, 'replayed': 0, 'misses': 0}
+        if mode == 'replay' and not os.path.exists(path):
+            raise MiddlewareError(f"cassette文件不存在: {path}")
+        if mode != 'record' and os.path.exists(path) and os.path.getsize(path) > len(MAGIC):
+            self._load()
+        if mode != 'replay':
+            self._open_for_append(fresh=mode == 'record')
+            atexit.register(self.close)
+
+    def _load(self) -> None:
+        """读取末尾索引，没有索引时扫描记录"""
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise MiddlewareError(f"不是cassette文件: {self.path}")
+            size = os.fstat(f.fileno()).st_size
+            tail = len(INDEX_MAGIC) + _TRAILER.size
+            if size >= len(MAGIC) + tail:
+                f.seek(size - tail)
+                trailer = f.read(tail)
+                if trailer[_TRAILER.size:] == INDEX_MAGIC:
+                    index_offset = _TRAILER.unpack(trailer[:_TRAILER.size])[0]
+                    f.seek(index_offset)
+                    index = jsonlib.loads(f.read(size - tail - index_offset))
+                    self._index = {key: [tuple(entry) for entry in entries] for key, entries in index.items()}
+                    self._data_end = index_offset
+                    return
+            self._data_end = self._scan(f, size)
+
+    def _scan(self, f, size: int) -> int:
+        """顺序读取记录头重建索引，返回最后一条完整记录的结束位置"""
+        offset = len(MAGIC)
+        while offset + _RECORD.size <= size:
+            f.seek(offset)
+            key_len, meta_len, body_len = _RECORD.unpack(f.read(_RECORD.size))
+            end = offset + _RECORD.size + key_len + meta_len + body_len
+            if end > size:
+                break
+            key = f.read(key_len).decode('ascii')
+            meta = jsonlib.loads(f.read(meta_len))
+            self._index.setdefault(key, []).append((meta, end - body_len, body_len))
+            offset = end
+        return offset
+
+    def _open_for_append(self, fresh: bool = False) -> None:
+        """以追加方式打开，去掉旧索引或不完整的记录；fresh 时新建文件"""
+        if not fresh and os.path.exists(self.path) and os.path.getsize(self.path) > len(MAGIC):
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(self._data_end)
+            self._file.seek(self._data_end)
+        else:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'w+b')
+            self._file.write(MAGIC)
+            self._data_end = len(MAGIC)
+        self._file.flush()
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        """返回覆盖到 end 的只读映射（调用方持有锁）
+
+        录制追加数据后重新映射；旧映射可能仍被已返回的响应引用，由垃圾回收释放。
+        """
+        if self._map is None or len(self._map) < end:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get(self, key: str) -> Optional[CassetteResponse]:
+        with self._lock:
+            entries = self._index.get(key)
+            if not entries:
+                self.counts['misses'] += 1
+                return None
+            position = self._cursor.get(key, 0)
+            self._cursor[key] = position + 1
+            meta, offset, length = entries[min(position, len(entries) - 1)]
+            self.counts['replayed'] += 1
+            body = memoryview(self._mapped(offset + length))[offset:offset + length] if length else b''
+        return CassetteResponse(meta['method'], meta['url'], meta['status'], meta['headers'],
+                                body, meta.get('elapsed', 0.0))
+
+    def put(self, key: str, method: str, url: str, resp, elapsed: float) -> CassetteResponse:
+        """录制响应（读取完整响应体），返回可重复读取的响应"""
+        body = resp.content
+        headers = {name: value for name, value in resp.headers.items() if name.lower() not in _SKIP_HEADERS}
+        meta = {'method': method.upper(), 'url': url, 'status': resp.status_code,
+                'headers': headers, 'elapsed': elapsed}
+        meta_bytes = jsonlib.dumps(meta, ensure_ascii=False).encode('utf-8')
+        key_bytes = key.encode('ascii')
+        with self._lock:
+            self._file.write(_RECORD.pack(len(key_bytes), len(meta_bytes), len(body)))
+            self._file.write(key_bytes)
+            self._file.write(meta_bytes)
+            self._file.write(body)
+            self._file.flush()
+            offset = self._data_end + _RECORD.size + len(key_bytes) + len(meta_bytes)
+            self._data_end = offset + len(body)
+            self._index.setdefault(key, []).append((meta, offset, len(body)))
+            # 本次会话中已经读取过的位置不受新录制影响
+            self._cursor[key] = len(self._index[key])
+            self.counts['recorded'] += 1
+        return CassetteResponse(method.upper(), url, resp.status_code, headers, body, elapsed)
+
+    def close(self) -> None:
+        """写入索引并关闭文件"""
+        with self._lock:
+            if self._file is not None:
+                index_bytes = jsonlib.dumps(self._index, ensure_ascii=False).encode('utf-8')
+                self._file.seek(self._data_end)
+                self._file.write(index_bytes)
+                self._file.write(_TRAILER.pack(self._data_end))
+                self._file.write(INDEX_MAGIC)
+                self._file.truncate()
+                self._file.close()
+                self._file = None
+            if self._map is not None:
+                try:
+                    self._map.close()
+                except BufferError:
+                    # 仍有响应引用映射，留给垃圾回收
+                    pass
+                self._map = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counts, mode=self.mode, path=self.path,
+                        entries=sum(len(entries) for entries in self._index.values()))
+
+class CassetteTransport:
+    """包装传输对象，按模式录制或回放请求
+
+    latency 为回放时模拟的上游延迟：None 不等待（全速），'recorded' 使用录制时的耗时，
+    数字为固定秒数。其余属性（session、config、timeout 等）转发给被包装的传输。
+    """
+
+    def __init__(self, inner, cassette: Cassette, latency=None):
+        self.inner = inner
+        self.cassette = cassette
+        self.latency = latency
+        self.name = f"cassette:{getattr(inner, 'name', 'session')}"
+
+    def __getattr__(self, name: str):
+        return getattr(self.inner, name)
+
+    def _key(self, method: str, url: str, kwargs: Dict) -> str:
+        return request_key(method, url, kwargs.get('params'), kwargs.get('headers'),
+                           kwargs.get('json'), kwargs.get('data'))
+
+    def _delay(self, resp: CassetteResponse) -> float:
+        if self.latency == 'recorded':
+            return resp.elapsed_seconds
+        return float(self.latency or 0)
+
+    def _replay(self, method: str, url: str, key: str) -> Optional[CassetteResponse]:
+        if self.cassette.mode == 'record':
+            return None
+        resp = self.cassette.get(key)
+        if resp is None and self.cassette.mode == 'replay':
+            raise CassetteMissError(f"cassette中没有匹配的请求: {method.upper()} {_clean_url(url)}")
+        return resp
+
+    def request(self, method: str, url: str, **kwargs):
+        key = self._key(method, url, kwargs)
+        resp = self._replay(method, url, key)
+        if resp is not None:
+            delay = self._delay(resp)
+            if delay:
+                time.sleep(delay)
+            return resp
+        started_at = time.monotonic()
+        live = self.inner.request(method, url, **kwargs)
+        try:
+            # 录制时读取完整响应体，流式响应在录制模式下不再逐块到达
+            live.content
+            elapsed = time.monotonic() - started_at
+        finally:
+            live.close()
+        return self.cassette.put(key, method, _clean_url(url, kwargs.get('params')), live, elapsed)
+
+    async def arequest(self, method: str, url: str, **kwargs):
+        key = self._key(method, url, kwargs)
+        resp = self._replay(method, url, key)
+        if resp is not None:
+            delay = self._delay(resp)
+            if delay:
+                await asyncio.sleep(delay)
+            return resp
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.request(method, url, **kwargs)
+        )
+
+    def close(self) -> None:
+        self.cassette.close()
+        self.inner.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.inner.stats(), cassette=self.cassette.stats())
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+def cassette_from_env(transport):
+    """JARVIS_CASSETTE 指定 cassette 文件时包装传输对象
+
+    JARVIS_CASSETTE_MODE: record/replay/auto（默认 replay，auto 回放已录制的请求并录制其余请求）；
+    JARVIS_CASSETTE_LATENCY: 回放延迟，'recorded' 或秒数，默认不等待。
+    同一进程中同一文件只打开一次。
+    """
+    path = os.getenv('JARVIS_CASSETTE')
+    if not path:
+        return transport
+    mode = os.getenv('JARVIS_CASSETTE_MODE', 'replay').lower()
+    latency = os.getenv('JARVIS_CASSETTE_LATENCY') or None
+    if latency not in (None, 'recorded'):
+        latency = float(latency)
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path, mode)
+    return CassetteTransport(transport, cassette, latency)
@@ -4,19 +4,55 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Callable, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Callable, Any, Dict, Tuple, Optional, Iterable, Iterator, Union, NamedTuple
+import asyncio
+import functools
 import logging
+import threading
+import time
+import weakref
 from .request import Request, Response
 from .exceptions import MiddlewareError
+from .stats import LatencyHistogram
 
 logger = logging.getLogger(__name__)
 
 class BaseMiddleware(ABC):
     """中间件基类"""
     
+    # 声明处理的动作；两者都为空表示处理所有动作（如日志中间件）
+    actions: Tuple[str, ...] = ()
+    action_prefixes: Tuple[str, ...] = ()
+    # 钩子是否为协程函数
+    is_async = False
+    # 同时执行该中间件钩子的最大并发数，None 表示不限制
+    max_concurrency: Optional[int] = None
+    # 可选的原生异步处理协程 ahandle(request, response)：aprocess 中代替在线程池执行的 process，
+    # 返回 False 表示该请求不支持异步处理，回退到线程池执行 process
+    ahandle: Optional[Callable] = None
+    
     def __init__(self, name: str = None):
         self.name = name or self.__class__.__name__
-        self.enabled = True
+        # 注册了该中间件的管理器，启用状态变化时通知其重新编译中间件链
+        self._managers = weakref.WeakSet()
+        self._enabled = True
+    
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+    
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        self._enabled = value
+        for manager in list(getattr(self, '_managers', ())):
+            manager.invalidate()
+    
+    def handles(self, action: str) -> bool:
+        """是否处理该动作"""
+        if not self.actions and not self.action_prefixes:
+            return True
+        return action in self.actions or action.startswith(self.action_prefixes)
     
     @abstractmethod
     def process(self, request: Request, response: Response) -> None:
@@ -34,51 +70,362 @@ class BaseMiddleware(ABC):
     def on_error(self, request: Request, response: Response, error: Exception) -> None:
         """错误处理"""
         logger.error(f"Middleware {self.name} error: {error}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """中间件自身的运行统计，由 MiddlewareManager.stats() 汇总"""
+        return {}
+
+class AsyncMiddleware(BaseMiddleware):
+    """异步中间件基类，钩子均为协程"""
+    
+    is_async = True
+    
+    @abstractmethod
+    async def process(self, request: Request, response: Response) -> None:
+        """处理请求"""
+        pass
+    
+    async def before_process(self, request: Request) -> None:
+        """预处理"""
+        pass
+    
+    async def after_process(self, request: Request, response: Response) -> None:
+        """后处理"""
+        pass
+    
+    async def on_error(self, request: Request, response: Response, error: Exception) -> None:
+        """错误处理"""
+        logger.error(f"Middleware {self.name} error: {error}")
+
+# 未被子类覆盖时不需要调用的默认钩子
+_NOOP_HOOKS = frozenset((
+    BaseMiddleware.before_process,
+    BaseMiddleware.after_process,
+    AsyncMiddleware.before_process,
+    AsyncMiddleware.after_process,
+))
+
+class _Chain(NamedTuple):
+    """某个动作编译后的中间件链：各阶段需要依次调用的函数"""
+    before: Tuple[Callable, ...]
+    process: Tuple[Callable, ...]
+    after: Tuple[Callable, ...]
+    on_error: Tuple[Callable, ...]
+    abefore: Tuple[Callable, ...]
+    aprocess: Tuple[Callable, ...]
+    aafter: Tuple[Callable, ...]
+    aon_error: Tuple[Callable, ...]
 
 class MiddlewareManager:
     """中间件管理器"""
     
-    def __init__(self):
+    def __init__(self, max_workers: Optional[int] = None, profile: bool = False):
         self.middlewares: List[BaseMiddleware] = []
         self.logger = logging.getLogger(__name__)
+        # 动作 -> 关心该动作的中间件链（按注册顺序），首次出现时计算
+        self._routes: Dict[str, Tuple[BaseMiddleware, ...]] = {}
+        # 动作 -> 编译后的中间件链，中间件增删、启用状态或 profile 变化时清空
+        self._chains: Dict[str, _Chain] = {}
+        # aprocess 中同步中间件使用的线程池
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # process 中异步中间件使用的后台事件循环
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        # 中间件名 -> 并发限制信号量
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        # (中间件名, 事件循环) -> 异步信号量，asyncio.Semaphore 不能跨事件循环共用
+        self._async_limits: Dict[Tuple[str, asyncio.AbstractEventLoop], asyncio.Semaphore] = {}
+        # 开启后按 (中间件, 动作, 阶段) 记录钩子耗时
+        self._profile = profile
+        self._latency: Dict[Tuple[str, str, str], LatencyHistogram] = {}
     
     def add(self, middleware: BaseMiddleware) -> None:
         """添加中间件"""
         self.middlewares.append(middleware)
+        middleware._managers.add(self)
+        if middleware.max_concurrency:
+            self._limits[middleware.name] = threading.BoundedSemaphore(middleware.max_concurrency)
+        self._routes = {}
+        self.invalidate()
         self.logger.info(f"Added middleware: {middleware.name}")
     
     def remove(self, middleware_name: str) -> None:
         """移除中间件"""
+        for middleware in self.middlewares:
+            if middleware.name == middleware_name:
+                middleware._managers.discard(self)
         self.middlewares = [m for m in self.middlewares if m.name != middleware_name]
+        self._limits.pop(middleware_name, None)
+        self._async_limits = {k: v for k, v in self._async_limits.items() if k[0] != middleware_name}
+        self._routes = {}
+        self.invalidate()
         self.logger.info(f"Removed middleware: {middleware_name}")
     
+    def route(self, action: str) -> Tuple[BaseMiddleware, ...]:
+        """获取处理该动作的中间件链"""
+        routes = self._routes
+        chain = routes.get(action)
+        if chain is None:
+            chain = tuple(m for m in self.middlewares if m.handles(action))
+            routes[action] = chain
+        return chain
+    
+    @property
+    def profile(self) -> bool:
+        return self._profile
+    
+    @profile.setter
+    def profile(self, value: bool) -> None:
+        self._profile = value
+        self.invalidate()
+    
+    def invalidate(self) -> None:
+        """使已编译的中间件链失效，下次请求时重新编译"""
+        self._chains = {}
+    
+    def _compile(self, action: str) -> _Chain:
+        """将动作对应的启用中间件编译为各阶段的调用元组
+        
+        未覆盖的默认钩子直接跳过；无需计时、限流或跨线程调度的同步钩子
+        使用绑定方法本身，其余包装为 _call/_acall；提供 ahandle 的同步中间件
+        在异步流程中经由 _ahandle 调用。
+        """
+        # 编译期间 invalidate() 会换成新的字典，编译结果只写回开始时的字典，不会覆盖新状态
+        chains = self._chains
+        middlewares = [m for m in self.route(action) if m.enabled]
+        
+        def compile_phase(name: str, skip_noop: bool = True):
+            hooks, ahooks = [], []
+            for middleware in middlewares:
+                hook = getattr(middleware, name)
+                if skip_noop and getattr(hook, '__func__', None) in _NOOP_HOOKS:
+                    continue
+                if middleware.is_async or self._profile or middleware.name in self._limits:
+                    hooks.append(functools.partial(self._call, middleware, hook))
+                else:
+                    hooks.append(hook)
+                if name == 'process' and not middleware.is_async and middleware.ahandle is not None:
+                    ahooks.append(functools.partial(self._ahandle, middleware))
+                elif middleware.is_async and not self._profile and not middleware.max_concurrency:
+                    ahooks.append(hook)
+                else:
+                    ahooks.append(functools.partial(self._acall, middleware, hook))
+            return tuple(hooks), tuple(ahooks)
+        
+        before, abefore = compile_phase('before_process')
+        process, aprocess = compile_phase('process')
+        after, aafter = compile_phase('after_process')
+        on_error, aon_error = compile_phase('on_error', skip_noop=False)
+        chain = _Chain(before, process, after[::-1], on_error,
+                       abefore, aprocess, aafter[::-1], aon_error)
+        chains[action] = chain
+        return chain
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取（必要时创建）线程池"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="jarvis-middleware"
+                    )
+        return self._executor
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """获取（必要时启动）后台事件循环"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(
+                        target=loop.run_forever, name="jarvis-middleware-loop", daemon=True
+                    )
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+    
+    def _record(self, middleware: BaseMiddleware, hook: Callable, request: Request, elapsed: float) -> None:
+        """记录一次钩子耗时"""
+        key = (middleware.name, request.action, hook.__name__)
+        histogram = self._latency.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._latency.setdefault(key, LatencyHistogram())
+        histogram.record(elapsed)
+    
+    def _call(self, middleware: BaseMiddleware, hook: Callable, *args) -> Any:
+        """在同步流程中调用钩子，异步钩子交给后台事件循环执行"""
+        if middleware.is_async:
+            return asyncio.run_coroutine_threadsafe(
+                self._acall(middleware, hook, *args), self._get_loop()
+            ).result()
+        if self.profile:
+            start = time.perf_counter()
+            try:
+                return self._invoke(middleware, hook, *args)
+            finally:
+                self._record(middleware, hook, args[0], time.perf_counter() - start)
+        return self._invoke(middleware, hook, *args)
+    
+    def _invoke(self, middleware: BaseMiddleware, hook: Callable, *args) -> Any:
+        """在并发限制内调用同步钩子"""
+        limit = self._limits.get(middleware.name)
+        if limit is None:
+            return hook(*args)
+        with limit:
+            return hook(*args)
+    
+    async def _acall(self, middleware: BaseMiddleware, hook: Callable, *args) -> Any:
+        """在异步流程中调用钩子，同步钩子交给线程池执行"""
+        if middleware.is_async:
+            if self.profile:
+                start = time.perf_counter()
+                try:
+                    return await self._ainvoke(middleware, hook, *args)
+                finally:
+                    self._record(middleware, hook, args[0], time.perf_counter() - start)
+            return await self._ainvoke(middleware, hook, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), functools.partial(self._call, middleware, hook, *args)
+        )
+    
+    async def _ahandle(self, middleware: BaseMiddleware, request: Request, response: Response) -> None:
+        """在异步流程中调用同步中间件的 ahandle，不支持时回退到线程池执行 process"""
+        start = time.perf_counter()
+        if await self._ainvoke(middleware, middleware.ahandle, request, response) is False:
+            await self._acall(middleware, middleware.process, request, response)
+        elif self.profile:
+            self._record(middleware, middleware.process, request, time.perf_counter() - start)
+    
+    async def _ainvoke(self, middleware: BaseMiddleware, hook: Callable, *args) -> Any:
+        """在并发限制内调用异步钩子"""
+        if not middleware.max_concurrency:
+            return await hook(*args)
+        key = (middleware.name, asyncio.get_running_loop())
+        limit = self._async_limits.get(key)
+        if limit is None:
+            limit = self._async_limits.setdefault(key, asyncio.Semaphore(middleware.max_concurrency))
+        async with limit:
+            return await hook(*args)
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取运行统计
+        
+        latency: {中间件: {动作: {阶段: 耗时分位数}}}，仅在 profile 开启时采集；
+        middlewares: 各中间件 stats() 返回的自身统计。
+        """
+        latency: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (name, action, phase), histogram in sorted(self._latency.items()):
+            latency.setdefault(name, {}).setdefault(action, {})[phase] = histogram.summary()
+        middlewares = {}
+        for middleware in self.middlewares:
+            middleware_stats = middleware.stats()
+            if middleware_stats:
+                middlewares[middleware.name] = middleware_stats
+        return {'latency': latency, 'middlewares': middlewares}
+    
+    def reset_stats(self) -> None:
+        """清空耗时统计"""
+        with self._lock:
+            self._latency = {}
+    
+    def shutdown(self) -> None:
+        """释放线程池和后台事件循环"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+    
     def process(self, request: Request) -> Response:
         """处理请求"""
         response = Response()
+        chain = self._chains.get(request.action) or self._compile(request.action)
+        
+        try:
+            # 执行预处理
+            for hook in chain.before:
+                hook(request)
+            
+            # 执行主处理
+            for hook in chain.process:
+                hook(request, response)
+                if not response.success or response.done:
+                    break
+            
+            # 执行后处理（逆序）
+            for hook in chain.after:
+                hook(request, response)
+                    
+        except Exception as e:
+            response.set_error(str(e))
+            # 执行错误处理
+            for hook in chain.on_error:
+                hook(request, response, e)
+        
+        return response
+    
+    def _process_safely(self, request: Request) -> Response:
+        """处理请求，保证异常转换为失败响应而不影响同批其他请求"""
+        try:
+            return self.process(request)
+        except Exception as e:
+            response = Response()
+            response.set_error(str(e))
+            return response
+    
+    def process_many(self, requests: Iterable[Request], max_concurrency: int = 8,
+                     ordered: bool = True) -> Union[List[Response], Iterator[Tuple[int, Response]]]:
+        """并发处理一批相互独立的请求
+        
+        ordered=True 时按输入顺序返回响应列表；否则返回按完成顺序产出
+        (输入序号, 响应) 的迭代器。单个请求失败不会取消其余请求，
+        各中间件自身的 max_concurrency 限制同样生效。
+        """
+        requests = list(requests)
+        if ordered:
+            with ThreadPoolExecutor(max_workers=max_concurrency,
+                                    thread_name_prefix="jarvis-batch") as executor:
+                return list(executor.map(self._process_safely, requests))
+        return self._iter_completed(requests, max_concurrency)
+    
+    def _iter_completed(self, requests: List[Request], max_concurrency: int) -> Iterator[Tuple[int, Response]]:
+        """按完成顺序产出批量处理结果"""
+        with ThreadPoolExecutor(max_workers=max_concurrency,
+                                thread_name_prefix="jarvis-batch") as executor:
+            futures = {executor.submit(self._process_safely, request): index
+                       for index, request in enumerate(requests)}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    
+    async def aprocess(self, request: Request) -> Response:
+        """异步处理请求"""
+        response = Response()
+        chain = self._chains.get(request.action) or self._compile(request.action)
         
         try:
             # 执行预处理
-            for middleware in self.middlewares:
-                if middleware.enabled:
-                    middleware.before_process(request)
+            for hook in chain.abefore:
+                await hook(request)
             
             # 执行主处理
-            for middleware in self.middlewares:
-                if middleware.enabled:
-                    middleware.process(request, response)
-                    if not response.success:
-                        break
+            for hook in chain.aprocess:
+                await hook(request, response)
+                if not response.success or response.done:
+                    break
             
-            # 执行后处理
-            for middleware in reversed(self.middlewares):
-                if middleware.enabled:
-                    middleware.after_process(request, response)
+            # 执行后处理（逆序）
+            for hook in chain.aafter:
+                await hook(request, response)
                     
         except Exception as e:
             response.set_error(str(e))
             # 执行错误处理
-            for middleware in self.middlewares:
-                if middleware.enabled:
-                    middleware.on_error(request, response, e)
+            for hook in chain.aon_error:
+                await hook(request, response, e)
         
         return response
\ No newline at end of file
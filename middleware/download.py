@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+分段并行下载
+服务端支持 Range 时把文件分成若干段，通过多个连接并发下载，直接写入预分配文件的对应偏移；
+进度保存在 <文件名>.part.json 中，中断后从各段已写入的位置继续。完成后校验长度和可选的校验和。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+
+from .exceptions import MiddlewareError
+
+_CONTENT_RANGE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+class DownloadError(MiddlewareError):
+    """下载失败或校验不通过"""
+    pass
+
+def _pwrite(fd: int, data: bytes, offset: int, lock: threading.Lock) -> None:
+    """写入指定偏移；没有 os.pwrite 的平台（Windows）退化为加锁的 lseek + write"""
+    if hasattr(os, 'pwrite'):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+        return
+    with lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        os.write(fd, data)
+
+def _parse_checksum(checksum: str):
+    """'sha256:<hex>' 或 '<hex>'（默认 sha256），返回 (算法名, 小写十六进制)
+
+    算法不支持或摘要不是十六进制时抛出 ValueError。
+    """
+    algorithm, _, digest = checksum.rpartition(':')
+    algorithm = (algorithm or 'sha256').lower()
+    digest = digest.strip().lower()
+    hashlib.new(algorithm)
+    if not digest or any(char not in '0123456789abcdef' for char in digest):
+        raise ValueError(f"摘要不是十六进制: {digest!r}")
+    return algorithm, digest
+
+def _validator(headers) -> Optional[str]:
+    """If-Range 只能使用强 ETag 或 Last-Modified"""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+def file_digest(path: str, algorithm: str = 'sha256', chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class RangedDownloader:
+    """分段并行下载器
+
+    request(method, url, **kwargs) 返回 requests.Response，通常为带连接池和限流的
+    APITools._request。connections 为并发连接数，小于 min_part_size 的部分不再拆分；
+    每段失败后从已写入的位置重试，连续 retries 次没有进展时放弃。
+    """
+
+    def __init__(self, request: Callable, connections: int = 4, min_part_size: int = 4 * 1024 * 1024,
+                 chunk_size: int = 256 * 1024, retries: int = 3, timeout=None):
+        self.request = request
+        self.connections = max(connections, 1)
+        self.min_part_size = min_part_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+
+    def _send(self, method: str, url: str, headers: Dict[str, str], **kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        return self.request(method, url, headers=headers, **kwargs)
+
+    def probe(self, url: str, headers: Dict[str, str] = None) -> Dict[str, Any]:
+        """探测文件大小、是否支持 Range 和用于 If-Range 的验证器
+
+        先用 HEAD；HEAD 不可用或没有返回长度时改用 Range: bytes=0-0 的 GET。
+        """
+        headers = dict(headers or {})
+        info = {'size': None, 'ranges': False, 'validator': None}
+        try:
+            resp = self._send('HEAD', url, headers, allow_redirects=True)
+            if resp.ok:
+                length = resp.headers.get('Content-Length')
+                info['size'] = int(length) if length and length.isdigit() else None
+                info['ranges'] = resp.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                info['validator'] = _validator(resp.headers)
+                if info['size'] is not None:
+                    return info
+        except Exception:
+            pass
+
+        resp = self._send('GET', url, dict(headers, Range='bytes=0-0'), stream=True)
+        try:
+            resp.raise_for_status()
+            match = _CONTENT_RANGE.match(resp.headers.get('Content-Range', ''))
+            if resp.status_code == 206 and match and match.group(3) != '*':
+                info['size'] = int(match.group(3))
+                info['ranges'] = True
+            else:
+                length = resp.headers.get('Content-Length')
+                info['size'] = int(length) if length and length.isdigit() else None
+                info['ranges'] = False
+            info['validator'] = _validator(resp.headers)
+        finally:
+            resp.close()
+        return info
+
+    def _plan(self, size: int) -> List[Dict[str, int]]:
+        """按连接数分段，每段不小于 min_part_size；end 不含"""
+        part_size = max(self.min_part_size, -(-size // self.connections))
+        return [{'start': start, 'end': min(start + part_size, size), 'next': start}
+                for start in range(0, size, part_size)] or [{'start': 0, 'end': 0, 'next': 0}]
+
+    def download(self, url: str, path: str, headers: Dict[str, str] = None, checksum: str = None,
+                 progress: Callable[[int, Optional[int]], None] = None) -> Dict[str, Any]:
+        """下载到 path，返回统计信息；失败时抛出 DownloadError，已完成的部分保留以便续传
+
+        checksum 形如 'sha256:<hex>'；progress(已下载字节数, 总字节数) 在工作线程中调用。
+        """
+        if checksum:
+            # 在任何网络和文件操作之前校验参数
+            try:
+                checksum = _parse_checksum(checksum)
+            except ValueError as e:
+                raise DownloadError(f"无效的校验和 {checksum!r}: {e}") from e
+        headers = dict(headers or {})
+        started_at = time.monotonic()
+        info = self.probe(url, headers)
+        part_path = path + '.part'
+        state_path = part_path + '.json'
+
+        if info['ranges'] and info['size'] is not None:
+            stats = self._download_ranges(url, part_path, state_path, headers, info, progress)
+        else:
+            stats = self._download_stream(url, part_path, headers, info, progress)
+
+        size = os.path.getsize(part_path)
+        if info['size'] is not None and size != info['size']:
+            raise DownloadError(f"文件长度不符: 期望 {info['size']} 字节, 实际 {size} 字节")
+        if checksum:
+            algorithm, expected = checksum
+            actual = file_digest(part_path, algorithm)
+            if actual != expected:
+                # 内容已损坏，续传没有意义
+                os.remove(part_path)
+                if os.path.exists(state_path):
+                    os.remove(state_path)
+                raise DownloadError(f"{algorithm} 校验失败: 期望 {expected}, 实际 {actual}")
+        os.replace(part_path, path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+        elapsed = time.monotonic() - started_at
+        stats.update(bytes=size, elapsed=elapsed, speed=size / elapsed if elapsed else 0.0)
+        return stats
+
+    def _download_stream(self, url: str, part_path: str, headers: Dict[str, str],
+                         info: Dict, progress) -> Dict[str, Any]:
+        """服务端不支持 Range 时单连接顺序下载"""
+        resp = self._send('GET', url, headers, stream=True)
+        try:
+            resp.raise_for_status()
+            done = 0
+            with open(part_path, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, info['size'])
+        except Exception as e:
+            raise DownloadError(f"下载失败: {e}") from e
+        finally:
+            resp.close()
+        return {'ranged': False, 'connections': 1, 'parts': 1, 'resumed_bytes': 0, 'retries': 0}
+
+    def _load_state(self, state_path: str, part_path: str, url: str, info: Dict) -> Optional[List[Dict]]:
+        """读取续传状态，URL、长度或验证器变化时作废"""
+        if not (os.path.exists(state_path) and os.path.exists(part_path)):
+            return None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (state.get('url') != url or state.get('size') != info['size']
+                or state.get('validator') != info['validator']
+                or os.path.getsize(part_path) != info['size']):
+            return None
+        return state['parts']
+
+    def _save_state(self, state_path: str, url: str, info: Dict, parts: List[Dict]) -> None:
+        """原子地写入续传状态"""
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'size': info['size'], 'validator': info['validator'], 'parts': parts}, f)
+        os.replace(tmp_path, state_path)
+
+    def _download_ranges(self, url: str, part_path: str, state_path: str, headers: Dict[str, str],
+                         info: Dict, progress) -> Dict[str, Any]:
+        size = info['size']
+        parts = self._load_state(state_path, part_path, url, info)
+        resumed = sum(part['next'] - part['start'] for part in parts) if parts else 0
+        if parts is None:
+            parts = self._plan(size)
+            fd = os.open(part_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                os.ftruncate(fd, size)
+                if hasattr(os, 'posix_fallocate') and size:
+                    try:
+                        os.posix_fallocate(fd, 0, size)
+                    except OSError:
+                        # 部分文件系统不支持预分配，ftruncate 的稀疏文件同样可用
+                        pass
+            finally:
+                os.close(fd)
+            self._save_state(state_path, url, info, parts)
+
+        lock = threading.Lock()
+        write_lock = threading.Lock()
+        counters = {'done': resumed, 'retries': 0, 'saved_at': time.monotonic()}
+        if_range = {'If-Range': info['validator']} if info['validator'] else {}
+
+        # 任一分段失败后其余连接尽快停止，已写入的进度保留
+        stop = threading.Event()
+
+        def fetch_range(part: Dict[str, int], fd: int) -> None:
+            range_headers = dict(headers, Range=f"bytes={part['next']}-{part['end'] - 1}", **if_range)
+            resp = self._send('GET', url, range_headers, stream=True)
+            try:
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    # 服务端忽略了 Range 或 If-Range 不匹配（文件已变化），重试无意义
+                    raise DownloadError(f"服务端未按范围返回（状态码 {resp.status_code}），文件可能已变化")
+                for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                    if stop.is_set():
+                        return
+                    chunk = chunk[:part['end'] - part['next']]
+                    _pwrite(fd, chunk, part['next'], write_lock)
+                    with lock:
+                        part['next'] += len(chunk)
+                        counters['done'] += len(chunk)
+                        done = counters['done']
+                        now = time.monotonic()
+                        if now - counters['saved_at'] >= 1.0:
+                            counters['saved_at'] = now
+                            self._save_state(state_path, url, info, parts)
+                    if progress:
+                        progress(done, size)
+                    if part['next'] >= part['end']:
+                        return
+            finally:
+                resp.close()
+            raise ConnectionError("连接提前结束")
+
+        def fetch(part: Dict[str, int], fd: int) -> None:
+            """下载一段，网络错误时从已写入的位置重试"""
+            attempts = 0
+            try:
+                while part['next'] < part['end'] and not stop.is_set():
+                    offset = part['next']
+                    try:
+                        fetch_range(part, fd)
+                    except DownloadError:
+                        raise
+                    except Exception as e:
+                        # 只计算没有任何进展的连续失败
+                        attempts = 1 if part['next'] > offset else attempts + 1
+                        if attempts > self.retries:
+                            raise DownloadError(f"分段 {part['start']}-{part['end'] - 1} 下载失败: {e}") from e
+                        with lock:
+                            counters['retries'] += 1
+            except BaseException:
+                stop.set()
+                raise
+
+        pending = [part for part in parts if part['next'] < part['end']]
+        fd = os.open(part_path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+        try:
+            with ThreadPoolExecutor(max_workers=max(min(self.connections, len(pending)), 1),
+                                    thread_name_prefix="jarvis-download") as pool:
+                futures = [pool.submit(fetch, part, fd) for part in pending]
+                errors = [future.exception() for future in futures]
+        finally:
+            os.close(fd)
+            with lock:
+                self._save_state(state_path, url, info, parts)
+        for error in errors:
+            if isinstance(error, DownloadError):
+                raise error
+        for error in errors:
+            if error is not None:
+                raise DownloadError(f"下载中断: {error!r}") from error
+        return {'ranged': True, 'connections': min(self.connections, len(parts)), 'parts': len(parts),
+                'resumed_bytes': resumed, 'retries': counters['retries']}
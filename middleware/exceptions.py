@@ -16,5 +16,12 @@ class AuthenticationError(MiddlewareError):
     pass
 
 class RateLimitError(MiddlewareError):
-    """限流错误"""
-    pass
\ No newline at end of file
+    """限流错误
+
+    reset_at 为限流解除的时间戳（time.time()），未知时为 None。
+    """
+    
+    def __init__(self, message: str = "", reset_at: float = None, status_code: int = None):
+        super().__init__(message)
+        self.reset_at = reset_at
+        self.status_code = status_code
\ No newline at end of file
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+HTTP条件请求缓存
+按 ETag/Last-Modified 保存响应体，过期后用 If-None-Match/If-Modified-Since 重新验证，
+304 响应直接复用本地响应体（GitHub 的 304 不计入限流额度）。数据保存在 SQLite 中，
+超过容量上限时按最近访问时间淘汰。
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+class CacheEntry:
+    """缓存条目"""
+    __slots__ = ('key', 'status', 'headers', 'body', 'etag', 'last_modified', 'stored_at', 'max_age')
+
+    def __init__(self, key: str, status: int, headers: Dict[str, str], body: bytes,
+                 etag: Optional[str], last_modified: Optional[str], stored_at: float, max_age: float):
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.max_age = max_age
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.age < self.max_age
+
+    @property
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """重新验证用的条件请求头"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def json(self) -> Any:
+        return json.loads(self.body) if self.body else {}
+
+class HTTPCache:
+    """持久化HTTP缓存"""
+
+    # 影响响应内容、需要参与缓存键的请求头
+    VARY_HEADERS = ('Accept', 'Authorization')
+
+    def __init__(self, path: str = None, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path or os.path.join(os.getenv('HTTP_CACHE_DIR', 'cache'), 'http_cache.sqlite')
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                max_age REAL,
+                last_access REAL,
+                size INTEGER
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)')
+        self._conn.commit()
+        # 命中后尚未写回磁盘的访问时间，下次写入时批量更新
+        self._touched: Dict[str, float] = {}
+        # 表中响应体的总大小，写入和淘汰时增减，不必每次重新求和
+        self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self.counts = {'hit': 0, 'revalidated': 0, 'miss': 0, 'stale': 0, 'evicted': 0}
+
+    def make_key(self, method: str, url: str, params: Dict[str, Any] = None,
+                 headers: Dict[str, str] = None) -> str:
+        """方法 + URL + 排序后的参数 + 相关请求头（Authorization 只参与哈希，不落盘）"""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        material = json.dumps([
+            method.upper(), url, sorted((params or {}).items()),
+            [headers.get(name.lower(), '') for name in self.VARY_HEADERS],
+        ], default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """读取条目，访问时间先记在内存中，下次写入时一并写回"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, headers, body, etag, last_modified, stored_at, max_age '
+                'FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+        status, headers, body, etag, last_modified, stored_at, max_age = row
+        return CacheEntry(key, status, json.loads(headers), body, etag, last_modified, stored_at, max_age)
+
+    @staticmethod
+    def _max_age(headers) -> Optional[float]:
+        """根据 Cache-Control 计算新鲜期，no-store 返回 None 表示不可缓存"""
+        control = headers.get('Cache-Control', '') or ''
+        if 'no-store' in control:
+            return None
+        if 'no-cache' in control:
+            return 0.0
+        match = _MAX_AGE.search(control)
+        return float(match.group(1)) if match else 0.0
+
+    def put(self, key: str, url: str, resp, body: bytes = None) -> bool:
+        """保存成功的响应，返回是否已缓存；流式读取过的响应需通过 body 传入响应体"""
+        max_age = self._max_age(resp.headers)
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        # 既不能直接复用也无法重新验证的响应没有缓存价值
+        if max_age is None or (not max_age and not etag and not last_modified):
+            return False
+        if body is None:
+            body = resp.content
+        if len(body) > self.max_bytes:
+            return False
+        headers = {k: v for k, v in resp.headers.items()
+                   if k.lower() in ('content-type', 'cache-control', 'etag', 'last-modified')}
+        now = time.time()
+        with self._lock:
+            self._flush_touched()
+            previous = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, resp.status_code, json.dumps(headers), body, etag, last_modified,
+                 now, max_age, now, len(body))
+            )
+            self._total += len(body) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+        return True
+
+    def refresh(self, key: str, resp) -> None:
+        """304 后刷新条目的存储时间和新鲜期"""
+        max_age = self._max_age(resp.headers)
+        now = time.time()
+        with self._lock:
+            self._flush_touched()
+            self._conn.execute(
+                'UPDATE responses SET stored_at = ?, max_age = ?, last_access = ?, '
+                'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?',
+                (now, max_age or 0.0, now, resp.headers.get('ETag'), resp.headers.get('Last-Modified'), key)
+            )
+            self._conn.commit()
+
+    def _flush_touched(self) -> None:
+        """把命中的访问时间写回磁盘，使淘汰顺序与实际使用一致（调用方持有锁）"""
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE responses SET last_access = ? WHERE key = ?',
+                [(at, key) for key, at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        """按最近访问时间淘汰，直到总大小不超过上限（调用方持有锁）
+
+        平时只比较累计的总大小；超过上限时重新求和一次，校正其他进程对同一数据库的写入。
+        """
+        if self._total <= self.max_bytes:
+            return
+        self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if self._total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            'SELECT key, size FROM responses ORDER BY last_access ASC'
+        ).fetchall():
+            if self._total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._touched.pop(key, None)
+            self._total -= size
+            self.counts['evicted'] += 1
+
+    def record(self, outcome: str) -> Dict[str, int]:
+        """记录一次缓存结果，返回累计计数"""
+        with self._lock:
+            self.counts[outcome] += 1
+            return dict(self.counts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+            self._touched.clear()
+            self._total = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+            return dict(self.counts, entries=entries, bytes=size, max_bytes=self.max_bytes)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+流式JSON解析
+从字节块迭代器中增量解析JSON：定位到指定子路径，逐条产出该处数组的元素，
+路径之外的内容只扫描跳过而不构建对象。峰值内存约为块大小加单条记录的大小。
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+from .exceptions import MiddlewareError
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# 跳过值时关注的字符：字符串外的括号/分隔符、字符串内的引号和转义
+_OUTSIDE = re.compile(r'["\[\]{},]')
+_INSIDE = re.compile(r'["\\]')
+# 数字和 true/false/null 的结束位置
+_SCALAR_END = re.compile(r'[,\]}\s]')
+_DECODER = json.JSONDecoder()
+
+class BodyTooLargeError(MiddlewareError):
+    """响应体超过大小上限"""
+    pass
+
+def parse_path(path: Union[str, List, None]) -> List[Union[str, int]]:
+    """解析子路径，如 'data.items' 或 'results.0.items'，数字表示数组下标"""
+    if path is None or path == '':
+        return []
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    return [int(part) if part.isdigit() else part for part in path.split('.')]
+
+class _Reader:
+    """带缓冲的增量文本读取器"""
+
+    def __init__(self, chunks: Iterable[bytes], max_bytes: Optional[int]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._max_bytes = max_bytes
+        self.size = 0
+        self.buf = ''
+        self.pos = 0
+        # 正在解析的值的起点，补充数据时保留其后的内容
+        self.mark = None
+        self.eof = False
+
+    def fill(self) -> bool:
+        """读入下一块，丢弃已消费的部分，返回是否读到新数据"""
+        if self.eof:
+            return False
+        keep = self.pos if self.mark is None else self.mark
+        self.buf = self.buf[keep:]
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            self.size += len(chunk)
+            if self._max_bytes is not None and self.size > self._max_bytes:
+                raise BodyTooLargeError(f"响应体超过 {self._max_bytes} 字节上限")
+            text = self._decoder.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.eof = True
+        self.buf += self._decoder.decode(b'', final=True)
+        return False
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符（结束时为空字符串）"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"JSON格式错误: 期望 {chars!r}，实际为 {char or '结束'!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """解析一个完整的值
+        
+        跨块的对象、数组和字符串先线性扫描到结尾再一次性解码，避免大值随补充数据反复重新解析。
+        """
+        if self.peek() not in '[{"':
+            return self._scalar()
+        # 值完整地位于缓冲区内时直接解码，只有跨块的值才需要扫描
+        try:
+            obj, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+            return obj
+        except json.JSONDecodeError:
+            pass
+        self.mark = self.pos
+        try:
+            self.skip()
+            start = self.mark
+        finally:
+            self.mark = None
+        return _DECODER.raw_decode(self.buf, start)[0]
+    
+    def _scalar(self) -> Any:
+        """解析数字、true/false/null"""
+        # 值可能被块边界截断，读到其后的分隔符或结尾后再解码
+        while not _SCALAR_END.search(self.buf, self.pos) and self.fill():
+            pass
+        obj, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+        return obj
+
+    def skip(self) -> None:
+        """跳过一个值而不构建对象"""
+        char = self.peek()
+        if not char:
+            raise ValueError("JSON格式错误: 意外结束")
+        if char not in '[{"':
+            self._scalar()
+            return
+        depth = 0
+        in_string = False
+        while True:
+            pattern = _INSIDE if in_string else _OUTSIDE
+            match = pattern.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("JSON格式错误: 意外结束")
+                continue
+            char = match.group()
+            self.pos = match.end()
+            if in_string:
+                if char == '\\':
+                    # 转义字符可能跨块
+                    if self.pos >= len(self.buf) and not self.fill():
+                        raise ValueError("JSON格式错误: 意外结束")
+                    self.pos += 1
+                    continue
+                in_string = False
+                if depth == 0:
+                    return
+            elif char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+            elif char in ']}':
+                depth -= 1
+                if depth == 0:
+                    return
+
+def _select(reader: _Reader, path: List[Union[str, int]]) -> bool:
+    """定位到子路径处的值，找不到时返回 False"""
+    for part in path:
+        char = reader.peek()
+        if char == '{' and isinstance(part, str):
+            reader.pos += 1
+            found = False
+            if reader.peek() == '}':
+                reader.pos += 1
+                return False
+            while True:
+                key = reader.value()
+                reader.expect(':')
+                if key == part:
+                    found = True
+                    break
+                reader.skip()
+                if reader.expect(',}') == '}':
+                    break
+            if not found:
+                return False
+        elif char == '[' and isinstance(part, int):
+            reader.pos += 1
+            if reader.peek() == ']':
+                return False
+            for _ in range(part):
+                reader.skip()
+                if reader.expect(',]') == ']':
+                    return False
+        else:
+            return False
+    return True
+
+def iter_json(chunks: Iterable[bytes], path: Union[str, List, None] = None,
+              max_bytes: int = None) -> Iterator[Any]:
+    """逐条产出子路径处数组的元素；子路径处不是数组时产出该值本身"""
+    reader = _Reader(chunks, max_bytes)
+    if not _select(reader, parse_path(path)):
+        return
+    if reader.peek() != '[':
+        yield reader.value()
+        return
+    reader.pos += 1
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+def load_json(chunks: Iterable[bytes], path: Union[str, List, None] = None,
+              max_bytes: int = None) -> Any:
+    """只构建子路径处的值，路径不存在时返回 None"""
+    reader = _Reader(chunks, max_bytes)
+    if not _select(reader, parse_path(path)):
+        return None
+    return reader.value()
+
+def response_chunks(resp, chunk_size: int = 64 * 1024, max_bytes: int = None) -> Iterator[bytes]:
+    """逐块读取响应体，Content-Length 超过上限时立即拒绝"""
+    length = resp.headers.get('Content-Length')
+    if max_bytes is not None and length and length.isdigit() and int(length) > max_bytes:
+        resp.close()
+        raise BodyTooLargeError(f"响应体 {length} 字节，超过 {max_bytes} 字节上限")
+    return _iter_chunks(resp, chunk_size)
+
+def _iter_chunks(resp, chunk_size: int) -> Iterator[bytes]:
+    """结束或提前停止时释放连接"""
+    try:
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        resp.close()
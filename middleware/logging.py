@@ -38,9 +38,24 @@ class LoggingMiddleware(BaseMiddleware):
     def after_process(self, request: Request, response: Response) -> None:
         """记录请求完成"""
         duration = time.time() - request.metadata.get('start_time', 0)
+        response.metadata['duration'] = duration
         status = "成功" if response.success else "失败"
+        if response.is_streaming:
+            # 不读取流，只在流结束时补记日志
+            self.logger.info(f"流式响应已开始: {request.action} - 耗时: {duration:.2f}s")
+            response.on_stream_end(lambda resp, error: self._log_stream_end(request, resp, error))
+            return
         self.logger.info(f"请求处理完成: {request.action} - {status} - 耗时: {duration:.2f}s")
     
+    def _log_stream_end(self, request: Request, response: Response, error) -> None:
+        """记录流式响应结束"""
+        metadata = response.metadata
+        status = "完成" if metadata.get('stream_complete') else "中断"
+        self.logger.info(
+            f"流式响应{status}: {request.action} - {metadata.get('stream_chunks', 0)}块 "
+            f"{metadata.get('stream_bytes', 0)}字节 - 耗时: {metadata.get('stream_duration', 0):.2f}s"
+        )
+    
     def on_error(self, request: Request, response: Response, error: Exception) -> None:
         """记录错误"""
         self.logger.error(f"请求处理错误: {request.action} - {error}")
\ No newline at end of file
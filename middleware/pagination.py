@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+分页API的惰性迭代
+"""
+
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterator, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+_LINK = re.compile(r'<([^>]*)>\s*;\s*rel="?([^";]+)"?')
+
+def parse_link_header(value: Optional[str]) -> Dict[str, str]:
+    """解析 Link 响应头，返回 rel -> URL"""
+    if not value:
+        return {}
+    return {rel: url for url, rel_list in _LINK.findall(value) for rel in rel_list.split()}
+
+def _page_number(url: str) -> Optional[int]:
+    value = dict(parse_qsl(urlsplit(url).query)).get('page')
+    return int(value) if value and value.isdigit() else None
+
+def _with_page(url: str, page: int) -> str:
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query['page'] = str(page)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def _page_items(payload: Any) -> list:
+    """列表接口直接返回数组，搜索接口的结果在 items 字段中"""
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict) and isinstance(payload.get('items'), list):
+        return payload['items']
+    return [payload]
+
+def iter_pages(fetch: Callable[[str], Any], url: str, prefetch: int = 2,
+               stats: Dict[str, Any] = None) -> Iterator[Any]:
+    """按 Link: rel=next 逐页惰性产出条目
+
+    fetch(url) 返回类 requests.Response 的响应。消费当前页时在后台预取后续页面：
+    响应带有 rel=last 且使用 page 参数时，最多并发预取 prefetch 页；否则只能串行地
+    预取 rel=next 指向的下一页。内存中最多保留 prefetch + 1 页。
+    X-RateLimit-Remaining 不足以支撑预取窗口时退化为串行，避免提前耗尽额度。
+    消费方停止迭代时取消尚未开始的预取。
+    """
+    stats = {} if stats is None else stats
+    stats.setdefault('pages', 0)
+    pool = ThreadPoolExecutor(max_workers=max(prefetch, 1), thread_name_prefix="jarvis-paginate")
+    pending = deque([pool.submit(fetch, url)])
+    # 页码模式下下一个待调度的页码和最后一页
+    next_page = last_page = None
+    try:
+        while pending:
+            resp = pending.popleft().result()
+            resp.raise_for_status()
+            links = parse_link_header(resp.headers.get('Link'))
+            stats['pages'] += 1
+
+            remaining = resp.headers.get('X-RateLimit-Remaining')
+            window = prefetch
+            if remaining is not None and remaining.isdigit() and int(remaining) <= prefetch:
+                window = 1
+
+            if last_page is None and 'next' in links and 'last' in links:
+                next_page, last_page = _page_number(links['next']), _page_number(links['last'])
+                page_url = links['next']
+            if next_page is not None and last_page is not None:
+                while len(pending) < window and next_page <= last_page:
+                    pending.append(pool.submit(fetch, _with_page(page_url, next_page)))
+                    next_page += 1
+            elif 'next' in links and not pending:
+                pending.append(pool.submit(fetch, links['next']))
+
+            items = _page_items(resp.json() if resp.content else [])
+            resp.close()
+            for item in items:
+                yield item
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
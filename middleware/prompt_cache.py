@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+OpenAI提示词/回答缓存
+按模型、消息和生成参数缓存对话补全结果。数据保存在 SQLite 中，超过容量上限时按最近访问时间淘汰，
+可设置过期时间；最近使用的条目同时保存在内存中，命中时无需访问磁盘。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+class PromptCache:
+    """持久化提示词缓存"""
+
+    def __init__(self, path: str = None, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = None, memory_entries: int = 1024):
+        self.path = path or os.path.join(os.getenv('HTTP_CACHE_DIR', 'cache'), 'prompt_cache.sqlite')
+        self.max_bytes = max_bytes
+        # 默认过期时间（秒），None 表示不过期
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS prompts (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                result TEXT,
+                stored_at REAL,
+                expires_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_prompt_access ON prompts(last_access)')
+        self._conn.commit()
+        # key -> (过期时间, 写入时间, 结果)，按最近使用排序
+        self._memory: "OrderedDict[str, Tuple[Optional[float], float, Dict]]" = OrderedDict()
+        # 内存命中后尚未写回磁盘的访问时间，下次写入时批量更新
+        self._touched: Dict[str, float] = {}
+        self.counts = {'hit': 0, 'memory_hit': 0, 'miss': 0, 'expired': 0, 'evicted': 0}
+
+    @staticmethod
+    def make_key(model: str, messages, params: Dict[str, Any] = None) -> str:
+        """模型 + 消息 + 排序后的生成参数"""
+        material = json.dumps([model, messages, params or {}], sort_keys=True,
+                              separators=(',', ':'), ensure_ascii=False, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float, str]]:
+        """读取结果，返回 (结果, 缓存时长, 'memory'|'disk')，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, stored_at, result = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    self.counts['hit'] += 1
+                    self.counts['memory_hit'] += 1
+                    return result, now - stored_at, 'memory'
+                del self._memory[key]
+
+            row = self._conn.execute(
+                'SELECT result, stored_at, expires_at FROM prompts WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.counts['miss'] += 1
+                return None
+            text, stored_at, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute('DELETE FROM prompts WHERE key = ?', (key,))
+                self._conn.commit()
+                self.counts['expired'] += 1
+                self.counts['miss'] += 1
+                return None
+            self._conn.execute('UPDATE prompts SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            result = json.loads(text)
+            self._remember(key, expires_at, stored_at, result)
+            self.counts['hit'] += 1
+            return result, now - stored_at, 'disk'
+
+    def put(self, key: str, model: str, result: Dict, ttl: float = None) -> bool:
+        """保存补全结果，ttl 为 None 时使用默认过期时间，返回是否已缓存"""
+        text = json.dumps(result, ensure_ascii=False)
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return False
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._flush_touched()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, model, text, now, expires_at, now, size)
+            )
+            self._evict()
+            self._conn.commit()
+            self._remember(key, expires_at, now, result)
+        return True
+
+    def _remember(self, key: str, expires_at: Optional[float], stored_at: float, result: Dict) -> None:
+        """放入内存缓存（调用方持有锁）"""
+        self._memory[key] = (expires_at, stored_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_touched(self) -> None:
+        """把内存命中的访问时间写回磁盘，使淘汰顺序与实际使用一致（调用方持有锁）"""
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE prompts SET last_access = ? WHERE key = ?',
+                [(at, key) for key, at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        """删除过期条目，再按最近访问时间淘汰，直到总大小不超过上限（调用方持有锁）"""
+        self._conn.execute('DELETE FROM prompts WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM prompts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            'SELECT key, size FROM prompts ORDER BY last_access ASC'
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM prompts WHERE key = ?', (key,))
+            self._memory.pop(key, None)
+            self._touched.pop(key, None)
+            total -= size
+            self.counts['evicted'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM prompts')
+            self._conn.commit()
+            self._memory.clear()
+            self._touched.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM prompts'
+            ).fetchone()
+            return dict(self.counts, entries=entries, memory_entries=len(self._memory),
+                        bytes=size, max_bytes=self.max_bytes)
@@ -3,9 +3,13 @@
 Python代码执行中间件
 """
 
+import os
 import sys
+import queue
+import threading
+import time
 from io import StringIO
-import contextlib
+import functools
 import datetime
 import math
 import json
@@ -14,12 +18,21 @@ from .core import BaseMiddleware
 from .request import Request, Response
 from .exceptions import MiddlewareError
 
+class _ExecutionCancelled(BaseException):
+    """流式执行被取消，继承 BaseException 以免被代码中的 except Exception 捕获"""
+    pass
+
 class PythonExecutorMiddleware(BaseMiddleware):
     """Python代码执行中间件"""
     
+    actions = ('python_execute',)
+    
     def __init__(self):
         super().__init__("PythonExecutorMiddleware")
         self.safe_globals = self._create_safe_globals()
+        # 流式执行的超时（秒）和输出队列上限（块数）
+        self.timeout = float(os.getenv('PYTHON_EXEC_TIMEOUT', '30'))
+        self.stream_queue_size = 64
     
     def _create_safe_globals(self):
         """创建安全的执行环境"""
@@ -58,14 +71,90 @@ class PythonExecutorMiddleware(BaseMiddleware):
             response.set_error("代码内容缺失")
             return
         
+        if request.get('stream'):
+            response.set_data('executed', True)
+            response.set_stream(self._execute_stream(code), kind='text')
+            return
+        
         try:
             output = StringIO()
-            with contextlib.redirect_stdout(output):
-                exec(code, self.safe_globals.copy())
+            # print 直接写入本次执行的缓冲区，避免并发执行时互相串输出
+            exec_globals = self.safe_globals.copy()
+            exec_globals['__builtins__'] = dict(
+                exec_globals['__builtins__'], print=functools.partial(print, file=output)
+            )
+            exec(code, exec_globals)
             
             result = output.getvalue()
             response.set_data('output', result)
             response.set_data('executed', True)
             
         except Exception as e:
-            response.set_error(f"代码执行失败: {e}")
\ No newline at end of file
+            response.set_error(f"代码执行失败: {e}")
+    
+    def _execute_stream(self, code: str):
+        """在后台线程执行代码，print 的输出产生后立即返回给调用方
+        
+        输出队列有上限，调用方读取慢时 print 等待；超过 timeout 秒未结束时报错。
+        超时、调用方关闭流或生成器被回收后，代码在下一次 print 时中止
+        （不调用 print 的代码无法从外部中止，只能运行到结束）。
+        """
+        chunks: queue.Queue = queue.Queue(maxsize=self.stream_queue_size)
+        cancelled = threading.Event()
+        done = object()
+        errors = []
+        
+        def put(item) -> bool:
+            """放入队列，已取消时放弃并返回 False"""
+            while not cancelled.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        class QueueWriter:
+            def write(self, text: str) -> int:
+                if text and not put(text):
+                    raise _ExecutionCancelled()
+                return len(text)
+            
+            def flush(self) -> None:
+                pass
+        
+        def run():
+            exec_globals = self.safe_globals.copy()
+            exec_globals['__builtins__'] = dict(
+                exec_globals['__builtins__'], print=functools.partial(print, file=QueueWriter())
+            )
+            try:
+                exec(code, exec_globals)
+            except _ExecutionCancelled:
+                pass
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(done)
+        
+        threading.Thread(target=run, name="jarvis-python-stream", daemon=True).start()
+        deadline = time.monotonic() + self.timeout
+        try:
+            finished = False
+            while not finished:
+                try:
+                    parts = [chunks.get(timeout=max(0.0, deadline - time.monotonic()))]
+                except queue.Empty:
+                    raise MiddlewareError(f"代码执行超时（{self.timeout:g}秒）")
+                # 合并已到达的输出，减少块数（本生成器是唯一的消费者）
+                while not chunks.empty():
+                    parts.append(chunks.get_nowait())
+                if parts[-1] is done:
+                    parts.pop()
+                    finished = True
+                if parts:
+                    yield ''.join(parts)
+        finally:
+            cancelled.set()
+        if errors:
+            raise MiddlewareError(f"代码执行失败: {errors[0]}")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+按上游主机的令牌桶限流
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .stats import LatencyHistogram
+from .transport import openai_url, weather_url
+
+def host_key(url: str) -> str:
+    """限流和重试共用的主机键：URL 的主机名（不含端口），无法解析时为 URL 本身"""
+    return urlsplit(url).hostname or url
+
+class TokenBucket:
+    """令牌桶，线程安全且可在协程中使用
+
+    采用预留方式：acquire 立即扣除令牌（允许欠账），再在锁外等待欠账补足所需的时间，
+    因此等待者按到达顺序排队，锁不会在等待期间被持有。
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_times = LatencyHistogram()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1) -> float:
+        """预留令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait:
+                self.waits += 1
+        self.wait_times.record(wait)
+        return wait
+
+    def acquire(self, amount: float = 1) -> float:
+        """获取令牌，不足时阻塞等待，返回等待的秒数"""
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, amount: float = 1) -> float:
+        """获取令牌，不足时让出事件循环等待"""
+        wait = self.reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def adjust(self, amount: float) -> None:
+        """修正预留量：正数补扣，负数退还（如实际消耗的 token 少于预估）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.burst, self._tokens - amount)
+
+    @property
+    def level(self) -> float:
+        """当前可用令牌数，负数表示排队中的欠账"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'level': self.level,
+            'waits': self.waits,
+            'wait': self.wait_times.summary(),
+        }
+
+class HostLimit:
+    """单个主机的请求数桶和可选的 token 数桶"""
+
+    def __init__(self, requests: TokenBucket, tokens: Optional[TokenBucket] = None):
+        self.requests = requests
+        self.tokens = tokens
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {'requests': self.requests.stats()}
+        if self.tokens:
+            stats['tokens'] = self.tokens.stats()
+        return stats
+
+def _default_limits() -> Dict[str, Tuple[float, float, Optional[float], Optional[float]]]:
+    """默认配置：主机 -> (每秒请求数, 请求突发量, 每秒token数, token突发量)"""
+    openai_rpm = float(os.getenv('OPENAI_RPM', '500'))
+    openai_tpm = float(os.getenv('OPENAI_TPM', '90000'))
+    return {
+        # GitHub 认证用户 5000 次/小时
+        'api.github.com': (5000 / 3600, 20, None, None),
+        # OpenAI 按分钟的请求数和 token 数，突发量为一分钟额度的 1/6
+        urlsplit(openai_url()).hostname: (
+            openai_rpm / 60, max(openai_rpm / 6, 1), openai_tpm / 60, openai_tpm / 6
+        ),
+        # OpenWeatherMap 免费版 60 次/分钟
+        urlsplit(weather_url()).hostname: (1.0, 10, None, None),
+    }
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[float, float, Optional[float], Optional[float]]]:
+    """解析 RATE_LIMITS，格式: host=rate:burst[:token_rate:token_burst],..."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        host, _, values = item.partition('=')
+        numbers = [float(value) for value in values.split(':')]
+        if len(numbers) not in (2, 4):
+            raise ValueError(f"无效的限流配置: {item}")
+        limits[host.strip()] = tuple(numbers) if len(numbers) == 4 else (numbers[0], numbers[1], None, None)
+    return limits
+
+class RateLimiter:
+    """按主机限流，未配置的主机不限流"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float, Optional[float], Optional[float]]] = None):
+        self._hosts: Dict[str, HostLimit] = {}
+        self._lock = threading.Lock()
+        for host, (rate, burst, token_rate, token_burst) in (limits or {}).items():
+            self.configure(host, rate, burst, token_rate, token_burst)
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiter':
+        """默认配置，可用环境变量 RATE_LIMITS 覆盖或补充"""
+        limits = _default_limits()
+        limits.update(_parse_limits(os.getenv('RATE_LIMITS', '')))
+        return cls(limits)
+
+    def configure(self, host: str, rate: float, burst: float,
+                  token_rate: float = None, token_burst: float = None) -> None:
+        """设置主机的请求数和 token 数预算"""
+        tokens = TokenBucket(token_rate, token_burst) if token_rate else None
+        with self._lock:
+            self._hosts[host] = HostLimit(TokenBucket(rate, burst), tokens)
+
+    def get(self, url: str) -> Optional[HostLimit]:
+        return self._hosts.get(host_key(url))
+
+    def acquire(self, url: str, tokens: float = 0) -> float:
+        """为一次请求获取请求令牌和 token 预算，返回等待的秒数"""
+        limit = self.get(url)
+        if limit is None:
+            return 0.0
+        wait = limit.requests.acquire()
+        if tokens and limit.tokens:
+            wait += limit.tokens.acquire(tokens)
+        return wait
+
+    async def acquire_async(self, url: str, tokens: float = 0) -> float:
+        """acquire 的协程版本"""
+        limit = self.get(url)
+        if limit is None:
+            return 0.0
+        wait = await limit.requests.acquire_async()
+        if tokens and limit.tokens:
+            wait += await limit.tokens.acquire_async(tokens)
+        return wait
+
+    def settle(self, url: str, reserved: float, used: float) -> None:
+        """请求完成后按实际 token 用量补扣超出预留的部分
+        
+        OpenAI 在请求到达时按 prompt 和 max_tokens 计入 TPM，未用完的部分不会退还，
+        因此这里只补扣、不退还，否则客户端会比服务端计算的更快恢复额度而触发 429。
+        """
+        limit = self.get(url)
+        if limit is not None and limit.tokens and used is not None and used > reserved:
+            limit.tokens.adjust(used - reserved)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {host: limit.stats() for host, limit in hosts.items()}
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+def get_shared_limiter() -> RateLimiter:
+    """进程内共享的限流器，APIMiddleware 和 APITools 共用同一份主机预算"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        with _shared_lock:
+            if _shared_limiter is None:
+                _shared_limiter = RateLimiter.from_env()
+    return _shared_limiter
+
+def estimate_tokens(messages, max_tokens: int = 0) -> int:
+    """粗略估算一次对话请求消耗的 token 数（约 4 字符/token，中文按 1 字符/token）"""
+    total = 0
+    for message in messages:
+        content = message.get('content') or ''
+        ascii_chars = sum(1 for char in content if ord(char) < 128)
+        total += ascii_chars // 4 + (len(content) - ascii_chars) + 4
+    return total + max_tokens
@@ -3,41 +3,263 @@
 请求和响应对象
 """
 
-from typing import Dict, Any, Optional
-from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Callable, Iterator, AsyncIterator, Union, Iterable, AsyncIterable
+import asyncio
 import time
 
-@dataclass
 class Request:
-    """请求对象"""
-    action: str
-    data: Dict[str, Any] = field(default_factory=dict)
-    headers: Dict[str, str] = field(default_factory=dict)
-    metadata: Dict[str, Any] = field(default_factory=dict)
-    timestamp: float = field(default_factory=time.time)
-    
+    """请求对象
+
+    使用 __slots__ 减少内存占用；headers/metadata 在首次访问时才创建，
+    timestamp 为单调时钟时间（time.monotonic），仅用于计算耗时。
+    """
+    __slots__ = ('action', 'data', '_headers', '_metadata', 'timestamp')
+
+    def __init__(self, action: str, data: Dict[str, Any] = None, headers: Dict[str, str] = None,
+                 metadata: Dict[str, Any] = None, timestamp: float = None):
+        self.action = action
+        self.data = {} if data is None else data
+        self._headers = headers
+        self._metadata = metadata
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        if self._headers is None:
+            self._headers = {}
+        return self._headers
+
+    @headers.setter
+    def headers(self, value: Dict[str, str]) -> None:
+        self._headers = value
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: Dict[str, Any]) -> None:
+        self._metadata = value
+
     def get(self, key: str, default: Any = None) -> Any:
         """获取数据"""
         return self.data.get(key, default)
-    
+
     def set(self, key: str, value: Any) -> None:
         """设置数据"""
         self.data[key] = value
 
-@dataclass
+    def get_header(self, key: str, default: Any = None) -> Any:
+        """获取请求头（不会创建headers字典）"""
+        if not self._headers:
+            return default
+        return self._headers.get(key, default)
+
+    def _fields(self) -> tuple:
+        return (self.action, self.data, self._headers or {}, self._metadata or {}, self.timestamp)
+
+    def __eq__(self, other: Any) -> bool:
+        """按字段比较（与原 dataclass 相同），未创建的 headers/metadata 视为空字典"""
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f"Request(action={self.action!r}, data={self.data!r}, headers={self._headers or {}!r}, "
+                f"metadata={self._metadata or {}!r}, timestamp={self.timestamp!r})")
+
+def _require_no_running_loop() -> None:
+    """当前线程有运行中的事件循环时无法同步读取异步流"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError("不能在运行中的事件循环内同步读取异步流，请使用 aiter_stream()")
+
+def _iter_async(source: AsyncIterable) -> Iterator:
+    """在独立事件循环中同步地迭代异步迭代器（调用方须确认当前线程没有运行中的事件循环）"""
+    iterator = source.__aiter__()
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        if hasattr(iterator, 'aclose'):
+            loop.run_until_complete(iterator.aclose())
+        loop.close()
+
+def _chunk_size(chunk: Any) -> int:
+    """字节/文本块的长度，JSON记录不计长度"""
+    return len(chunk) if isinstance(chunk, (bytes, bytearray, str)) else 0
+
 class Response:
-    """响应对象"""
-    success: bool = True
-    data: Dict[str, Any] = field(default_factory=dict)
-    error: Optional[str] = None
-    metadata: Dict[str, Any] = field(default_factory=dict)
-    timestamp: float = field(default_factory=time.time)
-    
+    """响应对象
+
+    与 Request 相同，使用 __slots__ 并延迟创建 metadata。
+    大结果可通过 set_stream 以流的形式返回（bytes/text 块或 JSON 记录），
+    data 中只保留元信息，调用方用 iter_stream/aiter_stream 边产生边消费。
+    """
+    __slots__ = ('success', 'data', 'error', '_metadata', 'timestamp', 'done',
+                 'stream', 'stream_kind', '_stream_listeners')
+
+    def __init__(self, success: bool = True, data: Dict[str, Any] = None, error: Optional[str] = None,
+                 metadata: Dict[str, Any] = None, timestamp: float = None):
+        self.success = success
+        self.data = {} if data is None else data
+        self.error = error
+        self._metadata = metadata
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        # 为True时后续中间件的主处理被跳过（如缓存命中）
+        self.done = False
+        self.stream: Optional[Union[Iterable, AsyncIterable]] = None
+        self.stream_kind: Optional[str] = None
+        self._stream_listeners = None
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: Dict[str, Any]) -> None:
+        self._metadata = value
+
+    def finish(self) -> None:
+        """结束处理，跳过后续中间件的主处理"""
+        self.done = True
+
     def set_error(self, error: str) -> None:
         """设置错误"""
         self.success = False
         self.error = error
-    
+
     def set_data(self, key: str, value: Any) -> None:
         """设置数据"""
-        self.data[key] = value
\ No newline at end of file
+        self.data[key] = value
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.stream is not None
+
+    def set_stream(self, source: Union[Iterable, AsyncIterable], kind: str = 'text') -> None:
+        """设置流式结果，kind 为 bytes、text 或 json"""
+        self.stream = source
+        self.stream_kind = kind
+        self.metadata['streaming'] = True
+        self.metadata['stream_kind'] = kind
+
+    def on_stream_end(self, callback: Callable[['Response', Optional[BaseException]], None]) -> None:
+        """注册流结束回调，流读完、提前关闭或出错时调用一次"""
+        if self._stream_listeners is None:
+            self._stream_listeners = []
+        self._stream_listeners.append(callback)
+
+    def _take_stream(self):
+        """取出流，流只能被消费一次"""
+        source = self.stream
+        if source is None:
+            raise ValueError("响应没有可读取的流")
+        self.stream = None
+        return source
+
+    def _end_stream(self, chunks: int, size: int, started_at: float, error: Optional[BaseException]) -> None:
+        """记录流统计并通知回调"""
+        metadata = self.metadata
+        metadata['stream_chunks'] = chunks
+        metadata['stream_bytes'] = size
+        metadata['stream_duration'] = time.monotonic() - started_at
+        metadata['stream_complete'] = error is None
+        if error is not None and not isinstance(error, GeneratorExit):
+            metadata['stream_error'] = str(error)
+        for callback in self._stream_listeners or ():
+            callback(self, error)
+
+    def iter_stream(self) -> Iterator:
+        """同步迭代流式结果；异步流在独立事件循环中读取，不能在运行中的事件循环内调用"""
+        if hasattr(self.stream, '__aiter__'):
+            _require_no_running_loop()
+        source = self._take_stream()
+        iterator = _iter_async(source) if hasattr(source, '__aiter__') else iter(source)
+        chunks = size = 0
+        started_at = time.monotonic()
+        error = None
+        try:
+            for chunk in iterator:
+                chunks += 1
+                size += _chunk_size(chunk)
+                yield chunk
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # 提前停止时关闭底层生成器，释放连接等资源
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            self._end_stream(chunks, size, started_at, error)
+
+    async def aiter_stream(self) -> AsyncIterator:
+        """异步迭代流式结果，同步流在线程池中读取以免阻塞事件循环"""
+        source = self._take_stream()
+        chunks = size = 0
+        started_at = time.monotonic()
+        error = None
+        try:
+            if hasattr(source, '__aiter__'):
+                async for chunk in source:
+                    chunks += 1
+                    size += _chunk_size(chunk)
+                    yield chunk
+            else:
+                loop = asyncio.get_running_loop()
+                iterator = iter(source)
+                sentinel = object()
+                try:
+                    while True:
+                        chunk = await loop.run_in_executor(None, next, iterator, sentinel)
+                        if chunk is sentinel:
+                            break
+                        chunks += 1
+                        size += _chunk_size(chunk)
+                        yield chunk
+                finally:
+                    if hasattr(iterator, 'close'):
+                        iterator.close()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._end_stream(chunks, size, started_at, error)
+
+    def read_stream(self) -> Any:
+        """读取整个流：bytes/text 拼接为一个值，json 返回记录列表"""
+        kind = self.stream_kind
+        chunks = list(self.iter_stream())
+        if kind == 'bytes':
+            return b''.join(chunks)
+        if kind == 'text':
+            return ''.join(chunks)
+        return chunks
+
+    def _fields(self) -> tuple:
+        return (self.success, self.data, self.error, self._metadata or {}, self.timestamp, self.done,
+                self.stream, self.stream_kind)
+
+    def __eq__(self, other: Any) -> bool:
+        """按字段比较（与原 dataclass 相同），未创建的 metadata 视为空字典"""
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f"Response(success={self.success!r}, data={self.data!r}, error={self.error!r}, "
+                f"metadata={self._metadata or {}!r}, timestamp={self.timestamp!r})")
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+限流感知的重试引擎
+"""
+
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+import requests
+
+from .exceptions import RateLimitError
+from .ratelimit import host_key
+
+try:
+    import aiohttp
+    _TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError,
+                         aiohttp.ClientConnectionError)
+except ImportError:
+    _TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError)
+
+logger = logging.getLogger(__name__)
+
+# 可重试的服务端错误
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+# 非幂等方法只在请求未被处理时重试（限流和 503）
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def _parse_duration(value: str) -> Optional[float]:
+    """解析 OpenAI 风格的时长（如 1s、6m0s、20ms）"""
+    parts = _DURATION.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _UNITS[unit] for number, unit in parts)
+
+def rate_limit_reset(resp, now: float = None) -> Optional[float]:
+    """从响应头解析限流解除时间（time.time() 时间戳）
+
+    依次识别 Retry-After（秒数或 HTTP 日期）、X-RateLimit-Reset（GitHub，Unix 时间戳）
+    和 x-ratelimit-reset-requests/-tokens（OpenAI，时长）。
+    """
+    now = time.time() if now is None else now
+    headers = resp.headers
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        retry_after = retry_after.strip()
+        if retry_after.isdigit():
+            return now + int(retry_after)
+        try:
+            return email.utils.parsedate_to_datetime(retry_after).timestamp()
+        except (TypeError, ValueError):
+            pass
+    reset = headers.get('X-RateLimit-Reset')
+    if reset:
+        try:
+            return float(reset)
+        except ValueError:
+            pass
+    delays = [_parse_duration(headers.get(name) or '')
+              for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')]
+    delays = [delay for delay in delays if delay is not None]
+    return now + max(delays) if delays else None
+
+def is_rate_limited(resp) -> bool:
+    """429，或 GitHub 额度耗尽/触发二级限流时的 403"""
+    if resp.status_code == 429:
+        return True
+    if resp.status_code == 403:
+        headers = resp.headers
+        return headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in headers
+    return False
+
+class RetryEngine:
+    """指数退避 + 全抖动的重试引擎
+
+    - 限流响应按 Retry-After/X-RateLimit-Reset 等待，而不是盲目退避
+    - 限流状态按主机共享：一个请求得知主机被限流后，同主机的其他请求
+      直接等到解除时间再发送，避免继续消耗额度、触发更长的封禁；
+      主机键与 RateLimiter 相同（host_key）
+    - 每次调用有独立的预算：最多 max_retries 次重试、累计等待不超过 max_wait 秒，
+      超出预算时对限流抛出带解除时间的 RateLimitError
+    """
+
+    def __init__(self, max_retries: int = None, base_delay: float = 0.5,
+                 max_delay: float = 30.0, max_wait: float = None):
+        self.max_retries = int(os.getenv('MAX_RETRIES', '3')) if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = float(os.getenv('RETRY_MAX_WAIT', '60')) if max_wait is None else max_wait
+        self._blocked_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'exhausted': 0,
+                       'waited': 0.0, 'host_waits': 0}
+
+    def backoff(self, attempt: int) -> float:
+        """全抖动退避：[0, min(max_delay, base_delay * 2^attempt)] 内均匀取值"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _count(self, key: str, value: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def _block_host(self, host: str, until: float) -> None:
+        with self._lock:
+            if until > self._blocked_until.get(host, 0):
+                self._blocked_until[host] = until
+
+    def blocked_until(self, host: str) -> float:
+        """主机限流解除时间，未被限流返回 0"""
+        with self._lock:
+            until = self._blocked_until.get(host, 0)
+            if until and until <= time.time():
+                del self._blocked_until[host]
+                return 0
+            return until
+
+    def call(self, send: Callable[..., Any], method: str, url: str, **kwargs):
+        """发送请求，按需重试，返回最后一次响应"""
+        host = host_key(url)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        waited = 0.0
+        self._count('requests')
+        while True:
+            waited += self._sleep(self._host_delay(host, waited))
+            try:
+                resp = send(method, url, **kwargs)
+            except _TRANSPORT_ERRORS as e:
+                delay = self._error_delay(e, url, idempotent, attempt, waited)
+            else:
+                delay = self._response_delay(resp, url, host, idempotent, attempt, waited)
+                if delay is None:
+                    return resp
+            waited += self._sleep(delay)
+            attempt += 1
+            self._count('retries')
+
+    async def acall(self, send: Callable[..., Any], method: str, url: str, **kwargs):
+        """call 的协程版本，send 为协程函数，等待期间让出事件循环"""
+        host = host_key(url)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        waited = 0.0
+        self._count('requests')
+        while True:
+            waited += await self._asleep(self._host_delay(host, waited))
+            try:
+                resp = await send(method, url, **kwargs)
+            except _TRANSPORT_ERRORS as e:
+                delay = self._error_delay(e, url, idempotent, attempt, waited)
+            else:
+                delay = self._response_delay(resp, url, host, idempotent, attempt, waited)
+                if delay is None:
+                    return resp
+            waited += await self._asleep(delay)
+            attempt += 1
+            self._count('retries')
+
+    def _host_delay(self, host: str, waited: float) -> float:
+        """主机已知被限流时需要先等待的秒数，等待超出预算则不再发送"""
+        until = self.blocked_until(host)
+        if not until:
+            return 0.0
+        delay = until - time.time()
+        if waited + delay > self.max_wait:
+            self._count('exhausted')
+            raise RateLimitError(f"{host} 限流中，预计 {delay:.0f} 秒后解除", reset_at=until)
+        self._count('host_waits')
+        return delay
+
+    def _error_delay(self, error: Exception, url: str, idempotent: bool, attempt: int, waited: float) -> float:
+        """传输错误后的重试等待时间，不可重试时重新抛出"""
+        if not idempotent or attempt >= self.max_retries:
+            raise error
+        delay = self.backoff(attempt)
+        if waited + delay > self.max_wait:
+            raise error
+        logger.warning(f"请求失败，{delay:.2f}秒后重试 ({attempt + 1}/{self.max_retries}): {url} - {error}")
+        return delay
+
+    def _response_delay(self, resp, url: str, host: str, idempotent: bool,
+                        attempt: int, waited: float) -> Optional[float]:
+        """响应后的重试等待时间，返回 None 表示直接返回该响应"""
+        rate_limited = is_rate_limited(resp)
+        if rate_limited:
+            self._count('rate_limited')
+            reset_at = rate_limit_reset(resp)
+            if reset_at is not None:
+                self._block_host(host, reset_at)
+                # 加少量抖动，避免同时解除的请求一齐涌入
+                delay = max(reset_at - time.time(), 0) + random.uniform(0, self.base_delay)
+            else:
+                delay = self.backoff(attempt)
+        elif resp.status_code in RETRY_STATUSES and (idempotent or resp.status_code == 503):
+            reset_at = rate_limit_reset(resp)
+            delay = max(reset_at - time.time(), 0) if reset_at else self.backoff(attempt)
+        else:
+            return None
+
+        if attempt >= self.max_retries or waited + delay > self.max_wait:
+            if not rate_limited:
+                return None
+            self._count('exhausted')
+            resp.close()
+            raise RateLimitError(
+                f"{host} 触发限流 (HTTP {resp.status_code})，重试预算已用尽",
+                reset_at=reset_at, status_code=resp.status_code
+            )
+        resp.close()
+        logger.warning(f"HTTP {resp.status_code}，{delay:.2f}秒后重试 "
+                       f"({attempt + 1}/{self.max_retries}): {url}")
+        return delay
+
+    def _sleep(self, delay: float) -> float:
+        delay = max(delay, 0.0)
+        if delay:
+            time.sleep(delay)
+            self._count('waited', delay)
+        return delay
+
+    async def _asleep(self, delay: float) -> float:
+        delay = max(delay, 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+            self._count('waited', delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            return dict(self._stats, blocked_hosts={
+                host: until - now for host, until in self._blocked_until.items() if until > now
+            })
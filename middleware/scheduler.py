@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+请求优先级调度器
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from enum import IntEnum
+from typing import Dict, Any, List, Optional, Tuple
+
+from .core import MiddlewareManager
+from .request import Request, Response
+from .stats import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """请求优先级，数值越小越优先"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BULK = 2
+
+class _Entry:
+    """排队中的请求"""
+    __slots__ = ('request', 'future', 'enqueued_at')
+
+    def __init__(self, request: Request, future: Future, enqueued_at: float):
+        self.request = request
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+class RequestScheduler:
+    """位于 MiddlewareManager 之前的优先级调度器
+
+    - 每个优先级内按提交方轮转，单个提交方的大批量请求不会独占该级别
+    - 等待每超过 aging_interval 秒，请求的有效优先级提升一级，可提升到 INTERACTIVE 之上，
+      持续的高优先级请求也不会让低优先级饿死
+    - 由固定数量的工作线程调用 MiddlewareManager.process
+    """
+
+    def __init__(self, manager: MiddlewareManager, workers: int = 4, aging_interval: float = 5.0):
+        self.manager = manager
+        self.workers = workers
+        self.aging_interval = aging_interval
+        # 优先级 -> {提交方: 请求队列}，OrderedDict 的顺序即轮转顺序
+        self._queues: Dict[Priority, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in Priority}
+        self._depth: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._wait_times: Dict[Priority, LatencyHistogram] = {p: LatencyHistogram() for p in Priority}
+        self._completed: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._promoted = 0
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+    def start(self) -> None:
+        """启动工作线程"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"jarvis-scheduler-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止调度，取消尚未开始的请求"""
+        with self._condition:
+            self._running = False
+            for queues in self._queues.values():
+                for queue in queues.values():
+                    for entry in queue:
+                        entry.future.cancel()
+                queues.clear()
+            self._depth = {p: 0 for p in Priority}
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def submit(self, request: Request, priority: Priority = Priority.NORMAL,
+               submitter: str = 'default') -> Future:
+        """提交请求，返回结果为 Response 的 Future"""
+        future: Future = Future()
+        priority = Priority(priority)
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("调度器未启动")
+            queues = self._queues[priority]
+            queue = queues.get(submitter)
+            if queue is None:
+                queue = queues[submitter] = deque()
+            queue.append(_Entry(request, future, time.monotonic()))
+            self._depth[priority] += 1
+            self._condition.notify()
+        return future
+
+    def submit_many(self, requests: List[Request], priority: Priority = Priority.NORMAL,
+                    submitter: str = 'default', max_in_flight: Optional[int] = None) -> List[Future]:
+        """批量提交请求，返回与 requests 一一对应的 Future
+
+        max_in_flight 限制这一批同时在调度器中（排队或处理中）的请求数：先提交前 max_in_flight 个，
+        每完成一个再提交下一个，不占用工作线程等待，也不影响其他提交方。
+        """
+        if not max_in_flight or max_in_flight >= len(requests):
+            return [self.submit(request, priority, submitter) for request in requests]
+
+        results = [Future() for _ in requests]
+        pending = iter(enumerate(requests))
+        lock = threading.Lock()
+
+        def submit_next() -> None:
+            with lock:
+                item = next(pending, None)
+            if item is None:
+                return
+            index, request = item
+            try:
+                future = self.submit(request, priority, submitter)
+            except Exception as e:
+                results[index].set_exception(e)
+                submit_next()
+                return
+            future.add_done_callback(lambda done: complete(index, done))
+
+        def complete(index: int, done: Future) -> None:
+            if done.cancelled():
+                results[index].cancel()
+            elif done.exception() is not None:
+                results[index].set_exception(done.exception())
+            else:
+                results[index].set_result(done.result())
+            submit_next()
+
+        for _ in range(max_in_flight):
+            submit_next()
+        return results
+
+    def _effective_priority(self, priority: Priority, now: float) -> Tuple[int, int, float, str]:
+        """计算某级别等待最久的请求的调度键（有效优先级, 原优先级, 入队时间, 提交方）
+
+        有效优先级不设下限：等待足够久的低优先级请求会排在新到的 INTERACTIVE 请求之前。
+        """
+        submitter, queue = min(self._queues[priority].items(), key=lambda item: item[1][0].enqueued_at)
+        oldest = queue[0].enqueued_at
+        boost = int((now - oldest) / self.aging_interval) if self.aging_interval else 0
+        return priority - boost, priority, oldest, submitter
+
+    def _next_entry(self) -> Optional[Tuple[Priority, _Entry]]:
+        """选出下一个要执行的请求（调用方持有锁）
+
+        因等待而提升了优先级时取出的正是计算提升所用的那个请求，
+        否则在该级别内按提交方轮转。
+        """
+        now = time.monotonic()
+        candidates = [self._effective_priority(p, now) for p in Priority if self._depth[p]]
+        if not candidates:
+            return None
+        effective, priority, _, oldest_submitter = min(candidates)
+        priority = Priority(priority)
+        queues = self._queues[priority]
+        if effective < priority:
+            self._promoted += 1
+            submitter, queue = oldest_submitter, queues[oldest_submitter]
+        else:
+            # 轮转：取第一个提交方的请求
+            submitter, queue = next(iter(queues.items()))
+
+        entry = queue.popleft()
+        # 被取出请求的提交方移到队尾
+        if queue:
+            queues.move_to_end(submitter)
+        else:
+            del queues[submitter]
+        self._depth[priority] -= 1
+        return priority, entry
+
+    def _worker(self) -> None:
+        """工作线程主循环"""
+        while True:
+            with self._condition:
+                selected = self._next_entry()
+                while selected is None:
+                    if not self._running:
+                        return
+                    self._condition.wait()
+                    selected = self._next_entry()
+
+            priority, entry = selected
+            if not entry.future.set_running_or_notify_cancel():
+                continue
+            self._wait_times[priority].record(time.monotonic() - entry.enqueued_at)
+            try:
+                response = self.manager.process(entry.request)
+            except Exception as e:
+                logger.error(f"调度请求处理失败: {entry.request.action} - {e}")
+                response = Response()
+                response.set_error(str(e))
+            with self._condition:
+                self._completed[priority] += 1
+            entry.future.set_result(response)
+
+    def metrics(self) -> Dict[str, Any]:
+        """各优先级的队列深度和等待时间"""
+        with self._condition:
+            depth = dict(self._depth)
+            submitters = {p: len(self._queues[p]) for p in Priority}
+        return {
+            'workers': self.workers,
+            'promoted': self._promoted,
+            'priorities': {
+                p.name.lower(): {
+                    'queue_depth': depth[p],
+                    'submitters': submitters[p],
+                    'completed': self._completed[p],
+                    'wait': self._wait_times[p].summary(),
+                }
+                for p in Priority
+            },
+        }
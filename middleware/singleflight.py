@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+相同请求的合并（single-flight）
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Awaitable, Callable, Tuple
+
+class SingleFlight:
+    """合并同时进行的相同调用
+
+    同一键的第一个调用方执行函数，执行期间到达的其他调用方等待同一个 Future，
+    共享其结果或异常。调用结束后键即被移除，因此不会缓存结果。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0}
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """由请求要素生成键（参数和请求头按键排序）"""
+        material = json.dumps([
+            sorted(part.items()) if isinstance(part, dict) else part for part in parts
+        ], default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """登记调用，返回 (Future, 是否为执行方)"""
+        with self._lock:
+            self._stats['calls'] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self._stats['coalesced'] += 1
+        return future, leader
+
+    def _leave(self, key: str) -> None:
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """执行或等待调用，返回 (结果, 是否为合并得到的结果)"""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._leave(key)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """do 的协程版本，fn 返回协程；与 do 共用同一组进行中的调用，同步和异步调用方可以互相合并"""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._leave(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls, coalesced = self._stats['calls'], self._stats['coalesced']
+            return {
+                'calls': calls,
+                'coalesced': coalesced,
+                'coalesce_rate': coalesced / calls if calls else 0.0,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+SSE（Server-Sent Events）解析和OpenAI流式补全
+"""
+
+import json
+import time
+from typing import Dict, Any, Iterable, Iterator, Tuple
+
+def iter_sse(chunks: Iterable[bytes]) -> Iterator[Tuple[str, str]]:
+    """从字节块中解析事件，产出 (event, data)，多行 data 以换行拼接"""
+    buffer = b''
+    event = 'message'
+    data = []
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for raw in lines:
+            line = raw.rstrip(b'\r').decode('utf-8')
+            if not line:
+                if data:
+                    yield event, '\n'.join(data)
+                event = 'message'
+                data = []
+                continue
+            if line.startswith(':'):
+                continue
+            field, _, value = line.partition(':')
+            if value.startswith(' '):
+                value = value[1:]
+            if field == 'data':
+                data.append(value)
+            elif field == 'event':
+                event = value
+    if data:
+        yield event, '\n'.join(data)
+
+def iter_chat_completion(chunks: Iterable[bytes], stats: Dict[str, Any],
+                         started_at: float = None) -> Iterator[str]:
+    """逐段产出 chat/completions 流式响应的文本
+
+    stats 在迭代过程中更新：ttft（首个 token 的耗时）、tokens、tokens_per_sec、
+    duration、finish_reason；服务端返回 usage 时 tokens 取其 completion_tokens。
+    started_at 为发送请求的时间（time.monotonic()），默认为开始迭代的时间。
+    """
+    started_at = time.monotonic() if started_at is None else started_at
+    first_at = None
+    tokens = 0
+    try:
+        for _, data in iter_sse(chunks):
+            if data == '[DONE]':
+                break
+            payload = json.loads(data)
+            if payload.get('error'):
+                raise RuntimeError(payload['error'].get('message', payload['error']))
+            if payload.get('usage'):
+                stats['usage'] = payload['usage']
+            for choice in payload.get('choices') or ():
+                if choice.get('finish_reason'):
+                    stats['finish_reason'] = choice['finish_reason']
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    if first_at is None:
+                        first_at = time.monotonic()
+                        stats['ttft'] = first_at - started_at
+                    # 每个增量通常对应一个 token
+                    tokens += 1
+                    yield text
+    finally:
+        finished_at = time.monotonic()
+        usage = stats.get('usage') or {}
+        tokens = usage.get('completion_tokens', tokens)
+        stats['tokens'] = tokens
+        stats['duration'] = finished_at - started_at
+        if first_at is not None and finished_at > first_at:
+            stats['tokens_per_sec'] = tokens / (finished_at - first_at)
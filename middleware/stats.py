@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+性能统计工具
+"""
+
+import math
+import threading
+from typing import Dict, Any
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图（单位: 秒），线程安全
+
+    每个桶的上界按 growth 倍增长，分位数误差不超过 growth-1（默认约10%），
+    内存占用与样本数量无关。
+    """
+
+    def __init__(self, min_value: float = 1e-6, max_value: float = 600.0, growth: float = 1.1):
+        self._min_value = min_value
+        self._growth = growth
+        self._log_growth = math.log(growth)
+        self._buckets = [0] * (int(math.log(max_value / min_value) / self._log_growth) + 2)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        """记录一个样本"""
+        if value <= self._min_value:
+            index = 0
+        else:
+            index = min(int(math.log(value / self._min_value) / self._log_growth) + 1,
+                        len(self._buckets) - 1)
+        with self._lock:
+            self._buckets[index] += 1
+            self.count += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q: float) -> float:
+        """获取分位数（q 取值 0~1）"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            cumulative = 0
+            for index, bucket in enumerate(self._buckets):
+                cumulative += bucket
+                if cumulative >= target:
+                    upper = self._min_value * self._growth ** index
+                    return max(self.min, min(upper, self.max))
+            return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """统计摘要（毫秒）"""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000,
+            'min_ms': self.min * 1000,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+HTTP传输层
+APIMiddleware 通过传输对象发送请求，可在基于 requests.Session 的同步实现
+和基于 aiohttp 的异步实现之间切换，两者返回的响应对象接口一致
+（status_code/headers/content/text/json/raise_for_status/iter_content/close）。
+"""
+
+import asyncio
+import json as jsonlib
+import os
+import threading
+from typing import Dict, Any, Optional, Iterator
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .exceptions import MiddlewareError
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
+def openai_url(path: str = 'chat/completions') -> str:
+    """OpenAI（或兼容服务）接口地址，服务地址读取 OPENAI_BASE_URL"""
+    base = os.getenv('OPENAI_BASE_URL') or 'https://api.openai.com/v1'
+    return f"{base.rstrip('/')}/{path}"
+
+def weather_url(path: str = 'weather') -> str:
+    """OpenWeatherMap 接口地址，服务地址读取 WEATHER_BASE_URL"""
+    base = os.getenv('WEATHER_BASE_URL') or 'http://api.openweathermap.org/data/2.5'
+    return f"{base.rstrip('/')}/{path}"
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+class TransportConfig:
+    """连接池与超时配置
+
+    - pool_connections: 缓存的主机连接池数量，超出后最久未用的主机连接池被关闭
+    - pool_maxsize: 每个主机保持的空闲连接上限，即可复用的连接数
+    - pool_block: 为True时每个主机的并发连接数也不超过 pool_maxsize，多余请求排队等待
+    - keep_alive: 关闭后每个请求使用新连接（Connection: close）
+    - connect_timeout/read_timeout: 建立连接和读取响应的超时（秒）
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 keep_alive: bool = True, connect_timeout: float = 5.0, read_timeout: float = 30.0):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @classmethod
+    def from_env(cls) -> 'TransportConfig':
+        """从环境变量读取配置，读取超时默认沿用 TIMEOUT"""
+        return cls(
+            pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', '10')),
+            pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', '10')),
+            pool_block=_env_bool('HTTP_POOL_BLOCK', False),
+            keep_alive=_env_bool('HTTP_KEEP_ALIVE', True),
+            connect_timeout=float(os.getenv('HTTP_CONNECT_TIMEOUT', '5')),
+            read_timeout=float(os.getenv('HTTP_READ_TIMEOUT', os.getenv('TIMEOUT', '30'))),
+        )
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+class ConnectionStats:
+    """连接复用统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.by_host: Dict[str, Dict[str, int]] = {}
+
+    def _host(self, host: str) -> Dict[str, int]:
+        entry = self.by_host.get(host)
+        if entry is None:
+            entry = self.by_host.setdefault(host, {'requests': 0, 'new_connections': 0})
+        return entry
+
+    def record_request(self, host: str) -> None:
+        with self._lock:
+            self.requests += 1
+            self._host(host)['requests'] += 1
+
+    def record_new_connection(self, host: str) -> None:
+        with self._lock:
+            self.new_connections += 1
+            self._host(host)['new_connections'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': reused,
+                'reuse_rate': reused / self.requests if self.requests else 0.0,
+                'by_host': {host: dict(entry) for host, entry in self.by_host.items()},
+            }
+
+def _counting_pool(base, stats: ConnectionStats):
+    """创建在新建连接时计数的连接池类"""
+    class CountingConnectionPool(base):
+        def _new_conn(self):
+            stats.record_new_connection(self.host)
+            return super()._new_conn()
+    return CountingConnectionPool
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """统计请求数和新建连接数的适配器"""
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        self.connection_stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self.connection_stats),
+            'https': _counting_pool(HTTPSConnectionPool, self.connection_stats),
+        }
+
+    def send(self, request, **kwargs):
+        self.connection_stats.record_request(urlparse(request.url).hostname or '')
+        return super().send(request, **kwargs)
+
+class SessionTransport:
+    """基于 requests.Session 的同步传输，返回 requests.Response"""
+
+    name = 'session'
+
+    def __init__(self, timeout: float = None, headers: Dict[str, str] = None,
+                 config: TransportConfig = None):
+        self.config = config or TransportConfig.from_env()
+        if timeout is not None:
+            self.config.read_timeout = timeout
+        self.connection_stats = ConnectionStats()
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        if not self.config.keep_alive:
+            self.session.headers['Connection'] = 'close'
+        adapter = PooledHTTPAdapter(
+            self.connection_stats,
+            pool_connections=self.config.pool_connections,
+            pool_maxsize=self.config.pool_maxsize,
+            pool_block=self.config.pool_block,
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def timeout(self):
+        """(连接超时, 读取超时)"""
+        return self.config.timeout
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送请求，参数与 requests.Session.request 相同"""
+        kwargs.setdefault('timeout', self.config.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'connections': self.connection_stats.snapshot()}
+
+_shared_transport: Optional[SessionTransport] = None
+_shared_lock = threading.Lock()
+
+def get_shared_transport() -> SessionTransport:
+    """进程内共享的同步传输，APIMiddleware、APITools 和 main.py 共用同一连接池
+
+    设置 JARVIS_CASSETTE 时返回录制/回放包装（见 middleware.cassette）。
+    """
+    global _shared_transport
+    if _shared_transport is None:
+        with _shared_lock:
+            if _shared_transport is None:
+                from .cassette import cassette_from_env
+                _shared_transport = cassette_from_env(SessionTransport())
+    return _shared_transport
+
+class TimeoutTransport:
+    """共享同步传输的视图：复用其连接池，但使用不同的默认读取超时"""
+
+    def __init__(self, inner, timeout: float):
+        self.inner = inner
+        self.read_timeout = timeout
+
+    @property
+    def timeout(self):
+        return (self.inner.config.connect_timeout, self.read_timeout)
+
+    def __getattr__(self, name: str):
+        return getattr(self.inner, name)
+
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.inner.request(method, url, **kwargs)
+
+class AsyncTransportResponse:
+    """异步传输的响应，接口与 requests.Response 的常用部分一致"""
+
+    def __init__(self, method: str, url: str, status_code: int, headers: CaseInsensitiveDict,
+                 content: Optional[bytes] = None, raw=None, loop: asyncio.AbstractEventLoop = None):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.reason = ''
+        self._content = content
+        # stream=True 时保留未读取的 aiohttp 响应
+        self._raw = raw
+        self._loop = loop
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = b''.join(self.iter_content(64 * 1024))
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self) -> Any:
+        return jsonlib.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            kind = '客户端错误' if self.status_code < 500 else '服务器错误'
+            raise requests.HTTPError(f"{self.status_code} {kind}: {self.url}", response=self)
+
+    def iter_content(self, chunk_size: int = 8192) -> Iterator[bytes]:
+        """逐块读取响应体"""
+        if self._raw is None:
+            content = self._content or b''
+            for start in range(0, len(content), chunk_size):
+                yield content[start:start + chunk_size]
+            return
+        try:
+            while True:
+                chunk = asyncio.run_coroutine_threadsafe(
+                    self._raw.content.read(chunk_size), self._loop
+                ).result()
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._raw is not None:
+            self._loop.call_soon_threadsafe(self._raw.release)
+            self._raw = None
+
+class AsyncTransport:
+    """基于 aiohttp 的异步传输
+
+    所有请求共享一个连接池，在专用后台事件循环中执行，
+    limit/limit_per_host 分别限制总连接数和单主机连接数。
+    同步调用方通过 request() 提交到后台循环并等待结果，
+    异步调用方使用 arequest()。
+    """
+
+    name = 'async'
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, timeout: float = 30,
+                 headers: Dict[str, str] = None):
+        try:
+            import aiohttp
+        except ImportError:
+            raise MiddlewareError("异步HTTP后端需要安装 aiohttp: pip install aiohttp")
+        self._aiohttp = aiohttp
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.headers = dict(headers or DEFAULT_HEADERS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """启动后台事件循环并在其中创建 ClientSession"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="jarvis-http-loop", daemon=True)
+                    thread.start()
+                    asyncio.run_coroutine_threadsafe(self._create_session(), loop).result()
+                    self._loop = loop
+                    self._thread = thread
+        return self._loop
+
+    async def _create_session(self) -> None:
+        aiohttp = self._aiohttp
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+        self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+
+    async def _request(self, method: str, url: str, headers: Dict[str, str] = None,
+                       params: Dict[str, Any] = None, json: Any = None, data: Any = None,
+                       timeout: float = None, stream: bool = False, **kwargs) -> AsyncTransportResponse:
+        """在后台事件循环中执行请求"""
+        client_timeout = self._client_timeout(timeout or self.timeout, stream)
+        raw = await self._session.request(
+            method, url, headers=headers, params=params or None, json=json, data=data,
+            timeout=client_timeout, **kwargs
+        )
+        response_headers = CaseInsensitiveDict(raw.headers)
+        if stream:
+            return AsyncTransportResponse(method, str(raw.url), raw.status, response_headers,
+                                          raw=raw, loop=self._loop)
+        try:
+            content = await raw.read()
+        finally:
+            raw.release()
+        return AsyncTransportResponse(method, str(raw.url), raw.status, response_headers, content=content)
+
+    def _client_timeout(self, timeout, stream: bool):
+        """把 requests 风格的超时转换为 ClientTimeout
+
+        (连接超时, 读取超时) 元组分别对应 sock_connect 和 sock_read；
+        单个数值时流式响应只限制单次读取的间隔，非流式响应限制总时长。
+        """
+        if isinstance(timeout, (tuple, list)):
+            connect, read = timeout
+            return self._aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        if stream:
+            return self._aiohttp.ClientTimeout(sock_read=timeout)
+        return self._aiohttp.ClientTimeout(total=timeout)
+
+    def request(self, method: str, url: str, **kwargs) -> AsyncTransportResponse:
+        """同步发送请求"""
+        loop = self._get_loop()
+        return asyncio.run_coroutine_threadsafe(self._request(method, url, **kwargs), loop).result()
+
+    async def arequest(self, method: str, url: str, **kwargs) -> AsyncTransportResponse:
+        """异步发送请求，可在任意事件循环中调用"""
+        loop = self._get_loop()
+        future = asyncio.run_coroutine_threadsafe(self._request(method, url, **kwargs), loop)
+        return await asyncio.wrap_future(future)
+
+    def close(self) -> None:
+        """关闭连接池，停止并关闭后台事件循环"""
+        with self._lock:
+            if self._loop is None:
+                return
+            loop, thread = self._loop, self._thread
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+            self._loop = None
+            self._thread = None
+            self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'limit': self.limit, 'limit_per_host': self.limit_per_host}
+
+def create_transport(backend: str = None, timeout: float = None):
+    """按名称获取传输，默认读取环境变量 API_BACKEND（session/async）
+
+    session 后端返回进程内共享的传输，timeout 与共享传输的读取超时不同时返回共用连接池的
+    TimeoutTransport。设置 JARVIS_CASSETTE 时两种后端都经过录制/回放。
+    """
+    backend = backend or os.getenv('API_BACKEND', 'session')
+    if backend == 'session':
+        transport = get_shared_transport()
+        if timeout is None or timeout == transport.config.read_timeout:
+            return transport
+        return TimeoutTransport(transport, timeout)
+    timeout = timeout if timeout is not None else float(os.getenv('TIMEOUT', '30'))
+    if backend == 'async':
+        from .cassette import cassette_from_env
+        return cassette_from_env(AsyncTransport(
+            limit=int(os.getenv('API_ASYNC_LIMIT', '100')),
+            limit_per_host=int(os.getenv('API_ASYNC_LIMIT_PER_HOST', '10')),
+            timeout=timeout,
+        ))
+    raise MiddlewareError(f"未知的HTTP后端: {backend}")
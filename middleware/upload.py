@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+流式 multipart 上传
+按块读取文件并生成 multipart/form-data 请求体，内存占用与文件大小无关；
+长度已知时带 Content-Length 发送，也可使用分块传输编码（Transfer-Encoding: chunked）。
+"""
+
+import mimetypes
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple, Union
+
+def _quote(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\r', '%0D').replace('\n', '%0A')
+
+class MultipartEncoder:
+    """流式 multipart/form-data 编码器
+
+    fields 为普通表单字段；files 为 {字段名: 文件路径} 或 {字段名: (文件名, 文件路径, Content-Type)}。
+    可多次迭代，每次迭代重新打开文件。progress(已发送字节数, 总字节数, 字节/秒) 在每块生成后调用。
+    """
+
+    def __init__(self, fields: Dict[str, Any] = None, files: Dict[str, Union[str, Tuple]] = None,
+                 boundary: str = None, chunk_size: int = 256 * 1024,
+                 progress: Callable[[int, int, float], None] = None):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        # (分段头, 文件路径或字段值)
+        self._parts: List[Tuple[bytes, Union[str, bytes]]] = []
+        for name, value in (fields or {}).items():
+            header = (f'--{self.boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{_quote(name)}"\r\n\r\n')
+            data = value if isinstance(value, bytes) else str(value).encode('utf-8')
+            self._parts.append((header.encode('utf-8'), data))
+        for name, spec in (files or {}).items():
+            if isinstance(spec, (tuple, list)):
+                filename, path, content_type = (tuple(spec) + (None,))[:3]
+            else:
+                filename, path, content_type = os.path.basename(spec), spec, None
+            content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            header = (f'--{self.boundary}\r\n'
+                      f'Content-Disposition: form-data; name="{_quote(name)}"; filename="{_quote(filename)}"\r\n'
+                      f'Content-Type: {content_type}\r\n\r\n')
+            self._parts.append((header.encode('utf-8'), path))
+        self._footer = f'--{self.boundary}--\r\n'.encode('utf-8')
+        self.sent = 0
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        """请求体总长度，文件按当前大小计算"""
+        total = len(self._footer)
+        for header, body in self._parts:
+            size = len(body) if isinstance(body, bytes) else os.path.getsize(body)
+            total += len(header) + size + 2
+        return total
+
+    def _iter_raw(self) -> Iterator[bytes]:
+        for header, body in self._parts:
+            yield header
+            if isinstance(body, bytes):
+                yield body
+            else:
+                with open(body, 'rb') as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                        yield chunk
+            yield b'\r\n'
+        yield self._footer
+
+    def __iter__(self) -> Iterator[bytes]:
+        """产出请求体，小的分段头与文件块合并以减少发送次数"""
+        total = len(self)
+        started_at = time.monotonic()
+        self.sent = 0
+        pending = b''
+        for data in self._iter_raw():
+            if len(pending) + len(data) < self.chunk_size:
+                pending += data
+                continue
+            chunk, pending = (pending + data if pending else data), b''
+            yield chunk
+            self._report(len(chunk), total, started_at)
+        if pending:
+            yield pending
+            self._report(len(pending), total, started_at)
+
+    def _report(self, size: int, total: int, started_at: float) -> None:
+        self.sent += size
+        if self.progress:
+            elapsed = time.monotonic() - started_at
+            self.progress(self.sent, total, self.sent / elapsed if elapsed else 0.0)
+
+def upload(request: Callable, url: str, file_path: str, field_name: str = 'file',
+           fields: Dict[str, Any] = None, headers: Dict[str, str] = None, chunked: bool = False,
+           chunk_size: int = 256 * 1024, progress: Callable[[int, int, float], None] = None, **kwargs):
+    """以流式 multipart 上传一个文件，返回 requests.Response
+
+    request 为 APITools._request 等发送函数；chunked 为 True 时不发送 Content-Length，
+    使用分块传输编码（适用于需要边生成边上传的服务端或代理）。
+    """
+    encoder = MultipartEncoder(fields, {field_name: file_path}, chunk_size=chunk_size, progress=progress)
+    headers = dict(headers or {}, **{'Content-Type': encoder.content_type})
+    # requests 对有长度的可迭代对象发送 Content-Length，对生成器使用分块传输编码
+    return request('POST', url, data=iter(encoder) if chunked else encoder, headers=headers, **kwargs)
+
+def upload_many(request: Callable, url: str, file_paths: List[str], max_workers: int = 4,
+                progress: Callable[[str, int, int, float], None] = None,
+                **kwargs) -> List[Tuple[Optional[Any], Optional[Exception]]]:
+    """并发上传多个文件，每个文件一个请求，按输入顺序返回 (响应, 异常)
+
+    progress(文件路径, 已发送字节数, 总字节数, 字节/秒)。
+    """
+    def send(path: str):
+        callback = (lambda sent, total, speed: progress(path, sent, total, speed)) if progress else None
+        return upload(request, url, path, progress=callback, **kwargs)
+
+    results: List[Tuple[Optional[Any], Optional[Exception]]] = []
+    if not file_paths:
+        return results
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths)),
+                            thread_name_prefix="jarvis-upload") as pool:
+        futures = [pool.submit(send, path) for path in file_paths]
+        for future in futures:
+            error = future.exception()
+            results.append((None, error) if error else (future.result(), None))
+    return results
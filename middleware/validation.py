@@ -22,8 +22,10 @@ class ValidationMiddleware(BaseMiddleware):
             'api_openai': ['prompt'],
             'api_github': ['endpoint'],
             'api_weather': ['city'],
+            'api_weather_many': ['cities'],
             'python_execute': ['code']
         }
+        self.actions = tuple(self.validation_rules)
     
     def process(self, request: Request, response: Response) -> None:
         """验证请求参数"""
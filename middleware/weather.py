@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+天气查询缓存和批量查询
+按规范化的城市名缓存 OpenWeatherMap 的当前天气，并记住城市名对应的城市 ID；
+批量查询时已知 ID 的城市通过 group 接口每次最多合并 20 个，其余城市并发逐个查询。
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# group 接口单次最多查询的城市数
+GROUP_SIZE = 20
+
+_SPACES = re.compile(r'\s+')
+_COMMA = re.compile(r'\s*,\s*')
+
+def normalize_city(city) -> str:
+    """规范化城市名：去除首尾和多余空白、统一大小写，"London , GB" 与 "london,gb" 视为同一城市"""
+    return _COMMA.sub(',', _SPACES.sub(' ', str(city).strip())).casefold()
+
+def city_id(city) -> Optional[int]:
+    """城市以数字 ID 给出时返回 ID"""
+    if isinstance(city, int):
+        return city
+    text = str(city).strip()
+    return int(text) if text.isdigit() else None
+
+class WeatherCache:
+    """按城市的 TTL/LRU 天气缓存，线程安全"""
+
+    def __init__(self, ttl: float = 600, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 缓存键 -> (写入时间, 天气数据)；按 ID 查询的键为 "#<id>"
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        # 规范化城市名 -> 城市 ID，从查询结果中学习
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(city) -> str:
+        known = city_id(city)
+        return f"#{known}" if known is not None else normalize_city(city)
+
+    def get(self, city) -> Optional[Tuple[Dict, float]]:
+        """返回 (天气数据, 缓存时长)，未命中或已过期返回 None"""
+        key = self._key(city)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] >= self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[1], now - entry[0]
+
+    def put(self, city, data: Dict) -> None:
+        """保存查询结果，同时按城市 ID 保存并记住城市名对应的 ID"""
+        now = time.monotonic()
+        keys = [self._key(city)]
+        known = data.get('id')
+        with self._lock:
+            if known:
+                keys.append(f"#{known}")
+                if city_id(city) is None:
+                    self._ids[normalize_city(city)] = known
+            for key in keys:
+                self._entries[key] = (now, data)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def city_id(self, city) -> Optional[int]:
+        """城市的 ID：直接给出的数字 ID 或此前查询时记住的 ID"""
+        known = city_id(city)
+        if known is not None:
+            return known
+        with self._lock:
+            return self._ids.get(normalize_city(city))
+
+    def clear(self) -> None:
+        """清空缓存和已记住的城市 ID"""
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'known_ids': len(self._ids),
+                'ttl': self.ttl,
+            }
+
+def fetch_many(cities: List, fetch_one: Callable[[Any], Dict], fetch_group: Callable[[List[int]], List[Dict]],
+               cache: WeatherCache = None, max_workers: int = 8,
+               refresh: bool = False) -> Tuple[List[Optional[Dict]], Dict[str, str], Dict[str, int]]:
+    """批量查询多个城市的天气，返回 (按输入顺序的结果, {城市: 错误信息}, 统计)
+
+    fetch_one(city) 查询单个城市；fetch_group(ids) 查询最多 GROUP_SIZE 个城市 ID，返回天气数据列表。
+    先查缓存（refresh 时跳过），已知 ID 的城市按 GROUP_SIZE 分组，所有分组请求和逐个请求并发发送，
+    重复的城市只查询一次。查询结果写入缓存。
+    """
+    results: List[Optional[Dict]] = [None] * len(cities)
+    errors: Dict[str, str] = {}
+    info = {'cached': 0, 'group_requests': 0, 'single_requests': 0}
+    # 城市 ID -> 输入位置；规范化城市名 -> 输入位置
+    by_id: Dict[int, List[int]] = {}
+    singles: Dict[str, List[int]] = {}
+    for index, city in enumerate(cities):
+        if cache is not None and not refresh:
+            cached = cache.get(city)
+            if cached is not None:
+                results[index] = cached[0]
+                info['cached'] += 1
+                continue
+        known = cache.city_id(city) if cache is not None else city_id(city)
+        if known is not None:
+            by_id.setdefault(known, []).append(index)
+        else:
+            singles.setdefault(normalize_city(city), []).append(index)
+
+    ids = list(by_id)
+    jobs = [(ids[i:i + GROUP_SIZE], None) for i in range(0, len(ids), GROUP_SIZE)]
+    jobs += [(None, indexes) for indexes in singles.values()]
+    if not jobs:
+        return results, errors, info
+
+    def store(indexes: List[int], data: Dict) -> None:
+        for index in indexes:
+            results[index] = data
+            if cache is not None:
+                cache.put(cities[index], data)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)),
+                            thread_name_prefix="jarvis-weather") as pool:
+        futures = {
+            (pool.submit(fetch_group, group) if group else pool.submit(fetch_one, cities[indexes[0]])): (group, indexes)
+            for group, indexes in jobs
+        }
+        for future in as_completed(futures):
+            group, indexes = futures[future]
+            targets = [index for known in group for index in by_id[known]] if group else indexes
+            try:
+                value = future.result()
+            except Exception as e:
+                for index in targets:
+                    errors[str(cities[index])] = str(e)
+                continue
+            if not group:
+                info['single_requests'] += 1
+                store(indexes, value)
+                continue
+            info['group_requests'] += 1
+            for item in value:
+                store(by_id.get(item.get('id'), ()), item)
+            for index in targets:
+                if results[index] is None:
+                    errors[str(cities[index])] = "未找到城市"
+    return results, errors, info
+
+_shared_cache: Optional[WeatherCache] = None
+_shared_lock = threading.Lock()
+
+def get_shared_weather_cache() -> WeatherCache:
+    """进程内共享的天气缓存，APIMiddleware 和 APITools 共用，过期时间读取 WEATHER_CACHE_TTL"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = WeatherCache(ttl=float(os.getenv('WEATHER_CACHE_TTL', '600')))
+    return _shared_cache
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+JarvisAgent 异步接口与同步接口一致性测试
+通过解析源码比较签名，不导入 jarvis_agent（避免依赖 selenium 等浏览器组件）
+"""
+
+import ast
+import os
+import unittest
+
+AGENT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jarvis_agent.py')
+
+# 没有异步版本的同步方法
+SYNC_ONLY = {'dump_profile', 'submit', 'submit_many', 'process_many', 'wait_for_manual_action'}
+
+def _agent_methods():
+    """JarvisAgent 的公开方法：名称 -> 函数定义节点"""
+    with open(AGENT_PATH, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    agent = next(node for node in tree.body if isinstance(node, ast.ClassDef) and node.name == 'JarvisAgent')
+    return {
+        node.name: node for node in agent.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith('_')
+    }
+
+def _signature(node):
+    """参数名、默认值和注解"""
+    args = node.args
+    defaults = [None] * (len(args.args) - len(args.defaults)) + [ast.unparse(d) for d in args.defaults]
+    return (
+        [(arg.arg, ast.unparse(arg.annotation) if arg.annotation else None, default)
+         for arg, default in zip(args.args, defaults)],
+        ast.unparse(node.returns) if node.returns else None,
+    )
+
+class AsyncFacadeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.methods = _agent_methods()
+
+    def test_every_sync_method_has_async_version(self):
+        missing = [name for name, node in self.methods.items()
+                   if isinstance(node, ast.FunctionDef) and name not in SYNC_ONLY
+                   and f"a{name}" not in self.methods]
+        self.assertEqual(missing, [])
+
+    def test_async_signatures_match(self):
+        for name, node in self.methods.items():
+            if not isinstance(node, ast.AsyncFunctionDef):
+                continue
+            with self.subTest(method=name):
+                sync = self.methods.get(name[1:])
+                self.assertIsNotNone(sync, f"{name} 没有对应的同步方法")
+                self.assertEqual(_signature(node), _signature(sync))
+
+    def test_async_methods_go_through_scheduler(self):
+        for name, node in self.methods.items():
+            if not isinstance(node, ast.AsyncFunctionDef):
+                continue
+            with self.subTest(method=name):
+                calls = {ast.unparse(call.func) for call in ast.walk(node) if isinstance(call, ast.Call)}
+                self.assertNotIn('self.middleware_manager.aprocess', calls)
+                self.assertTrue(calls & {'self._adispatch', 'self.submit_many'}, f"{name} 没有经过调度器")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+cassette 录制/回放测试（本地HTTP替身服务器）
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.http_stub import StubServer, file_bytes
+from middleware.cassette import INDEX_MAGIC, Cassette, CassetteMissError, CassetteTransport, _TRAILER
+from middleware.transport import SessionTransport
+
+SECRET = 'sk-test-secret-0123456789'
+
+class _Offline:
+    """回放时不应被调用的传输"""
+
+    name = 'offline'
+
+    def request(self, method: str, url: str, **kwargs):
+        raise AssertionError(f"回放时发出了真实请求: {method} {url}")
+
+    def close(self) -> None:
+        pass
+
+class CassetteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'api.cassette')
+        server = StubServer().start()
+        self.base = server.url
+        transport = CassetteTransport(SessionTransport(), Cassette(self.path, 'record'))
+        try:
+            self.recorded = [
+                transport.request('GET', f"{self.base}/files/1024", params={'appid': SECRET}).content,
+                transport.request('GET', f"{self.base}/item/a").content,
+            ]
+        finally:
+            transport.close()
+            server.stop()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _replay(self) -> CassetteTransport:
+        return CassetteTransport(_Offline(), Cassette(self.path, 'replay'))
+
+    def test_replay_matches_record(self):
+        transport = self._replay()
+        # 密钥参数不参与匹配，换一个密钥也能回放
+        resp = transport.request('GET', f"{self.base}/files/1024", params={'appid': 'other'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(bytes(resp.content), file_bytes(0, 1024))
+        self.assertEqual(bytes(transport.request('GET', f"{self.base}/item/a").content), self.recorded[1])
+        with self.assertRaises(CassetteMissError):
+            transport.request('GET', f"{self.base}/item/missing")
+        self.assertEqual(transport.cassette.counts, {'recorded': 0, 'replayed': 2, 'misses': 1})
+        transport.close()
+
+    def test_secrets_not_written(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertNotIn(SECRET.encode(), data)
+        self.assertNotIn(b'appid', data)
+
+    def test_index_trailer(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertTrue(data.endswith(INDEX_MAGIC))
+        index_offset = _TRAILER.unpack(data[-len(INDEX_MAGIC) - _TRAILER.size:-len(INDEX_MAGIC)])[0]
+        self.assertLess(index_offset, len(data))
+        cassette = Cassette(self.path, 'replay')
+        self.assertEqual(cassette._data_end, index_offset)
+        self.assertEqual(cassette.stats()['entries'], 2)
+
+    def test_rebuilds_index_without_trailer(self):
+        # 录制进程异常退出时没有索引，顺序扫描记录重建
+        index_offset = Cassette(self.path, 'replay')._data_end
+        with open(self.path, 'r+b') as f:
+            f.truncate(index_offset)
+        transport = self._replay()
+        self.assertEqual(transport.cassette.stats()['entries'], 2)
+        self.assertEqual(bytes(transport.request('GET', f"{self.base}/item/a").content), self.recorded[1])
+        transport.close()
+
+if __name__ == '__main__':
+    unittest.main()
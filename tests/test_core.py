@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+MiddlewareManager 测试
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware import MiddlewareManager, Request, Response
+from middleware.core import BaseMiddleware
+
+class _Recorder(BaseMiddleware):
+    """记录被调用的中间件"""
+
+    def process(self, request: Request, response: Response) -> None:
+        response.data.setdefault('called', []).append(self.name)
+
+class _TogglingMiddleware(_Recorder):
+    """编译中间件链时禁用另一个中间件，模拟界面在工作线程分发请求时切换中间件"""
+
+    def __init__(self, target: BaseMiddleware):
+        super().__init__("Toggling")
+        self.target = target
+
+    @property
+    def is_async(self) -> bool:
+        if self.target.enabled:
+            self.target.enabled = False
+        return False
+
+class MiddlewareManagerTest(unittest.TestCase):
+
+    def test_invalidate_during_compile_is_not_lost(self):
+        manager = MiddlewareManager()
+        target = _Recorder("Target")
+        manager.add(_TogglingMiddleware(target))
+        manager.add(target)
+
+        manager.process(Request('ping'))
+        response = manager.process(Request('ping'))
+        self.assertEqual(response.data['called'], ['Toggling'])
+
+    def test_enabled_toggle_recompiles(self):
+        manager = MiddlewareManager()
+        first, second = _Recorder("First"), _Recorder("Second")
+        manager.add(first)
+        manager.add(second)
+        self.assertEqual(manager.process(Request('ping')).data['called'], ['First', 'Second'])
+        second.enabled = False
+        self.assertEqual(manager.process(Request('ping')).data['called'], ['First'])
+
+if __name__ == '__main__':
+    unittest.main()
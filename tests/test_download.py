@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+RangedDownloader 测试（本地HTTP替身服务器）
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.http_stub import StubServer, file_bytes
+from middleware.download import DownloadError, RangedDownloader
+
+SIZE = 256 * 1024
+
+class _RecordingSession:
+    """记录每个请求的请求头"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.headers = []
+
+    def request(self, method: str, url: str, headers=None, **kwargs):
+        self.headers.append((method, dict(headers or {})))
+        return self.session.request(method, url, headers=headers, **kwargs)
+
+class RangedDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().start()
+        self.url = f"{self.server.url}/files/{SIZE}"
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'file.bin')
+        self.http = _RecordingSession()
+
+    def tearDown(self):
+        self.http.session.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def _downloader(self, retries: int = 3) -> RangedDownloader:
+        return RangedDownloader(self.http.request, connections=2, min_part_size=64 * 1024,
+                                chunk_size=16 * 1024, retries=retries)
+
+    def _read(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_resume_from_state_file(self):
+        # 两个分段都在中途断开，且不重试：保留已写入的部分和续传状态
+        self.server.fail_ranges = 2
+        with self.assertRaises(DownloadError):
+            self._downloader(retries=0).download(self.url, self.path)
+        self.assertTrue(os.path.exists(self.path + '.part.json'))
+        self.assertFalse(os.path.exists(self.path))
+
+        self.http.headers.clear()
+        stats = self._downloader().download(self.url, self.path)
+        self.assertGreater(stats['resumed_bytes'], 0)
+        self.assertEqual(self._read(), file_bytes(0, SIZE))
+        self.assertFalse(os.path.exists(self.path + '.part.json'))
+        # 续传的范围请求带 If-Range，只请求尚未下载的部分
+        ranges = [headers for method, headers in self.http.headers if 'Range' in headers]
+        self.assertTrue(ranges)
+        requested = 0
+        for headers in ranges:
+            self.assertEqual(headers['If-Range'], f'"file-{SIZE}"')
+            first, last = headers['Range'].split('=', 1)[1].split('-')
+            requested += int(last) - int(first) + 1
+        self.assertEqual(requested, SIZE - stats['resumed_bytes'])
+
+    def test_checksum(self):
+        digest = hashlib.sha256(file_bytes(0, SIZE)).hexdigest()
+        self._downloader().download(self.url, self.path, checksum=f'sha256:{digest}')
+        self.assertEqual(self._read(), file_bytes(0, SIZE))
+
+    def test_checksum_mismatch_discards_partial_file(self):
+        with self.assertRaises(DownloadError):
+            self._downloader().download(self.url, self.path, checksum='sha256:' + '0' * 64)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_invalid_checksum_rejected_before_io(self):
+        with self.assertRaises(DownloadError):
+            self._downloader().download(self.url, self.path, checksum='sha256:not-hex')
+        self.assertEqual(self.http.headers, [])
+        self.assertEqual(os.listdir(self.directory), [])
+
+if __name__ == '__main__':
+    unittest.main()
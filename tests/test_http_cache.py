@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+HTTPCache 测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.http_cache import HTTPCache
+
+class _Resp:
+    """可缓存的响应替身"""
+
+    def __init__(self, body: bytes):
+        self.status_code = 200
+        self.headers = {'Cache-Control': 'max-age=60', 'ETag': '"v1"'}
+        self.content = body
+
+class HTTPCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = HTTPCache(os.path.join(self.directory, 'http_cache.sqlite'), max_bytes=250)
+
+    def tearDown(self):
+        self.cache._conn.close()
+        shutil.rmtree(self.directory)
+
+    def _last_access(self, key: str) -> float:
+        return self.cache._conn.execute('SELECT last_access FROM responses WHERE key = ?', (key,)).fetchone()[0]
+
+    def test_hits_batch_access_time(self):
+        self.cache.put('a', 'http://x/a', _Resp(b'a' * 10))
+        stored = self._last_access('a')
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertEqual(self._last_access('a'), stored)
+        self.cache.put('b', 'http://x/b', _Resp(b'b' * 10))
+        self.assertGreater(self._last_access('a'), stored)
+
+    def test_evicts_least_recently_used_by_running_total(self):
+        for key in ('a', 'b'):
+            self.cache.put(key, f'http://x/{key}', _Resp(key.encode() * 100))
+        # a 最近被访问过，写入 c 超过上限时淘汰 b
+        self.cache.get('a')
+        self.cache.put('c', 'http://x/c', _Resp(b'c' * 100))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache._total, self.cache.stats()['bytes'])
+        self.assertLessEqual(self.cache._total, 250)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+PythonExecutorMiddleware 流式执行测试
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.exceptions import MiddlewareError
+from middleware.python_executor import PythonExecutorMiddleware
+
+ENDLESS = "i = 0\nwhile True:\n    print(i)\n    i += 1\n"
+
+def _stream_threads() -> int:
+    return sum(thread.name == 'jarvis-python-stream' for thread in threading.enumerate())
+
+class ExecuteStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = PythonExecutorMiddleware()
+        self.executor.timeout = 0.5
+
+    def _wait_for_threads(self) -> int:
+        deadline = time.monotonic() + 2
+        while _stream_threads() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return _stream_threads()
+
+    def test_output(self):
+        self.assertEqual(''.join(self.executor._execute_stream("for i in range(3): print(i)")), '0\n1\n2\n')
+
+    def test_close_stops_execution(self):
+        stream = self.executor._execute_stream(ENDLESS)
+        self.assertTrue(next(stream))
+        stream.close()
+        self.assertEqual(self._wait_for_threads(), 0)
+
+    def test_timeout(self):
+        with self.assertRaises(MiddlewareError):
+            for _ in self.executor._execute_stream(ENDLESS):
+                pass
+        self.assertEqual(self._wait_for_threads(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
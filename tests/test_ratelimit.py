@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+TokenBucket / RateLimiter 测试
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.ratelimit import RateLimiter, TokenBucket
+
+class _Clock:
+    """可手动推进的 time.monotonic 替身"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        patcher = mock.patch('middleware.ratelimit.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        waits = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1)
+        self.assertAlmostEqual(waits[3], 0.2)
+        self.assertEqual(bucket.waits, 2)
+
+    def test_refill_is_capped_at_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        bucket.reserve(2)
+        self.clock.now += 0.05
+        self.assertAlmostEqual(bucket.level, 0.5)
+        self.clock.now += 10
+        self.assertEqual(bucket.level, 2)
+
+    def test_acquire_sleeps_for_debt(self):
+        bucket = TokenBucket(rate=4, burst=1)
+        with mock.patch('middleware.ratelimit.time.sleep') as sleep:
+            bucket.acquire()
+            bucket.acquire()
+        sleep.assert_called_once_with(0.25)
+
+    def test_limiter_token_budget(self):
+        limiter = RateLimiter({'api.openai.com': (100, 100, 1000, 1000)})
+        url = 'https://api.openai.com/v1/chat/completions'
+        with mock.patch('middleware.ratelimit.time.sleep') as sleep:
+            self.assertEqual(limiter.acquire(url, tokens=800), 0.0)
+            self.assertAlmostEqual(limiter.acquire(url, tokens=400), 0.2)
+        sleep.assert_called_once()
+        # 实际用量超出预留时补扣
+        limiter.settle(url, reserved=400, used=500)
+        self.assertAlmostEqual(limiter.get(url).tokens.level, -300)
+
+if __name__ == '__main__':
+    unittest.main()
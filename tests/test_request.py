@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Request/Response 测试
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.request import Request, Response
+
+async def _numbers():
+    for i in range(3):
+        yield i
+
+class RequestResponseTest(unittest.TestCase):
+
+    def test_request_equality(self):
+        self.assertEqual(Request('a', {'x': 1}, timestamp=1.0), Request('a', {'x': 1}, headers={}, timestamp=1.0))
+        self.assertNotEqual(Request('a', {'x': 1}, timestamp=1.0), Request('a', {'x': 2}, timestamp=1.0))
+        self.assertNotEqual(Request('a', timestamp=1.0), Request('a', metadata={'k': 1}, timestamp=1.0))
+
+    def test_response_equality(self):
+        first = Response(data={'x': 1}, timestamp=1.0)
+        second = Response(data={'x': 1}, metadata={}, timestamp=1.0)
+        self.assertEqual(first, second)
+        second.finish()
+        self.assertNotEqual(first, second)
+        self.assertNotEqual(first, Request('a', timestamp=1.0))
+
+    def test_iter_async_stream(self):
+        response = Response()
+        response.set_stream(_numbers(), kind='json')
+        self.assertEqual(list(response.iter_stream()), [0, 1, 2])
+
+    def test_iter_async_stream_inside_running_loop(self):
+        response = Response()
+        response.set_stream(_numbers(), kind='json')
+
+        async def read_sync():
+            with self.assertRaises(RuntimeError):
+                next(response.iter_stream())
+            # 流没有被取走，仍可异步读取
+            return [chunk async for chunk in response.aiter_stream()]
+
+        self.assertEqual(asyncio.run(read_sync()), [0, 1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+RetryEngine 测试
+"""
+
+import os
+import sys
+import time
+import unittest
+
+from requests.structures import CaseInsensitiveDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.exceptions import RateLimitError
+from middleware.ratelimit import RateLimiter, host_key
+from middleware.retry import RetryEngine
+
+class _Resp:
+    """响应替身"""
+
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+class _Transport:
+    """按顺序返回预设响应，并记录请求"""
+
+    def __init__(self, *responses: _Resp):
+        self.responses = list(responses)
+        self.calls = []
+
+    def send(self, method: str, url: str, **kwargs):
+        self.calls.append((method, url))
+        return self.responses.pop(0)
+
+class RetryEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.retry = RetryEngine(max_retries=3, base_delay=0.01, max_wait=1.0)
+
+    def test_429_then_success(self):
+        limited = _Resp(429, {'Retry-After': '0'})
+        transport = _Transport(limited, _Resp(200))
+        resp = self.retry.call(transport.send, 'GET', 'https://api.example.com/items')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(transport.calls), 2)
+        self.assertTrue(limited.closed)
+        stats = self.retry.stats()
+        self.assertEqual((stats['retries'], stats['rate_limited']), (1, 1))
+
+    def test_403_rate_limit_carries_reset_at(self):
+        reset_at = int(time.time()) + 100
+        transport = _Transport(_Resp(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset_at)}))
+        with self.assertRaises(RateLimitError) as raised:
+            self.retry.call(transport.send, 'GET', 'https://api.github.com/repos/a/b')
+        self.assertEqual(raised.exception.reset_at, reset_at)
+        self.assertEqual(raised.exception.status_code, 403)
+        self.assertEqual(len(transport.calls), 1)
+
+    def test_plain_403_is_returned(self):
+        transport = _Transport(_Resp(403))
+        self.assertEqual(self.retry.call(transport.send, 'GET', 'https://api.github.com/x').status_code, 403)
+
+    def test_blocked_host_shared_across_ports(self):
+        reset_at = int(time.time()) + 100
+        limited = _Transport(_Resp(429, {'X-RateLimit-Reset': str(reset_at)}))
+        with self.assertRaises(RateLimitError):
+            self.retry.call(limited.send, 'GET', 'https://api.example.com:8443/a')
+        transport = _Transport(_Resp(200))
+        with self.assertRaises(RateLimitError) as raised:
+            self.retry.call(transport.send, 'GET', 'https://api.example.com/b')
+        self.assertEqual(raised.exception.reset_at, reset_at)
+        self.assertEqual(transport.calls, [])
+
+    def test_host_key_matches_limiter(self):
+        limiter = RateLimiter({host_key('http://127.0.0.1:8080/v1'): (5, 5, None, None)})
+        self.assertIsNotNone(limiter.get('http://127.0.0.1:9090/other'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+RequestScheduler 测试
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.request import Request, Response
+from middleware.scheduler import RequestScheduler, Priority
+
+class _SlowManager:
+    """每个请求耗时固定的 MiddlewareManager 替身"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def process(self, request: Request) -> Response:
+        time.sleep(self.delay)
+        response = Response()
+        response.set_data('action', request.action)
+        return response
+
+class _CountingManager(_SlowManager):
+    """记录同时处理中的最大请求数"""
+
+    def __init__(self, delay: float):
+        super().__init__(delay)
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def process(self, request: Request) -> Response:
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return super().process(request)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = RequestScheduler(_SlowManager(0.01), workers=1, aging_interval=0.05)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_priority_order(self):
+        blocker = self.scheduler.submit(Request('block'), Priority.INTERACTIVE)
+        bulk = self.scheduler.submit(Request('bulk'), Priority.BULK)
+        interactive = self.scheduler.submit(Request('interactive'), Priority.INTERACTIVE)
+        interactive.result(timeout=2)
+        self.assertFalse(bulk.done())
+        bulk.result(timeout=2)
+        blocker.result(timeout=2)
+
+    def test_bulk_not_starved_by_interactive_flood(self):
+        futures = [self.scheduler.submit(Request('flood'), Priority.INTERACTIVE, submitter='gui')
+                   for _ in range(20)]
+        bulk = self.scheduler.submit(Request('bulk'), Priority.BULK)
+        # 持续补充交互请求，使 INTERACTIVE 队列始终非空
+        deadline = time.monotonic() + 2
+        while not bulk.done() and time.monotonic() < deadline:
+            futures.append(self.scheduler.submit(Request('flood'), Priority.INTERACTIVE, submitter='gui'))
+            time.sleep(0.005)
+        self.assertTrue(bulk.done(), "BULK 请求在持续的交互负载下饿死")
+        self.assertTrue(bulk.result().success)
+        self.assertGreater(self.scheduler.metrics()['promoted'], 0)
+        remaining = sum(not future.done() for future in futures)
+        self.assertGreater(remaining, 0)
+
+    def test_aged_entry_is_the_one_dequeued(self):
+        scheduler = RequestScheduler(_SlowManager(0), workers=0, aging_interval=1.0)
+        scheduler.start()
+        fresh = scheduler.submit(Request('fresh_bulk'), Priority.BULK, submitter='a')
+        aged = scheduler.submit(Request('aged_bulk'), Priority.BULK, submitter='b')
+        scheduler.submit(Request('interactive'), Priority.INTERACTIVE)
+        # b 的请求已等待 10 秒，提升到 INTERACTIVE 之上；轮转队首 a 的请求刚到，不应借此插队
+        scheduler._queues[Priority.BULK]['b'][0].enqueued_at -= 10
+        with scheduler._condition:
+            order = [scheduler._next_entry()[1].request.action for _ in range(3)]
+        scheduler.shutdown()
+        self.assertEqual(order, ['aged_bulk', 'interactive', 'fresh_bulk'])
+
+    def test_submit_many_max_in_flight(self):
+        manager = _CountingManager(0.02)
+        scheduler = RequestScheduler(manager, workers=4)
+        scheduler.start()
+        try:
+            requests = [Request(f'r{i}') for i in range(10)]
+            futures = scheduler.submit_many(requests, Priority.BULK, max_in_flight=2)
+            actions = [future.result(timeout=5).data['action'] for future in futures]
+        finally:
+            scheduler.shutdown()
+        self.assertEqual(actions, [f'r{i}' for i in range(10)])
+        self.assertLessEqual(manager.peak, 2)
+
+if __name__ == '__main__':
+    unittest.main()